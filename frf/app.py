@@ -48,16 +48,41 @@ False
 
 **NOTE**: If you used the ``frf-startproject`` script to create your project,
 this should already be done for you.
+
+Warmup
+------
+
+Once everything is set up, ``init`` calls :func:`warmup`, so that the first
+requests are not slower than the others.  It configures the SQLAlchemy
+mappers, opens ``WARMUP_DB_CONNECTIONS`` database connections (1 by
+default), builds the dispatch plans of all the routed views, and calls the
+``warmup`` function of every module of ``INSTALLED_APPS`` that has one.  Set
+``WARMUP = False`` to skip it.
+
+When the app is loaded before gunicorn forks its workers (``--preload``),
+pass :func:`post_fork` to gunicorn, so that each worker drops the
+connections it inherited and warms up its own.  With gevent workers, use
+:func:`post_worker_init` instead:
+
+.. code-block:: python
+   :caption: gunicorn.conf.py
+
+    from frf.app import post_fork  # noqa
+
+``runserver --production`` does this for you.  For serving many concurrent
+requests per worker, see :mod:`frf.utils.concurrency`.
 """
 
 import importlib
 import logging
 import logging.config
+import time
 
 import falcon
 
 from frf import exceptions
 from frf.urls import IncludeURLs, URL_REGISTRY
+from frf.utils import concurrency
 from frf.utils.importing import import_class
 
 from . import cache, conf, db
@@ -66,6 +91,9 @@ logger = logging.getLogger(__name__)
 
 api = None
 
+#: the routes added to ``api``, as ``(url, resource)`` tuples.
+routes = []
+
 
 def _flatten_urls(url_list, urls):
     for url in url_list:
@@ -87,6 +115,90 @@ def _add_urls(app, url_list):
     for url in urls:
         if url:
             app.add_route(url[0], url[1])
+            routes.append((url[0], url[1]))
+
+
+def _get_session_scopefunc():
+    scopefunc = conf.get('SQLALCHEMY_SESSION_SCOPEFUNC', None)
+    if scopefunc is None:
+        scopefunc = concurrency.get_scopefunc(
+            conf.get('SQLALCHEMY_SESSION_SCOPE', 'auto'))
+    return scopefunc
+
+
+def _run_warmup_step(name, func, *args):
+    start = time.time()
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Warmup step {} failed.'.format(name))
+    else:
+        logger.debug('Warmup step {} took {:.3f}s.'.format(
+            name, time.time() - start))
+
+
+def _warm_views():
+    seen = set()
+    for url, resource in routes:
+        if id(resource) in seen:
+            continue
+        seen.add(id(resource))
+
+        build_dispatch_plans = getattr(resource, 'build_dispatch_plans', None)
+        if callable(build_dispatch_plans):
+            build_dispatch_plans()
+
+
+def warmup():
+    """Do the work the first requests to this process would otherwise do.
+
+    See the module documentation.  Failures are logged, not raised, so a
+    database that is down at boot doesn't keep the app from starting.
+    """
+    if db.engine is not None:
+        _run_warmup_step(
+            'db', db.warmup, conf.get('WARMUP_DB_CONNECTIONS', 1))
+
+    _run_warmup_step('views', _warm_views)
+
+    for app_name in conf.get('INSTALLED_APPS', []):
+        app = importlib.import_module(app_name)
+        warmup_func = getattr(app, 'warmup', None)
+        if callable(warmup_func):
+            _run_warmup_step(app_name, warmup_func)
+
+
+def post_fork(server=None, worker=None):
+    """Prepare a forked worker process.
+
+    Closes the database and cache connections inherited from the parent
+    process, scopes database sessions again, in case the process was
+    monkey-patched since :func:`init`, and warms up the worker.  Has the
+    signature of the gunicorn ``post_fork`` hook, so it can be used as one
+    directly.
+
+    gevent workers monkey-patch the process after ``post_fork`` runs, so use
+    :func:`post_worker_init` with them instead.
+    """
+    if db.engine is not None:
+        concurrency.patch_database_driver()
+        db.dispose()
+        db.configure_scope(_get_session_scopefunc())
+
+    cache.after_fork()
+
+    if conf.get('WARMUP', True):
+        warmup()
+
+
+def post_worker_init(worker=None):
+    """Prepare a worker process, once it is initialized.
+
+    Does the same as :func:`post_fork`, and has the signature of the gunicorn
+    ``post_worker_init`` hook, which runs after gevent workers monkey-patch
+    the process.
+    """
+    post_fork(None, worker)
 
 
 def init(project_name, settings_file, base_dir, main_app=None):
@@ -101,6 +213,8 @@ def init(project_name, settings_file, base_dir, main_app=None):
     """
     global api
 
+    del routes[:]
+
     if not main_app:
         main_app = project_name
 
@@ -127,7 +241,7 @@ def init(project_name, settings_file, base_dir, main_app=None):
         db.init(
             conf.get('SQLALCHEMY_CONNECTION_URI', 'sqlite:///:memory:'),
             echo=conf.get('SQLALCHEMY_ECHO', False),
-            scopefunc=conf.get('SQLALCHEMY_SESSION_SCOPEFUNC', None),
+            scopefunc=_get_session_scopefunc(),
             )
 
     # set up the cache
@@ -168,3 +282,6 @@ def init(project_name, settings_file, base_dir, main_app=None):
             'Base url module {} could not be imported.'.format(
                 url_module_name))
         logger.error(e)
+
+    if conf.get('WARMUP', True):
+        warmup()
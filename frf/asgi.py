@@ -0,0 +1,332 @@
+# Copyright 2016 by Teem, and other contributors,
+# as noted in the individual source code files.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# By contributing to this project, you agree to also license your source
+# code under the terms of the Apache License, Version 2.0, as described
+# above.
+
+"""ASGI adapter.
+
+Serves the frf API from an ASGI server, such as uvicorn, so that views can
+be written as coroutines and wait for slow upstream calls without tying up a
+thread.  Add an ``asgi.py`` module to your project:
+
+.. code-block:: python
+
+    import skedup  # noqa, initializes frf
+
+    from frf.asgi import ASGIApp
+
+    application = ASGIApp()
+
+and run it with ``uvicorn skedup.asgi:application``.
+
+Views are dispatched with :meth:`frf.views.View.async_dispatch`: handlers
+and actions defined with ``async def`` run on the event loop, and the
+synchronous ones, such as the actions of the viewset mixins, run in the
+thread pool of :func:`frf.utils.concurrency.run_sync` along with the
+serializers and the SQLAlchemy queries they use.  Call ``run_sync`` from
+your own coroutines for the same:
+
+.. code-block:: python
+
+    class CalendarViewSet(viewsets.ModelViewSet):
+        async def retrieve(self, req, resp, **kwargs):
+            obj = await run_sync(self.get_obj, req, **kwargs)
+            obj.availability = await availability_client.fetch(obj.uuid)
+            resp.body = self.get_serializer(req, **kwargs).serialize(obj)
+
+A request then runs in several threads, which all have to use its database
+session, so this requires ``SQLALCHEMY_SESSION_SCOPE = 'contextvars'``, and
+thus Python 3.7.  Otherwise, each request is served by the WSGI app in a
+single thread of the pool, and coroutine handlers run in an event loop of
+their own.  Resources other than views, and views that override their
+``on_<method>`` responders, are also called in the thread pool.
+
+Streamed bodies, set with ``resp.stream``, are sent as their chunks are
+produced.  Iterables that support asynchronous iteration, such as the
+responses of the change feed of :mod:`frf.changes`, are iterated on the event
+loop, so that long-lived streams don't hold a thread.
+"""
+
+import io
+import sys
+
+import falcon
+
+from frf import app, db
+from frf.utils import concurrency
+from frf.views import HTTP_METHODS, View
+
+
+#: the falcon release whose ``API.__call__`` :meth:`ASGIApp.respond` follows.
+FALCON_VERSION = '1.1.'
+
+
+class ASGIApp(object):
+    """ASGI application serving a falcon API.
+
+    Args:
+        api (falcon.API): The API, ``frf.app.api`` by default.
+        native (bool): Whether to dispatch views with ``async_dispatch``.
+            By default, only if database sessions are scoped to the
+            :mod:`contextvars` context, see the module documentation, and
+            the installed falcon is the release :meth:`respond` follows.
+    """
+    def __init__(self, api=None, native=None):
+        self._api = api
+        self.native = native
+
+    @property
+    def api(self):
+        return self._api or app.api
+
+    def is_native(self):
+        """Whether views are dispatched with ``async_dispatch``."""
+        if self.native is None:
+            scopefunc = getattr(db.session.registry, 'scopefunc', None)
+            self.native = concurrency.contextvars is not None and (
+                db.engine is None or
+                scopefunc is concurrency.contextvars_scopefunc) and \
+                falcon.__version__.startswith(FALCON_VERSION)
+        return self.native
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self.handle_http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self.handle_lifespan(scope, receive, send)
+        else:
+            raise ValueError(
+                'Unsupported ASGI scope type {}.'.format(scope['type']))
+
+    async def handle_lifespan(self, scope, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                concurrency.shutdown_executor()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+        return body
+
+    def get_environ(self, scope, body):
+        """Return the WSGI environ of the request in ``scope``."""
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        env = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode(
+                'utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': 'HTTP/{}'.format(
+                scope.get('http_version', '1.1')),
+            'REMOTE_ADDR': client[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+
+        for name, value in scope.get('headers', ()):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = 'HTTP_' + name
+            value = value.decode('latin-1')
+            if name in env:
+                value = env[name] + ',' + value
+            env[name] = value
+
+        return env
+
+    async def handle_http(self, scope, receive, send):
+        env = self.get_environ(scope, await self.read_body(receive))
+
+        if self.is_native():
+            if concurrency.contextvars is not None:
+                concurrency.new_scope()
+            status, headers, body = await self.respond(env)
+        else:
+            status, headers, body = await concurrency.run_sync(
+                self.respond_wsgi, env)
+
+        await send({
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers],
+        })
+        if isinstance(body, bytes):
+            await send({'type': 'http.response.body', 'body': body})
+        else:
+            await self.send_stream(body, send)
+
+    async def send_stream(self, chunks, send):
+        """Send the chunks of a streamed body as they are produced.
+
+        Asynchronous iterables, such as the :class:`frf.changes.EventStream`
+        of the change feed, are iterated on the event loop, and the others
+        in the thread pool.
+        """
+        try:
+            if hasattr(chunks, '__aiter__'):
+                async for chunk in chunks:
+                    await send({'type': 'http.response.body', 'body': chunk,
+                                'more_body': True})
+            else:
+                chunks = iter(chunks)
+                while True:
+                    chunk = await concurrency.run_sync(next, chunks, None)
+                    if chunk is None:
+                        break
+                    await send({'type': 'http.response.body', 'body': chunk,
+                                'more_body': True})
+        finally:
+            if hasattr(chunks, 'close'):
+                await concurrency.run_sync(chunks.close)
+        await send({'type': 'http.response.body', 'body': b''})
+
+    def respond_wsgi(self, env):
+        """Serve ``env`` with the WSGI app, in the current thread.
+
+        Returns the body as bytes, or as the iterable of the app if it is
+        streamed.
+        """
+        response = []
+
+        def start_response(status, headers, exc_info=None):
+            response[:] = [status, headers]
+
+        chunks = self.api(env, start_response)
+        if not isinstance(chunks, list):
+            return response[0], response[1], chunks
+
+        return response[0], response[1], b''.join(chunks)
+
+    async def respond(self, env):
+        """Serve ``env`` like ``falcon.API.__call__``, awaiting the view.
+
+        This repeats what ``falcon.API.__call__`` does in falcon 1.1, with
+        its private helpers, so that the view can be awaited in between.
+        Other falcon releases are served with :meth:`respond_wsgi` instead,
+        see :meth:`is_native`.
+        """
+        api = self.api
+        req = api._request_type(env, options=api.req_options)
+        resp = api._response_type()
+        resource = None
+        params = {}
+
+        mw_pr_stack = []
+        req_succeeded = False
+
+        try:
+            try:
+                if api._middleware:
+                    await concurrency.run_sync(
+                        self.process_request, api, req, resp, mw_pr_stack)
+                responder, params, resource, req.uri_template = \
+                    api._get_responder(req)
+            except Exception as ex:
+                if not api._handle_exception(ex, req, resp, params):
+                    raise
+            else:
+                try:
+                    if resource is not None and api._middleware:
+                        await concurrency.run_sync(
+                            self.process_resource, api, req, resp, resource,
+                            params)
+                    await self.call_responder(
+                        responder, resource, req, resp, params)
+                    req_succeeded = True
+                except Exception as ex:
+                    if not api._handle_exception(ex, req, resp, params):
+                        raise
+        finally:
+            if mw_pr_stack:
+                req_succeeded = await concurrency.run_sync(
+                    self.process_response, api, req, resp, resource,
+                    params, mw_pr_stack, req_succeeded)
+
+        if req.method == 'HEAD' or resp.status in api._BODILESS_STATUS_CODES:
+            body = b''
+        else:
+            chunks, length = api._get_body(resp)
+            if length is not None:
+                resp._headers['content-length'] = str(length)
+            if isinstance(chunks, list):
+                body = b''.join(chunks)
+            else:
+                body = chunks
+
+        if resp.status in ('204 No Content', '304 Not Modified'):
+            media_type = None
+        else:
+            media_type = api._media_type
+
+        return resp.status, resp._wsgi_headers(media_type), body
+
+    async def call_responder(self, responder, resource, req, resp, params):
+        """Await the ``async_dispatch`` of views, run others in a thread."""
+        method = req.method.lower()
+        if resource is not None and method in HTTP_METHODS and \
+                hasattr(resource, 'async_dispatch') and \
+                getattr(responder, '__func__', None) is getattr(
+                    View, 'on_' + method):
+            await resource.async_dispatch(method, req, resp, **params)
+        else:
+            await concurrency.run_sync(responder, req, resp, **params)
+
+    def process_request(self, api, req, resp, mw_pr_stack):
+        for process_request, _, process_response in api._middleware:
+            if process_request is not None:
+                process_request(req, resp)
+            if process_response is not None:
+                mw_pr_stack.append(process_response)
+
+    def process_resource(self, api, req, resp, resource, params):
+        for _, process_resource, _ in api._middleware:
+            if process_resource is not None:
+                process_resource(req, resp, resource, params)
+
+    def process_response(self, api, req, resp, resource, params, mw_pr_stack,
+                         req_succeeded):
+        while mw_pr_stack:
+            process_response = mw_pr_stack.pop()
+            try:
+                process_response(req, resp, resource, req_succeeded)
+            except Exception as ex:
+                if not api._handle_exception(ex, req, resp, params):
+                    raise
+                req_succeeded = False
+        return req_succeeded
@@ -0,0 +1,289 @@
+# Copyright 2016 by Teem, and other contributors,
+# as noted in the individual source code files.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# By contributing to this project, you agree to also license your source
+# code under the terms of the Apache License, Version 2.0, as described
+# above.
+
+"""Batch requests.
+
+The batch endpoint serves several requests at once, to save clients the
+cost of one HTTP round trip, authentication and database session each.
+Add it to your urls with :func:`frf.urls.batch`:
+
+.. code-block:: python
+   :caption: urls.py
+
+    from frf.urls import batch, include
+
+    urlpatterns = [
+        batch('/api/batch/'),
+        ('/api/', include('blog.urls')),
+    ]
+
+Then ``POST`` it a list of requests:
+
+.. code-block:: json
+
+    [
+        {"method": "GET", "path": "/api/articles/", "query_string": "page=2"},
+        {"method": "GET", "path": "/api/authors/42/"},
+        {"method": "POST", "path": "/api/articles/", "body": {"title": "Hi"}}
+    ]
+
+Each request can have ``headers``, either an object or a list of
+``[name, value]`` pairs to repeat a header, and a ``body``, which is JSON
+encoded unless it is a string.  The response is the list of the responses,
+in the same order, each with its ``status`` code, ``headers``, as a list of
+``[name, value]`` pairs, and ``body``, decoded if it is JSON.
+
+The ``Authorization`` and ``Cookie`` headers of the batch request are
+passed on to the requests that don't set their own, and each request is
+authenticated by the view serving it, as if it was made on its own.  Other
+headers of the batch request are not passed on.  To reject batches from
+unauthenticated clients before serving any of their requests, give the
+batch view ``authentication`` too:
+
+.. code-block:: python
+
+    batch('/api/batch/', authentication=[TokenAuthentication()])
+
+Requests are served in-process, through the falcon router and middleware.
+Consecutive ``GET`` requests are independent, so they run concurrently, in a
+pool of ``BATCH_MAX_WORKERS`` threads, 4 by default.  Other requests run one
+after the other, in order, once the ones before them are done.  A batch can
+hold ``BATCH_MAX_REQUESTS`` requests, 25 by default.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from gettext import gettext as _
+import io
+import json
+import logging
+import threading
+
+import falcon
+
+from frf import conf, views
+
+logger = logging.getLogger(__name__)
+
+#: the methods of the requests that can run concurrently.
+CONCURRENT_METHODS = ('GET', 'HEAD')
+
+#: the batch request headers that requests of the batch inherit.
+INHERITED_HEADERS = ('HTTP_AUTHORIZATION', 'HTTP_COOKIE')
+
+#: the environ key marking requests made by a batch.
+BATCH_ENVIRON_KEY = 'frf.batch'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the thread pool running concurrent requests."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=conf.get('BATCH_MAX_WORKERS', 4))
+    return _executor
+
+
+class BatchView(views.View):
+    """Serve a list of requests, see the module documentation.
+
+    Args:
+        api (falcon.API): The API serving the requests, ``frf.app.api`` by
+            default.
+        max_requests (int): The maximum number of requests in a batch,
+            ``BATCH_MAX_REQUESTS`` by default.
+        authentication (list): The authentication methods of the batch
+            request itself.  The requests of the batch are authenticated
+            by their own views.
+    """
+    allowed_methods = ('post', )
+
+    def __init__(self, api=None, max_requests=None, authentication=None):
+        self._api = api
+        self.max_requests = max_requests
+        if authentication is not None:
+            self.authentication = authentication
+
+    @property
+    def api(self):
+        if self._api is not None:
+            return self._api
+
+        from frf import app
+        return app.api
+
+    def get_max_requests(self):
+        if self.max_requests is not None:
+            return self.max_requests
+        return conf.get('BATCH_MAX_REQUESTS', 25)
+
+    def parse_requests(self, req):
+        """Return the requests of the batch, validated."""
+        try:
+            requests = json.loads(req.stream.read().decode('utf-8'))
+        except ValueError:
+            raise falcon.HTTPBadRequest(
+                title=_('Invalid batch'),
+                description=_('The batch must be a JSON list of requests.'))
+
+        if not isinstance(requests, list) or not all(
+                self.is_valid_request(r) for r in requests):
+            raise falcon.HTTPBadRequest(
+                title=_('Invalid batch'),
+                description=_(
+                    'The batch must be a list of requests, each with a '
+                    'path.'))
+
+        max_requests = self.get_max_requests()
+        if len(requests) > max_requests:
+            raise falcon.HTTPBadRequest(
+                title=_('Batch too large'),
+                description=_(
+                    'A batch can hold at most {} requests.').format(
+                    max_requests))
+
+        return requests
+
+    def is_valid_request(self, request):
+        if not isinstance(request, dict) or not isinstance(
+                request.get('path'), str):
+            return False
+
+        headers = request.get('headers') or {}
+        return isinstance(headers, dict) or (
+            isinstance(headers, list) and all(
+                isinstance(h, list) and len(h) == 2 and isinstance(h[0], str)
+                for h in headers))
+
+    def get_environ(self, req, request):
+        """Return the WSGI environ of ``request``, made within ``req``."""
+        path, _sep, query_string = request['path'].partition('?')
+        body = request.get('body')
+        if body is None:
+            body = b''
+        elif isinstance(body, str):
+            body = body.encode('utf-8')
+        else:
+            body = json.dumps(body).encode('utf-8')
+
+        env = {
+            key: value for key, value in req.env.items()
+            if not key.startswith('HTTP_')
+        }
+        env.update({
+            'REQUEST_METHOD': request.get('method', 'GET').upper(),
+            'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': request.get('query_string', query_string),
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': io.BytesIO(body),
+            BATCH_ENVIRON_KEY: True,
+        })
+
+        for key in INHERITED_HEADERS:
+            if key in req.env:
+                env[key] = req.env[key]
+
+        headers = request.get('headers') or {}
+        if isinstance(headers, dict):
+            headers = headers.items()
+
+        own = {}
+        for name, value in headers:
+            key = name.upper().replace('-', '_')
+            if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                key = 'HTTP_' + key
+            value = str(value)
+            if key in own and key.startswith('HTTP_'):
+                value = own[key] + ',' + value
+            own[key] = value
+        env.update(own)
+
+        return env
+
+    def serve(self, env):
+        """Serve ``env`` with the API and return the response."""
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [list(header) for header in headers]
+
+        try:
+            chunks = self.api(env, start_response)
+            body = b''.join(chunks)
+        except Exception:
+            logger.exception('Batch request to {} failed.'.format(
+                env['PATH_INFO']))
+            return self.error_response(
+                falcon.HTTP_500, _('Internal Server Error'))
+
+        body = body.decode('utf-8')
+        content_type = next((
+            value for name, value in response['headers']
+            if name.lower() == 'content-type'), '')
+        if body and content_type.startswith('application/json'):
+            try:
+                body = json.loads(body)
+            except ValueError:
+                pass
+        response['body'] = body or None
+
+        return response
+
+    def error_response(self, status, title):
+        return {
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [],
+            'body': {'title': title},
+        }
+
+    def run(self, environs):
+        """Serve ``environs`` and return their responses, in order."""
+        responses = []
+        pending = []
+        executor = get_executor()
+
+        for env in environs:
+            if env['REQUEST_METHOD'] in CONCURRENT_METHODS and \
+                    len(environs) > 1:
+                pending.append(executor.submit(self.serve, env))
+                continue
+
+            responses.extend(future.result() for future in pending)
+            pending = []
+            responses.append(self.serve(env))
+
+        responses.extend(future.result() for future in pending)
+        return responses
+
+    def post(self, req, resp, **kwargs):
+        if req.env.get(BATCH_ENVIRON_KEY):
+            raise falcon.HTTPBadRequest(
+                title=_('Invalid batch'),
+                description=_('Batches cannot be nested.'))
+
+        environs = [
+            self.get_environ(req, request)
+            for request in self.parse_requests(req)]
+        resp.body = json.dumps(self.run(environs))
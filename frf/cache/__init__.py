@@ -35,25 +35,110 @@ in your settings:
 
 If the ``default_timeout`` key is not provided, ``30`` seconds will be
 used.
+
+Values can be stored as JSON, pickle or msgpack, and compressed, by setting
+the ``codec`` and ``compress_threshold`` keys, see :mod:`frf.cache.codecs`.
+
+If you don't have Redis, the workers of a host can still share a cache with
+:class:`frf.cache.engines.sqlite.SQLiteCacheEngine`:
+
+.. code-block:: text
+
+    CACHE = {
+        'engine': 'frf.cache.engines.sqlite.SQLiteCacheEngine',
+        'max_entries': 10000,
+    }
+
+To keep hot values in the memory of each worker process, put a
+:class:`frf.cache.engines.tiered.TieredCacheEngine` in front of the shared
+engine:
+
+.. code-block:: text
+
+    CACHE = {
+        'engine': 'frf.cache.engines.tiered.TieredCacheEngine',
+        'default_timeout': 30,
+        'local_timeout': 5,
+        'local_max_entries': 1000,
+        'version_check_interval': 500,
+        'backend': {
+            'engine': 'frf.cache.engines.redis.RedisCacheEngine',
+            'host': 'localhost',
+            'port': 6379,
+        },
+    }
+
+If the cache is optional for your application, wrap a remote engine in a
+:class:`frf.cache.engines.resilient.ResilientCacheEngine`, so that a slow or
+unavailable server turns into cache misses instead of slow requests:
+
+.. code-block:: text
+
+    CACHE = {
+        'engine': 'frf.cache.engines.resilient.ResilientCacheEngine',
+        'operation_timeout': 50,
+        'failure_threshold': 5,
+        'reset_timeout': 30,
+        'backend': {
+            'engine': 'frf.cache.engines.redis.RedisCacheEngine',
+            'host': 'localhost',
+            'port': 6379,
+        },
+    }
+
+To see how the cache is used, wrap the engine in
+:class:`frf.cache.engines.instrumented.InstrumentedCacheEngine`.  It counts
+hits, misses, sets, deletes, evictions, latencies and value sizes per key
+prefix, and ``manage.py cachestats`` reports them for all the workers sharing
+the backend:
+
+.. code-block:: text
+
+    CACHE = {
+        'engine': 'frf.cache.engines.instrumented.InstrumentedCacheEngine',
+        'flush_interval': 60,
+        'backend': {
+            'engine': 'frf.cache.engines.redis.RedisCacheEngine',
+            'host': 'localhost',
+            'port': 6379,
+        },
+    }
 """
 
 import copy
+import functools
 from gettext import gettext as _
+import hashlib
+import inspect
+
+import falcon
 
 from frf.cache import exceptions
 from frf.utils.importing import import_class
+from frf.utils.json import deserialize, serialize
 
 _cache_engine = None
 
 
-def init(args):
-    """Set up the connection variables.
+def create_engine(args):
+    """Create a cache engine from a configuration dictionary.
+
+    This is what :func:`init` uses to build the engine from the ``CACHE``
+    setting.  Engines that wrap other engines (such as
+    :class:`frf.cache.engines.tiered.TieredCacheEngine`) use it to build
+    their backends from nested configuration dictionaries.
 
     Args:
-        args (dict): Argument to use to initialize the cache engine.
-    """
-    global _cache_engine
+        args (dict): The engine configuration.  Must contain an ``engine``
+            key with the import path of the engine class.
 
+    Raises:
+        :class:`frf.cache.exceptions.CacheInvalidEngine`: If the
+            configuration is invalid.
+
+    Returns:
+        :class:`frf.cache.engines.base.CacheEngine`: The new cache engine.
+    """
     if not isinstance(args, dict):
         raise exceptions.CacheInvalidEngine(
             _('Invalid configuration specified.'))
@@ -69,7 +154,18 @@ def init(args):
         args['default_timeout'] = 30
 
     engine_cls = import_class(engine_cls_name)
-    _cache_engine = engine_cls(**args)
+    return engine_cls(**args)
+
+
+def init(args):
+    """Set up the connection variables.
+
+    Args:
+        args (dict): Argument to use to initialize the cache engine.
+    """
+    global _cache_engine
+
+    _cache_engine = create_engine(args)
 
 
 def get_engine():
@@ -88,9 +184,27 @@ def get_engine():
     return _cache_engine
 
 
+def after_fork():
+    """Prepare the cache engine for use in a newly forked process.
+
+    Called by :func:`frf.app.post_fork`.
+
+    Raises:
+        :class:`frf.cache.exceptions.CacheNotInitializedError`: If the cache
+            has not yet been initialized.
+    """
+    if _cache_engine is None:
+        raise exceptions.CacheNotInitializedError()
+
+    _cache_engine.after_fork()
+
+
 def get(key, default=None):
     """Get a value from the store.
 
+    Values stored with tags that were invalidated since are treated as
+    missing.
+
     Args:
         key (str): The key
         default (object): Default to return if the backend returns None
@@ -100,15 +214,15 @@ def get(key, default=None):
             has not yet been initialized.
 
     Returns:
-        :class:`frf.cache.engines.base.CacheEngine`: The current cache engine.
+        object: The value, or ``default``.
     """
     if _cache_engine is None:
         raise exceptions.CacheNotInitializedError()
 
-    return _cache_engine.get(key, default)
+    return _cache_engine.tagged_get(key, default)
 
 
-def set(key, value, timeout=None):
+def set(key, value, timeout=None, tags=None):
     """Set a value.
 
     Args:
@@ -117,18 +231,131 @@ def set(key, value, timeout=None):
         timeout (int): The expiration, in seconds.  If set to None, the
             ``DEFAULT_CACHE_TIMEOUT`` setting will be used. If set to 0, the
             value will not be set to expire.
+        tags (list): Tags for the value.  Once any of them is passed to
+            :func:`invalidate_tags`, the value is treated as missing.
+
+    Raises:
+        :class:`frf.cache.exceptions.CacheNotInitializedError`: If the cache
+            has not yet been initialized.
+    """
+    if _cache_engine is None:
+        raise exceptions.CacheNotInitializedError()
+
+    _cache_engine.tagged_set(key, value, timeout, tags)
+
+
+def invalidate_tags(tags):
+    """Invalidate all the values stored with any of ``tags``.
+
+    This is ``O(1)`` per tag: the generation of each tag is replaced, and
+    values stored with an older generation are treated as missing until they
+    expire.
+
+    >>> from frf import cache
+    >>> cache.set('company:1:calendars', calendars, tags=['company:1'])
+    >>> cache.invalidate_tags(['company:1'])
+    >>> cache.get('company:1:calendars')
+    >>>
+
+    Args:
+        tags (list): The tags
+
+    Raises:
+        :class:`frf.cache.exceptions.CacheNotInitializedError`: If the cache
+            has not yet been initialized.
+    """
+    if _cache_engine is None:
+        raise exceptions.CacheNotInitializedError()
+
+    _cache_engine.invalidate_tags(tags)
+
+
+class Namespace(object):
+    """A group of keys that can be cleared all at once.
+
+    Use :func:`namespace` to create one.  Keys are prefixed with the namespace
+    name, and stored with a tag for the namespace, so :meth:`clear` doesn't
+    need to look at the keys.
+
+    >>> from frf import cache
+    >>> company_cache = cache.namespace('company:1')
+    >>> company_cache.set('calendars', calendars)
+    >>> company_cache.clear()
+    >>> company_cache.get('calendars')
+    >>>
+    """
+    def __init__(self, name):
+        self.name = name
+        self.tag = 'namespace:{}'.format(name)
+
+    def make_key(self, key):
+        return 'ns:{}:{}'.format(self.name, key)
+
+    def get_tags(self, tags=None):
+        return [self.tag] + list(tags or [])
+
+    def get(self, key, default=None):
+        """Get a value, see :func:`frf.cache.get`."""
+        return get(self.make_key(key), default)
+
+    def set(self, key, value, timeout=None, tags=None):
+        """Set a value, see :func:`frf.cache.set`."""
+        set(self.make_key(key), value, timeout, self.get_tags(tags))
+
+    def get_or_set(self, key, producer, timeout=None, tags=None, **kwargs):
+        """Get or compute a value, see :func:`frf.cache.get_or_set`."""
+        return get_or_set(self.make_key(key), producer, timeout,
+                          tags=self.get_tags(tags), **kwargs)
+
+    def delete(self, key):
+        """Delete a value, see :func:`frf.cache.delete`."""
+        delete(self.make_key(key))
+
+    def clear(self):
+        """Clear all the values in this namespace."""
+        invalidate_tags([self.tag])
+
+
+def namespace(name):
+    """Return a :class:`Namespace` named ``name``."""
+    return Namespace(name)
+
+
+def get_or_set(key, producer, timeout=None, tags=None, **kwargs):
+    """Get a value, computing and storing it if it is missing.
+
+    Protects against cache stampedes: when the value is missing, only one
+    caller, across threads and processes, calls ``producer``, while the others
+    wait for it to store the value.  Values are also recomputed by a single
+    caller shortly before they expire.
+
+    >>> from frf import cache
+    >>> cache.get_or_set('answer', lambda: compute_answer(), timeout=60)
+    42
+
+    See :meth:`frf.cache.engines.base.CacheEngine.get_or_set` for the
+    additional keyword arguments.
+
+    Args:
+        key (str): The key
+        producer (callable): Called without arguments to compute the value.
+        timeout (int): The expiration, in seconds.  If set to None, the
+            engine's ``default_timeout`` will be used. If set to 0, the value
+            will not be set to expire.
+        tags (list): Tags for the value, see :func:`set`.
 
     Raises:
         :class:`frf.cache.exceptions.CacheNotInitializedError`: If the cache
             has not yet been initialized.
 
     Returns:
-        :class:`frf.cache.engines.base.CacheEngine`: The current cache engine.
+        object: The value.
     """
     if _cache_engine is None:
         raise exceptions.CacheNotInitializedError()
 
-    _cache_engine.set(key, value, timeout)
+    return _cache_engine.get_or_set(
+        key, producer, timeout, tags=tags, **kwargs)
 
 
 def delete(key):
@@ -164,3 +391,185 @@ def clear():
         raise exceptions.CacheNotInitializedError()
 
     _cache_engine.clear()
+
+
+def _find_request(args):
+    for index, arg in enumerate(args[:2]):
+        if isinstance(arg, falcon.Request):
+            return index
+
+    return None
+
+
+def _get_context_keys():
+    """Return the request context entries the renderers read."""
+    from frf.viewsets import ViewSet
+    return (ViewSet.META_CONTEXT_KEY, ViewSet.INCLUDED_CONTEXT_KEY)
+
+
+def cached(timeout=None, key=None, params=None, headers=None, tags=None):
+    """Cache the return value of a function.
+
+    Works with plain functions and methods, where the key is built from the
+    arguments, and with view handlers (methods of a
+    :class:`frf.views.View` or a viewset, and :func:`frf.decorators.simpleview`
+    functions), where the key is built from the request path, query
+    parameters and selected headers, and the response status, body, the
+    headers set by the handler, except cookies, and the pagination and
+    ``?include=`` data it left for the renderer are cached.  Values are
+    computed with :func:`get_or_set`, so only one caller
+    computes a missing value at a time.
+
+    Example:
+
+    .. code-block:: python
+
+        from frf import cache
+
+
+        @cache.cached(timeout=300)
+        def exchange_rate(currency):
+            return rates_api.get(currency)
+
+
+        class CalendarViewSet(viewsets.ModelViewSet):
+            @cache.cached(timeout=30, headers=('Authorization', ))
+            def list(self, req, resp, **kwargs):
+                super().list(req, resp, **kwargs)
+
+    When used with :func:`frf.decorators.simpleview`, ``cached`` must be
+    applied first, that is, below ``simpleview``.
+
+    The decorated function has the following attributes:
+
+    * ``bypass(*args, **kwargs)``: call the function without the cache.
+    * ``refresh(*args, **kwargs)``: call the function and store the result.
+    * ``invalidate(*args, **kwargs)``: delete the cached result.
+    * ``make_key(*args, **kwargs)``: return the cache key.
+
+    They take the same arguments as the function, including ``self`` for
+    methods.
+
+    Arguments of plain functions must be JSON serializable, and their return
+    values must be supported by the engine codec.  ``None`` is never cached.
+    The first argument of methods is left out of the key when it is named
+    ``self`` or ``cls``.
+
+    Args:
+        timeout (int): The expiration, in seconds, same as :func:`set`.
+        key (str or callable): The prefix of the keys, by default the module
+            and name of the function.  If a callable, it is called with the
+            arguments of the function and returns the whole key.
+        params (list): For view handlers, the query parameters that make up
+            the key.  By default, all of them.
+        headers (list): For view handlers, the request headers that make up
+            the key.  None by default, so responses that depend on the user
+            should list ``Authorization`` or the relevant header.
+        tags (list): Tags for the cached values, see :func:`set`.
+    """
+    def decorator(function):
+        prefix = key if isinstance(key, str) else '{}.{}'.format(
+            function.__module__, function.__qualname__)
+        arg_names = list(inspect.signature(function).parameters)
+        skip_first = bool(arg_names) and arg_names[0] in ('self', 'cls')
+
+        def make_key(*args, **kwargs):
+            if callable(key):
+                return key(*args, **kwargs)
+
+            request_index = _find_request(args)
+            if request_index is not None:
+                req = args[request_index]
+                query = req.params
+                if params is not None:
+                    query = {
+                        name: query[name] for name in params
+                        if name in query}
+                parts = {
+                    'method': req.method,
+                    'path': req.path,
+                    'params': query,
+                    'headers': {
+                        name: req.get_header(name)
+                        for name in headers or ()},
+                }
+            else:
+                parts = {
+                    'args': args[1:] if skip_first else args,
+                    'kwargs': kwargs,
+                }
+
+            digest = hashlib.sha1(serialize(
+                parts, sort_keys=True, default=str).encode('utf-8'))
+            return '{}:{}'.format(prefix, digest.hexdigest())
+
+        def produce(args, kwargs):
+            request_index = _find_request(args)
+            if request_index is None:
+                return function(*args, **kwargs)
+
+            req = args[request_index]
+            resp = args[request_index + 1]
+            # headers set before the handler, by middleware for example, are
+            # set again on every request
+            before = dict(resp._headers)
+            function(*args, **kwargs)
+            if not str(resp.status).startswith('2'):
+                return None
+
+            return serialize({
+                'status': resp.status,
+                'body': resp.body,
+                'headers': {
+                    name: value for name, value in resp._headers.items()
+                    if before.get(name) != value},
+                'context': {
+                    name: req.context[name] for name in _get_context_keys()
+                    if name in req.context},
+            })
+
+        def restore(args, value):
+            request_index = _find_request(args)
+            req = args[request_index]
+            resp = args[request_index + 1]
+            value = deserialize(value)
+            resp.status = value['status']
+            resp.body = value['body']
+            resp.set_headers(value.get('headers', {}))
+            req.context.update(value.get('context', {}))
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _cache_engine is None:
+                raise exceptions.CacheNotInitializedError()
+
+            computed = []
+
+            def producer():
+                computed.append(True)
+                return produce(args, kwargs)
+
+            value = _cache_engine.get_or_set(
+                make_key(*args, **kwargs), producer, timeout, tags=tags)
+            if _find_request(args) is None:
+                return value
+            if not computed:
+                restore(args, value)
+
+        def refresh(*args, **kwargs):
+            value = produce(args, kwargs)
+            if value is not None:
+                set(make_key(*args, **kwargs), value, timeout, tags=tags)
+            if _find_request(args) is None:
+                return value
+
+        def invalidate(*args, **kwargs):
+            delete(make_key(*args, **kwargs))
+
+        wrapper.bypass = function
+        wrapper.refresh = refresh
+        wrapper.invalidate = invalidate
+        wrapper.make_key = make_key
+        return wrapper
+
+    return decorator
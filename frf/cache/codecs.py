@@ -0,0 +1,181 @@
+# Copyright 2016 by Teem, and other contributors,
+# as noted in the individual source code files.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# By contributing to this project, you agree to also license your source
+# code under the terms of the Apache License, Version 2.0, as described
+# above.
+
+"""Value codecs for cache engines.
+
+A codec converts values to ``bytes`` before they are stored by a cache
+engine, and back after they are read.  The codec is chosen per engine with
+the ``codec`` key of its configuration, and values can be compressed with
+``zlib`` when they are larger than ``compress_threshold`` bytes:
+
+.. code-block:: text
+
+    CACHE = {
+        'engine': 'frf.cache.engines.redis.RedisCacheEngine',
+        'codec': 'json',
+        'compress_threshold': 1024,
+        'compress_level': 6,
+    }
+
+The available codecs are ``string``, ``json``, ``pickle`` and ``msgpack``
+(if the ``msgpack`` package is installed).  You can also pass the import path
+of your own :class:`Codec` subclass.
+
+Only use ``pickle`` if you trust everyone who can write to the cache,
+unpickling data can execute arbitrary code.
+"""
+
+from gettext import gettext as _
+import pickle
+import zlib
+
+from frf.cache import exceptions
+from frf.utils.importing import import_class
+from frf.utils.json import deserialize, serialize
+
+
+class Codec(object):
+    """Base codec."""
+    def encode(self, value):
+        """Convert ``value`` to ``bytes``."""
+        raise NotImplementedError()
+
+    def decode(self, data):
+        """Convert ``data``, as returned by :meth:`encode`, to a value."""
+        raise NotImplementedError()
+
+
+class StringCodec(Codec):
+    """Store values as UTF-8 strings.
+
+    Anything that isn't a string is converted with ``str()``, and values are
+    always read back as strings.
+    """
+    def encode(self, value):
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode('utf8')
+
+    def decode(self, data):
+        if isinstance(data, bytes):
+            return data.decode('utf8')
+        return data
+
+
+class JSONCodec(Codec):
+    """Store values as JSON, using :mod:`frf.utils.json`."""
+    def encode(self, value):
+        return serialize(value).encode('utf8')
+
+    def decode(self, data):
+        if isinstance(data, bytes):
+            data = data.decode('utf8')
+        return deserialize(data)
+
+
+class PickleCodec(Codec):
+    """Store values with :mod:`pickle`."""
+    def encode(self, value):
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def decode(self, data):
+        return pickle.loads(data)
+
+
+class MsgpackCodec(Codec):
+    """Store values with ``msgpack``."""
+    def __init__(self):
+        try:
+            import msgpack
+        except ImportError:
+            raise exceptions.CacheInvalidEngine(
+                _('The msgpack codec requires the msgpack package.'))
+
+        self.msgpack = msgpack
+
+    def encode(self, value):
+        return self.msgpack.packb(value, use_bin_type=True)
+
+    def decode(self, data):
+        return self.msgpack.unpackb(data, raw=False)
+
+
+class CompressedCodec(Codec):
+    """Compress the output of another codec with ``zlib``.
+
+    Only values of at least ``threshold`` bytes are compressed, a one byte
+    header records which values were.
+    """
+    RAW = b'\x00'
+    ZLIB = b'\x01'
+
+    def __init__(self, codec, threshold=0, level=6):
+        self.codec = codec
+        self.threshold = threshold
+        self.level = level
+
+    def encode(self, value):
+        data = self.codec.encode(value)
+        if len(data) >= self.threshold:
+            return self.ZLIB + zlib.compress(data, self.level)
+        return self.RAW + data
+
+    def decode(self, data):
+        if data[:1] == self.ZLIB:
+            return self.codec.decode(zlib.decompress(data[1:]))
+        return self.codec.decode(data[1:])
+
+
+CODECS = {
+    'string': StringCodec,
+    'json': JSONCodec,
+    'pickle': PickleCodec,
+    'msgpack': MsgpackCodec,
+}
+
+
+def get_codec(name, compress_threshold=None, compress_level=6):
+    """Create a codec.
+
+    Args:
+        name (str): One of ``string``, ``json``, ``pickle``, ``msgpack``, or
+            the import path of a :class:`Codec` subclass.  If ``None``, values
+            will be stored as they are, unless ``compress_threshold`` is set,
+            in which case ``pickle`` will be used.
+        compress_threshold (int): If set, values of at least this many bytes
+            will be compressed.
+        compress_level (int): The ``zlib`` compression level.
+
+    Returns:
+        :class:`Codec`: The codec, or ``None``.
+    """
+    if name is None and compress_threshold is None:
+        return None
+
+    name = name or 'pickle'
+    if name in CODECS:
+        codec = CODECS[name]()
+    else:
+        codec = import_class(name)()
+
+    if compress_threshold is not None:
+        codec = CompressedCodec(
+            codec, threshold=compress_threshold, level=compress_level)
+
+    return codec
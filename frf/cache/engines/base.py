@@ -18,7 +18,98 @@
 # above.
 
 
+import contextlib
+import math
+import random
+import threading
+import time
+import uuid
+
+from frf.cache import codecs
+from frf.utils.json import deserialize, serialize
+
+
+class TaggedValue(object):
+    """A value stored with :meth:`CacheEngine.tagged_set`.
+
+    Holds the value, and the generations of its tags at the time it was
+    stored, so that both are read and written at once.
+    """
+    #: prefix of tagged values encoded by a codec, none of the codecs
+    #: produces data starting with it.
+    PREFIX = b'\xfe\xfftags:'
+
+    def __init__(self, value, generations):
+        self.value = value
+        self.generations = generations
+
+
 class CacheEngine(object):
+    #: the :class:`frf.cache.codecs.Codec` used to convert values to bytes,
+    #: or ``None`` if this engine stores values as they are.
+    codec = None
+
+    #: called with the key of every item an engine drops to make room for
+    #: new ones.
+    eviction_callback = None
+
+    #: suffix of the key holding the recompute time and expiration of values
+    #: stored with :meth:`get_or_set`.
+    XFETCH_SUFFIX = ':__xfetch'
+
+    #: suffix of the key used to elect the process that recomputes a value in
+    #: :meth:`get_or_set`.
+    LOCK_SUFFIX = ':__lock'
+
+    #: prefix of the keys holding the current generation of each tag.
+    TAG_PREFIX = '__frf_tag:'
+
+    _key_locks = None
+    _key_locks_lock = threading.Lock()
+
+    def configure_codec(self, kwargs, default=None):
+        """Set up ``self.codec`` from the engine configuration.
+
+        Pops the ``codec``, ``compress_threshold`` and ``compress_level``
+        keys from ``kwargs``.  See :mod:`frf.cache.codecs`.
+        """
+        self.codec = codecs.get_codec(
+            kwargs.pop('codec', default),
+            compress_threshold=kwargs.pop('compress_threshold', None),
+            compress_level=kwargs.pop('compress_level', 6))
+
+    def evicted(self, key):
+        """Report that ``key`` was dropped to make room for new items."""
+        if self.eviction_callback is not None:
+            self.eviction_callback(key)
+
+    def encode(self, value):
+        """Convert a value with the engine codec, if it has one."""
+        if self.codec is None:
+            return value
+
+        if isinstance(value, TaggedValue):
+            return b''.join((
+                TaggedValue.PREFIX,
+                serialize(value.generations).encode('utf8'),
+                b'\n',
+                self.codec.encode(value.value)))
+
+        return self.codec.encode(value)
+
+    def decode(self, data):
+        """Convert stored data with the engine codec, if it has one."""
+        if self.codec is None or data is None:
+            return data
+
+        if isinstance(data, bytes) and data.startswith(TaggedValue.PREFIX):
+            generations, _, data = data[len(TaggedValue.PREFIX):].partition(
+                b'\n')
+            return TaggedValue(self.codec.decode(data),
+                               deserialize(generations.decode('utf8')))
+
+        return self.codec.decode(data)
+
     def get(self, key, default, encoding='utf8'):
         """Get a value from the store.
 
@@ -31,7 +122,7 @@ class CacheEngine(object):
         """
         raise NotImplementedError()
 
-    def set(self, key, timeout=None):
+    def set(self, key, value, timeout=None):
         """Set a value.
 
         Args:
@@ -54,3 +145,342 @@ class CacheEngine(object):
     def clear(self):
         """Clear all items in the cache."""
         raise NotImplementedError()
+
+    def publish(self, channel, message):
+        """Send a message to the subscribers of ``channel``.
+
+        Engines shared by several processes should implement this, and
+        :meth:`subscribe`, to let them notify each other.
+
+        Args:
+            channel (str): The channel
+            message (object): The message, which must be JSON serializable.
+        """
+        raise NotImplementedError()
+
+    def subscribe(self, channel):
+        """Iterate over the messages published to ``channel``.
+
+        Blocks waiting for the next message, so this is meant to be consumed
+        by a thread of its own.
+
+        Args:
+            channel (str): The channel
+        """
+        raise NotImplementedError()
+
+    def after_fork(self):
+        """Prepare the engine for use in a newly forked process.
+
+        Engines holding connections should drop the ones inherited from the
+        parent process here, and engines holding locks should create new
+        ones, so that they are cooperative if the process was monkey-patched
+        by gevent after the engine was created.
+        """
+        CacheEngine._key_locks_lock = threading.Lock()
+        self._key_locks = None
+
+    def get_many(self, keys):
+        """Get several values from the store.
+
+        Engines that can fetch several keys in one round trip should override
+        this.
+
+        Args:
+            keys (list): The keys
+
+        Returns:
+            dict: The keys that were found, and their values.
+        """
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def add(self, key, value, timeout=None):
+        """Set a value, only if the key is not already set.
+
+        The default implementation is not atomic, engines that can should
+        override it.
+
+        Args:
+            key (str): The key
+            value (object): The value
+            timeout (int): The expiration, in seconds, same as :meth:`set`.
+
+        Returns:
+            bool: ``True`` if the value was set.
+        """
+        if self.get(key) is not None:
+            return False
+
+        self.set(key, value, timeout)
+        return True
+
+    def incr(self, key, delta=1):
+        """Add ``delta`` to the integer stored at ``key``, and return it.
+
+        A missing key is created, and does not expire; an existing key keeps
+        its expiration.
+
+        The default implementation is only atomic between the threads of the
+        current process, engines that can should override it.
+
+        Args:
+            key (str): The key
+            delta (int): The amount to add.
+
+        Returns:
+            int: The new value.
+        """
+        with self._key_lock(key):
+            value = int(self.get(key) or 0) + delta
+            self.set(key, value, 0)
+            return value
+
+    def get_many_with_ttl(self, keys):
+        """Get several values from the store, and how long they have left.
+
+        Engines that know when their values expire should override this, the
+        default implementation doesn't report it.
+
+        Args:
+            keys (list): The keys
+
+        Returns:
+            dict: For each key that was found, its value and the number of
+            seconds before it expires, or ``None`` if it doesn't expire or the
+            engine can't tell.
+        """
+        return {key: (value, None)
+                for key, value in self.get_many(keys).items()}
+
+    @contextlib.contextmanager
+    def _key_lock(self, key, blocking=True, timeout=-1):
+        """Per-key lock, shared by the threads of the current process."""
+        with CacheEngine._key_locks_lock:
+            if self._key_locks is None:
+                self._key_locks = {}
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+
+        lock = entry[0]
+        acquired = lock.acquire(blocking, timeout if blocking else -1)
+
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                lock.release()
+            with CacheEngine._key_locks_lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._key_locks[key]
+
+    def _should_refresh(self, xfetch, beta):
+        """Decide whether a value should be recomputed before it expires.
+
+        Uses probabilistic early expiration (XFetch): the closer a value is to
+        its expiration, and the longer it took to compute, the more likely it
+        is to be recomputed.
+        """
+        if not xfetch or not beta:
+            return False
+
+        try:
+            delta, expiration = (float(i) for i in xfetch.split())
+        except ValueError:
+            return False
+
+        return time.time() - delta * beta * math.log(
+            1.0 - random.random()) >= expiration
+
+    def _wait_for(self, key, timeout, interval):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            time.sleep(interval)
+            value = self.tagged_get(key)
+            if value is not None:
+                return value
+
+    def _get_entry(self, key):
+        """Return the value of a key, and its XFetch data.
+
+        The value is ``None`` if one of its tags was invalidated.
+        """
+        xfetch_key = key + self.XFETCH_SUFFIX
+
+        values = self.get_many([key, xfetch_key])
+        return self._unwrap(values.get(key)), values.get(xfetch_key)
+
+    def _unwrap(self, value):
+        """Return a stored value, or ``None`` if its tags were invalidated."""
+        if not isinstance(value, TaggedValue):
+            return value
+
+        generations = value.generations
+        current = self.get_many(
+            [self.TAG_PREFIX + tag for tag in generations])
+
+        for tag, generation in generations.items():
+            if generation is None or \
+                    current.get(self.TAG_PREFIX + tag) != generation:
+                return None
+
+        return value.value
+
+    def get_tag_generations(self, tags):
+        """Return the current generation of each tag.
+
+        Tags that don't have a generation yet are given one.
+
+        Args:
+            tags (list): The tags
+
+        Returns:
+            dict: The generation of each tag, ``None`` for the tags whose
+            generation could not be stored.
+        """
+        keys = {tag: self.TAG_PREFIX + tag for tag in tags}
+        current = self.get_many(list(keys.values()))
+
+        missing = [key for key in keys.values() if key not in current]
+        if missing:
+            for key in missing:
+                self.add(key, uuid.uuid4().hex, 0)
+            current.update(self.get_many(missing))
+
+        return {tag: current.get(key) for tag, key in keys.items()}
+
+    def tagged_get(self, key, default=None):
+        """Get a value, unless one of its tags was invalidated.
+
+        Args:
+            key (str): The key
+            default (object): Default to return if the value is missing or
+                was invalidated.
+        """
+        value = self._unwrap(self.get(key))
+        return default if value is None else value
+
+    def tagged_set(self, key, value, timeout=None, tags=None):
+        """Set a value, and record its tags.
+
+        The value will be treated as missing by :meth:`tagged_get` and
+        :meth:`get_or_set` once one of its tags is passed to
+        :meth:`invalidate_tags`.
+
+        Args:
+            key (str): The key
+            value (object): The value
+            timeout (int): The expiration, in seconds, same as :meth:`set`.
+            tags (list): The tags
+        """
+        if tags:
+            # the generations are read before the value is written, so that
+            # an invalidation happening in between is never missed.
+            generations = self.get_tag_generations(tags)
+            if None in generations.values():
+                # the value could not be invalidated, don't keep it, nor the
+                # previous one
+                self.delete(key)
+                return
+            value = TaggedValue(value, generations)
+
+        self.set(key, value, timeout)
+
+    def invalidate_tags(self, tags):
+        """Invalidate all the values stored with any of ``tags``.
+
+        This only replaces the generation of each tag, the values are left to
+        expire on their own.
+
+        Args:
+            tags (list): The tags
+        """
+        for tag in tags:
+            self.set(self.TAG_PREFIX + tag, uuid.uuid4().hex, 0)
+
+    def get_or_set(self, key, producer, timeout=None, tags=None, beta=1.0,
+                   lock_timeout=10, lock_wait_interval=0.05):
+        """Get a value, computing and storing it if it is missing.
+
+        Only one caller recomputes a missing value at a time: threads of the
+        same process wait on a lock for the key, and other processes wait on a
+        lock key stored in the cache itself.  If the lock holder does not
+        store the value within ``lock_timeout`` seconds, the waiting caller
+        computes it itself.
+
+        Values are also recomputed, by a single caller, shortly before they
+        expire, while everyone else keeps getting the current value.
+
+        ``None`` is never cached, so a producer returning ``None`` will be
+        called every time.
+
+        Args:
+            key (str): The key
+            producer (callable): Called without arguments to compute the
+                value.
+            timeout (int): The expiration, in seconds, same as :meth:`set`.
+            tags (list): Tags to store the value with, see
+                :meth:`tagged_set`.
+            beta (float): How eagerly values are recomputed before they
+                expire.  ``1.0`` is usually right, larger values recompute
+                earlier, and ``0`` disables early recomputation.
+            lock_timeout (int): How long, in seconds, to wait for another
+                caller to compute the value.
+            lock_wait_interval (float): How often, in seconds, to check if
+                another process has stored the value.
+
+        Returns:
+            object: The value.
+        """
+        if timeout is None:
+            timeout = getattr(self, 'default_timeout', 0)
+
+        value, xfetch = self._get_entry(key)
+        if value is not None and not self._should_refresh(xfetch, beta):
+            return value
+
+        # when the value is only being refreshed early, don't wait for other
+        # threads, just return the value we already have.
+        with self._key_lock(key, value is None, lock_timeout) as acquired:
+            if not acquired:
+                return value if value is not None else producer()
+
+            current, xfetch = self._get_entry(key)
+            if current is not None and not self._should_refresh(
+                    xfetch, beta):
+                return current
+
+            lock_key = key + self.LOCK_SUFFIX
+            token = uuid.uuid4().hex
+
+            if not self.add(lock_key, token, lock_timeout):
+                # another process is computing the value
+                if value is not None:
+                    return value
+
+                value = self._wait_for(key, lock_timeout, lock_wait_interval)
+                if value is not None:
+                    return value
+
+            xfetch_key = key + self.XFETCH_SUFFIX
+            try:
+                start = time.time()
+                value = producer()
+                delta = time.time() - start
+
+                self.tagged_set(key, value, timeout, tags)
+                if timeout:
+                    self.set(xfetch_key, '{} {}'.format(
+                        delta, time.time() + timeout), timeout)
+                else:
+                    self.delete(xfetch_key)
+            finally:
+                if self.get(lock_key) == token:
+                    self.delete(lock_key)
+
+        return value
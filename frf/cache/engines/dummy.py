@@ -49,6 +49,7 @@ class DummyItem(object):
 class DummyCacheEngine(CacheEngine):
     def __init__(self, **kwargs):
         self.default_timeout = kwargs.pop('default_timeout')
+        self.configure_codec(kwargs)
         self.items = {}
 
     def get(self, key, default=None):
@@ -59,13 +60,28 @@ class DummyCacheEngine(CacheEngine):
                 del self.items[key]
             return default
 
-        return value.value
+        return self.decode(value.value)
 
     def set(self, key, value, timeout=None):
         if timeout is None:
             timeout = self.default_timeout
 
-        self.items[key] = DummyItem(value, timeout)
+        self.items[key] = DummyItem(self.encode(value), timeout)
+
+    def get_many_with_ttl(self, keys):
+        now = timezone.now()
+        values = {}
+        for key in keys:
+            item = self.items.get(key)
+            if item is None or item.is_expired:
+                continue
+
+            ttl = None
+            if item.expiration:
+                ttl = (item.expiration - now).total_seconds()
+            values[key] = (self.decode(item.value), ttl)
+
+        return values
 
     def delete(self, key):
         if key in self.items:
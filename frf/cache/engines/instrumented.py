@@ -0,0 +1,365 @@
+# Copyright 2016 by Teem, and other contributors,
+# as noted in the individual source code files.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# By contributing to this project, you agree to also license your source
+# code under the terms of the Apache License, Version 2.0, as described
+# above.
+
+import bisect
+import copy
+import logging
+import random
+import sys
+import threading
+import time
+
+from frf import cache
+from frf.utils.json import deserialize, serialize
+from .base import CacheEngine, TaggedValue
+
+logger = logging.getLogger(__name__)
+
+#: upper bounds, in milliseconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000)
+
+#: upper bounds, in bytes, of the value size histogram buckets.
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+#: key of the number of processes that published their statistics.  Each
+#: one stores them under this key, followed by its number.
+STATS_INDEX_KEY = '__frf_cachestats'
+
+#: how many statistics keys :meth:`InstrumentedCacheEngine.collect_stats`
+#: reads at once.
+COLLECT_BATCH_SIZE = 500
+
+
+def new_stats():
+    return {
+        'hits': 0,
+        'misses': 0,
+        'sets': 0,
+        'deletes': 0,
+        'evictions': 0,
+        'operations': 0,
+        'latency_total': 0.0,
+        'latency': [0] * (len(LATENCY_BUCKETS) + 1),
+        'bytes_read': 0,
+        'bytes_written': 0,
+        'sizes': [0] * (len(SIZE_BUCKETS) + 1),
+    }
+
+
+def merge_stats(stats, other):
+    """Add the counters of ``other`` to ``stats``.
+
+    Both are dictionaries of statistics by key prefix, as returned by
+    :meth:`InstrumentedCacheEngine.get_stats`.
+    """
+    for prefix, counters in other.items():
+        current = stats.setdefault(prefix, new_stats())
+        for name, value in counters.items():
+            if isinstance(value, list):
+                current[name] = [a + b for a, b in zip(current[name], value)]
+            else:
+                current[name] += value
+
+    return stats
+
+
+def percentile(histogram, buckets, fraction):
+    """Estimate a percentile from a histogram.
+
+    Returns the upper bound of the bucket holding the percentile, or ``None``
+    if it is in the last, unbounded, bucket or the histogram is empty.
+    """
+    total = sum(histogram)
+    if not total:
+        return None
+
+    seen = 0
+    for index, count in enumerate(histogram):
+        seen += count
+        if seen >= total * fraction:
+            return buckets[index] if index < len(buckets) else None
+
+
+def summarize(counters):
+    """Return the derived figures of the statistics of one prefix."""
+    reads = counters['hits'] + counters['misses']
+    return {
+        'hit_rate': counters['hits'] / reads if reads else None,
+        'latency_avg': (counters['latency_total'] / counters['operations']
+                        if counters['operations'] else None),
+        'latency_p50': percentile(
+            counters['latency'], LATENCY_BUCKETS, 0.5),
+        'latency_p99': percentile(
+            counters['latency'], LATENCY_BUCKETS, 0.99),
+        'size_p50': percentile(counters['sizes'], SIZE_BUCKETS, 0.5),
+        'size_p99': percentile(counters['sizes'], SIZE_BUCKETS, 0.99),
+    }
+
+
+class InstrumentedCacheEngine(CacheEngine):
+    """Record statistics about the use of another engine.
+
+    Wraps a ``backend`` engine, and counts hits, misses, sets, deletes and
+    evictions, the latency of each operation and the size of the values, per
+    key prefix.  The prefix of a key is everything before the
+    ``prefix_depth``-th ``prefix_separator``, so with the defaults, the prefix
+    of ``calendars:1:events`` is ``calendars``.  The internal keys used by
+    tags, locks and early refresh are counted under ``__frf``.
+
+    Every ``flush_interval`` seconds, each process stores its statistics in
+    the backend, so that ``manage.py cachestats`` can report them for all the
+    processes sharing the backend, and logs them if ``log_stats`` is set.
+
+    Options:
+        backend (dict): Configuration of the wrapped engine, in the same
+            format as the ``CACHE`` setting.
+        prefix_separator (str): Default is ``:``.
+        prefix_depth (int): Default is ``1``.
+        flush_interval (int): Default is ``60``.  Set to ``0`` to keep the
+            statistics in the current process only.
+        log_stats (bool): Log the statistics of the current process when
+            they are flushed.  Default is ``False``.
+        measure_sizes (bool): Record the size of values.  Default is
+            ``True``.
+        size_sample_rate (float): The fraction of values that are not strings
+            or bytes whose size is measured, by encoding them with the
+            backend codec, if it has one.  The byte counters are estimated
+            from them.  Default is ``0.1``.
+    """
+    def __init__(self, **kwargs):
+        self.default_timeout = kwargs.pop('default_timeout')
+        self.prefix_separator = kwargs.pop('prefix_separator', ':')
+        self.prefix_depth = kwargs.pop('prefix_depth', 1)
+        self.flush_interval = kwargs.pop('flush_interval', 60)
+        self.log_stats = kwargs.pop('log_stats', False)
+        self.measure_sizes = kwargs.pop('measure_sizes', True)
+        self.size_sample_rate = kwargs.pop('size_sample_rate', 0.1)
+
+        backend_args = dict(kwargs.pop('backend', {}))
+        backend_args.setdefault('default_timeout', self.default_timeout)
+        self.backend = cache.create_engine(backend_args)
+        self.backend.eviction_callback = self.record_eviction
+
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.last_flush = time.monotonic()
+        self.number = None
+
+    def get_prefix(self, key):
+        if key.startswith('__') or ':__' in key:
+            return '__frf'
+
+        parts = key.split(self.prefix_separator, self.prefix_depth)
+        return self.prefix_separator.join(parts[:self.prefix_depth])
+
+    def get_size(self, value):
+        if self.backend.codec is not None:
+            return len(self.backend.encode(value))
+        return sys.getsizeof(value)
+
+    def get_stats(self):
+        """Return the statistics of the current process, by key prefix."""
+        with self.lock:
+            return copy.deepcopy(self.stats)
+
+    def reset_stats(self):
+        """Reset the statistics of the current process."""
+        with self.lock:
+            self.stats = {}
+
+    def record(self, key, elapsed, **counts):
+        latency = elapsed * 1000.0
+        prefix = self.get_prefix(key)
+
+        with self.lock:
+            stats = self.stats.get(prefix)
+            if stats is None:
+                stats = self.stats[prefix] = new_stats()
+
+            stats['operations'] += 1
+            stats['latency_total'] += latency
+            stats['latency'][bisect.bisect_left(
+                LATENCY_BUCKETS, latency)] += 1
+
+            for name, value in counts.items():
+                stats[name] += value
+
+    def record_size(self, key, value, counter):
+        if not self.measure_sizes:
+            return
+
+        if isinstance(value, TaggedValue):
+            value = value.value
+
+        if isinstance(value, (bytes, str)):
+            size = total = len(value)
+        elif random.random() < self.size_sample_rate:
+            size = self.get_size(value)
+            total = int(size / self.size_sample_rate)
+        else:
+            return
+
+        prefix = self.get_prefix(key)
+
+        with self.lock:
+            stats = self.stats.setdefault(prefix, new_stats())
+            stats[counter] += total
+            stats['sizes'][bisect.bisect_left(SIZE_BUCKETS, size)] += 1
+
+    def record_eviction(self, key):
+        prefix = self.get_prefix(key)
+        with self.lock:
+            self.stats.setdefault(prefix, new_stats())['evictions'] += 1
+
+    def record_read(self, key, value, elapsed):
+        if value is None:
+            self.record(key, elapsed, misses=1)
+        else:
+            self.record(key, elapsed, hits=1)
+            self.record_size(key, value, 'bytes_read')
+
+    def get_worker_key(self, number):
+        return '{}:{}'.format(STATS_INDEX_KEY, number)
+
+    def maybe_flush(self):
+        if not self.flush_interval:
+            return
+
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last_flush < self.flush_interval:
+                return
+            self.last_flush = now
+
+        self.flush()
+
+    def flush(self):
+        """Store the statistics of the current process in the backend."""
+        stats = self.get_stats()
+        timeout = max(self.flush_interval * 10, 600)
+
+        try:
+            if self.number is None:
+                self.number = self.backend.incr(STATS_INDEX_KEY)
+            self.backend.set(
+                self.get_worker_key(self.number), serialize(stats), timeout)
+        except Exception as e:
+            logger.warning('Could not store cache statistics: %s', e)
+
+        if self.log_stats:
+            for prefix, counters in sorted(stats.items()):
+                summary = summarize(counters)
+                logger.info(
+                    'cache prefix=%s hits=%s misses=%s sets=%s evictions=%s '
+                    'latency_avg=%s latency_p99=%s', prefix,
+                    counters['hits'], counters['misses'], counters['sets'],
+                    counters['evictions'], summary['latency_avg'],
+                    summary['latency_p99'])
+
+    def collect_stats(self):
+        """Return the statistics of all the processes sharing the backend.
+
+        Processes that have not stored their statistics for a while are
+        left out, their statistics expired.
+        """
+        count = int(self.backend.get(STATS_INDEX_KEY) or 0)
+        stats = {}
+
+        for start in range(1, count + 1, COLLECT_BATCH_SIZE):
+            keys = [self.get_worker_key(number) for number in range(
+                start, min(start + COLLECT_BATCH_SIZE, count + 1))]
+            for data in self.backend.get_many(keys).values():
+                merge_stats(stats, deserialize(data))
+
+        return stats
+
+    def after_fork(self):
+        super().after_fork()
+        self.backend.after_fork()
+        self.lock = threading.Lock()
+        self.reset_stats()
+        self.last_flush = time.monotonic()
+        self.number = None
+
+    def get(self, key, default=None):
+        start = time.perf_counter()
+        value = self.backend.get(key)
+        self.record_read(key, value, time.perf_counter() - start)
+        self.maybe_flush()
+
+        return default if value is None else value
+
+    def get_many(self, keys):
+        start = time.perf_counter()
+        values = self.backend.get_many(keys)
+        elapsed = (time.perf_counter() - start) / max(len(keys), 1)
+
+        for key in keys:
+            self.record_read(key, values.get(key), elapsed)
+        self.maybe_flush()
+
+        return values
+
+    def get_many_with_ttl(self, keys):
+        start = time.perf_counter()
+        values = self.backend.get_many_with_ttl(keys)
+        elapsed = (time.perf_counter() - start) / max(len(keys), 1)
+
+        for key in keys:
+            self.record_read(key, values.get(key, (None, None))[0], elapsed)
+        self.maybe_flush()
+
+        return values
+
+    def incr(self, key, delta=1):
+        start = time.perf_counter()
+        value = self.backend.incr(key, delta)
+        self.record(key, time.perf_counter() - start, sets=1)
+
+        return value
+
+    def add(self, key, value, timeout=None):
+        start = time.perf_counter()
+        added = self.backend.add(key, value, timeout)
+        self.record(key, time.perf_counter() - start, sets=int(added))
+        if added:
+            self.record_size(key, value, 'bytes_written')
+
+        return added
+
+    def set(self, key, value, timeout=None):
+        start = time.perf_counter()
+        self.backend.set(key, value, timeout)
+        self.record(key, time.perf_counter() - start, sets=1)
+        self.record_size(key, value, 'bytes_written')
+        self.maybe_flush()
+
+    def delete(self, key):
+        start = time.perf_counter()
+        self.backend.delete(key)
+        self.record(key, time.perf_counter() - start, deletes=1)
+
+    def clear(self):
+        self.backend.clear()
+
+    def publish(self, channel, message):
+        self.backend.publish(channel, message)
+
+    def subscribe(self, channel):
+        return self.backend.subscribe(channel)
@@ -0,0 +1,128 @@
+# Copyright 2016 by Teem, and other contributors,
+# as noted in the individual source code files.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# By contributing to this project, you agree to also license your source
+# code under the terms of the Apache License, Version 2.0, as described
+# above.
+
+import collections
+import threading
+import time
+
+from .base import CacheEngine
+
+
+class LocMemCacheEngine(CacheEngine):
+    """Thread safe, per-process LRU cache.
+
+    Holds at most ``max_entries`` items.  When full, the least recently used
+    item is dropped to make room for new ones.  Set ``max_entries`` to ``0``
+    for an unbounded cache.
+    """
+    def __init__(self, **kwargs):
+        self.default_timeout = kwargs.pop('default_timeout')
+        self.max_entries = kwargs.pop('max_entries', 1000)
+        self.configure_codec(kwargs)
+        self.items = collections.OrderedDict()
+        self.lock = threading.RLock()
+
+    def after_fork(self):
+        super().after_fork()
+        self.lock = threading.RLock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return default
+
+            value, expiration = item
+            if expiration is not None and time.monotonic() > expiration:
+                del self.items[key]
+                return default
+
+            self.items.move_to_end(key)
+            return self.decode(value)
+
+    def set(self, key, value, timeout=None):
+        if timeout is None:
+            timeout = self.default_timeout
+
+        expiration = None
+        if timeout:
+            expiration = time.monotonic() + timeout
+
+        value = self.encode(value)
+
+        with self.lock:
+            self.items[key] = (value, expiration)
+            self.items.move_to_end(key)
+
+            if self.max_entries:
+                while len(self.items) > self.max_entries:
+                    self.evicted(self.items.popitem(last=False)[0])
+
+    def add(self, key, value, timeout=None):
+        with self.lock:
+            if self.get(key) is not None:
+                return False
+
+            self.set(key, value, timeout)
+            return True
+
+    def incr(self, key, delta=1):
+        with self.lock:
+            expiration = None
+            item = self.items.get(key)
+            if item is not None and (
+                    item[1] is None or time.monotonic() <= item[1]):
+                expiration = item[1]
+                value = int(self.decode(item[0])) + delta
+            else:
+                value = delta
+
+            self.items[key] = (self.encode(value), expiration)
+            self.items.move_to_end(key)
+
+            if self.max_entries:
+                while len(self.items) > self.max_entries:
+                    self.evicted(self.items.popitem(last=False)[0])
+
+            return value
+
+    def get_many_with_ttl(self, keys):
+        now = time.monotonic()
+        values = {}
+        with self.lock:
+            for key in keys:
+                item = self.items.get(key)
+                if item is None:
+                    continue
+
+                value, expiration = item
+                if expiration is None:
+                    values[key] = (self.decode(value), None)
+                elif now <= expiration:
+                    values[key] = (self.decode(value), expiration - now)
+
+        return values
+
+    def delete(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
@@ -17,6 +17,7 @@
 # code under the terms of the Apache License, Version 2.0, as described
 # above.
 
+from frf.utils.json import deserialize, serialize
 from .base import CacheEngine
 
 
@@ -26,36 +27,112 @@ class RedisCacheEngine(CacheEngine):
 
         self.key_prefix = kwargs.pop('key_prefix', '__frf')
         self.default_timeout = kwargs.pop('default_timeout')
+        self.configure_codec(kwargs, default='string')
         self.connection = redis.StrictRedis(**kwargs)
 
     def get_connection(self):
         return self.connection
 
+    def after_fork(self):
+        super().after_fork()
+        self.connection.connection_pool.reset()
+
     def _get_key(self, key):
         return '{}:{}'.format(self.key_prefix, key)
 
     def get(self, key, default=None):
         value = self.connection.get(self._get_key(key))
-        if value is None and default:
-            value = default
+        if value is None:
+            return default
+
+        return self.decode(value)
+
+    def get_many(self, keys):
+        values = {}
+        for key, value in zip(keys, self.connection.mget(
+                [self._get_key(key) for key in keys])):
+            if value is not None:
+                values[key] = self.decode(value)
+
+        return values
+
+    def get_many_with_ttl(self, keys):
+        pipeline = self.connection.pipeline(transaction=False)
+        pipeline.mget([self._get_key(key) for key in keys])
+        for key in keys:
+            pipeline.pttl(self._get_key(key))
+        results = pipeline.execute()
+
+        values = {}
+        for key, value, ttl in zip(keys, results[0], results[1:]):
+            if value is not None:
+                values[key] = (
+                    self.decode(value), ttl / 1000.0 if ttl >= 0 else None)
+
+        return values
+
+    def incr(self, key, delta=1):
+        import redis
+
+        key = self._get_key(key)
+        with self.connection.pipeline() as pipeline:
+            while True:
+                try:
+                    # the value goes through the codec, so INCRBY can't be
+                    # used, retry if another client changes it meanwhile
+                    pipeline.watch(key)
+                    current = pipeline.get(key)
+                    ttl = pipeline.pttl(key)
+                    value = delta
+                    if current is not None:
+                        value += int(self.decode(current))
 
-        if isinstance(value, bytes):
-            value = value.decode('utf8')
+                    pipeline.multi()
+                    pipeline.set(key, self.encode(value),
+                                 px=ttl if ttl > 0 else None)
+                    pipeline.execute()
+                    return value
+                except redis.WatchError:
+                    continue
+
+    def add(self, key, value, timeout=None):
+        if timeout is None:
+            timeout = self.default_timeout
 
-        return value
+        return bool(self.connection.set(
+            self._get_key(key), self.encode(value), ex=timeout or None,
+            nx=True))
 
     def set(self, key, value, timeout=None):
         if timeout is None:
             timeout = self.default_timeout
 
-        self.connection.set(self._get_key(key), value)
+        value = self.encode(value)
 
         if timeout:
-            self.connection.expire(key, timeout)
+            self.connection.set(self._get_key(key), value, ex=timeout)
+        else:
+            self.connection.set(self._get_key(key), value)
 
     def delete(self, key):
         self.connection.delete(self._get_key(key))
 
+    def publish(self, channel, message):
+        self.connection.publish(self._get_key(channel), serialize(message))
+
+    def subscribe(self, channel):
+        pubsub = self.connection.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self._get_key(channel))
+        return self._listen(pubsub)
+
+    def _listen(self, pubsub):
+        try:
+            for item in pubsub.listen():
+                if item['type'] == 'message':
+                    yield deserialize(item['data'].decode('utf-8'))
+        finally:
+            pubsub.close()
+
     def clear(self):
         for key in self.connection.scan_iter('{}:*'.format(self.key_prefix)):
             self.connection.delete(key)
@@ -0,0 +1,305 @@
+# Copyright 2016 by Teem, and other contributors,
+# as noted in the individual source code files.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# By contributing to this project, you agree to also license your source
+# code under the terms of the Apache License, Version 2.0, as described
+# above.
+
+import collections
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+
+from frf import cache
+from .base import CacheEngine
+
+logger = logging.getLogger(__name__)
+
+#: returned by :meth:`ResilientCacheEngine.call` when the operation failed.
+_failed = object()
+
+
+class ResilientCacheEngine(CacheEngine):
+    """Keep a slow or broken cache from slowing down requests.
+
+    Wraps a ``backend`` engine.  Each operation on the backend must finish
+    within ``operation_timeout`` milliseconds, otherwise it is abandoned and
+    counted as a failure, as are exceptions raised by the backend.  After
+    ``failure_threshold`` consecutive failures, the circuit opens: the backend
+    is left alone for ``reset_timeout`` seconds, during which gets are misses
+    and writes are dropped.  After that, a single operation is let through as
+    a probe, and closes the circuit again if it succeeds.
+
+    Failed ``add`` calls report failure, but
+    :meth:`frf.cache.engines.base.CacheEngine.get_or_set` then computes the
+    value right away instead of waiting for a lock it can't see.
+
+    Dropping a delete, a tag invalidation, or a write replacing a value,
+    would leave a stale value in the backend, so the keys and tags concerned
+    are remembered, up to ``max_pending`` of them, treated as missing, and
+    deleted or invalidated after the next successful operation.  Beyond
+    that, they are only logged.
+
+    Options:
+        backend (dict): Configuration of the wrapped engine, in the same
+            format as the ``CACHE`` setting.
+        operation_timeout (int): Deadline of each operation, in milliseconds.
+            Set to ``0`` to disable deadlines, and only count exceptions.
+            Default is ``100``.
+        failure_threshold (int): Consecutive failures that open the circuit.
+            Default is ``5``.
+        reset_timeout (int): Seconds to wait before probing the backend
+            again.  Default is ``30``.
+        max_workers (int): Threads used to run operations with a deadline.
+            Default is ``8``.
+        max_pending (int): Maximum number of deletes and invalidations kept
+            until the backend is back.  Default is ``1000``.
+
+    Counters are available from :meth:`get_stats`.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, **kwargs):
+        self.default_timeout = kwargs.pop('default_timeout')
+        self.operation_timeout = kwargs.pop('operation_timeout', 100) / 1000.0
+        self.failure_threshold = kwargs.pop('failure_threshold', 5)
+        self.reset_timeout = kwargs.pop('reset_timeout', 30)
+        self.max_workers = kwargs.pop('max_workers', 8)
+        self.max_pending = kwargs.pop('max_pending', 1000)
+
+        backend_args = dict(kwargs.pop('backend', {}))
+        backend_args.setdefault('default_timeout', self.default_timeout)
+        self.backend = cache.create_engine(backend_args)
+
+        self.lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.local = threading.local()
+        self.pending = collections.OrderedDict()
+        self.stats = {
+            'calls': 0,
+            'successes': 0,
+            'failures': 0,
+            'timeouts': 0,
+            'short_circuits': 0,
+            'opened': 0,
+            'lost_invalidations': 0,
+        }
+
+        self.executor = None
+        self.executor_pid = None
+
+    def get_stats(self):
+        """Return the counters, and the current state of the circuit."""
+        with self.lock:
+            stats = dict(self.stats)
+            stats['state'] = self.state
+            stats['pending'] = len(self.pending)
+        return stats
+
+    def get_executor(self):
+        # threads don't survive a fork, so each process gets its own pool
+        pid = os.getpid()
+        with self.lock:
+            if self.executor is None or self.executor_pid != pid:
+                self.executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers)
+                self.executor_pid = pid
+            return self.executor
+
+    def allow_request(self):
+        with self.lock:
+            self.stats['calls'] += 1
+
+            if self.state == self.OPEN and \
+                    time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self.probing = False
+                logger.info('Cache circuit half-open, probing the backend.')
+
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+
+            self.stats['short_circuits'] += 1
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.stats['successes'] += 1
+            self.failures = 0
+            if self.state != self.CLOSED:
+                logger.info('Cache circuit closed.')
+            self.state = self.CLOSED
+            self.probing = False
+
+    def record_failure(self, timeout=False):
+        with self.lock:
+            self.stats['failures'] += 1
+            if timeout:
+                self.stats['timeouts'] += 1
+
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (
+                    self.state == self.CLOSED and
+                    self.failures >= self.failure_threshold):
+                logger.warning(
+                    'Cache circuit opened after %s consecutive failures.',
+                    self.failures)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.probing = False
+                self.stats['opened'] += 1
+
+    def call(self, fallback, method, *args):
+        """Call ``method`` on the backend, or return ``fallback``."""
+        if not self.allow_request():
+            self.local.failed = True
+            return fallback
+
+        try:
+            if self.operation_timeout:
+                future = self.get_executor().submit(
+                    getattr(self.backend, method), *args)
+                result = future.result(self.operation_timeout)
+            else:
+                result = getattr(self.backend, method)(*args)
+        except concurrent.futures.TimeoutError:
+            logger.warning('Cache operation "%s" timed out.', method)
+            self.record_failure(timeout=True)
+            self.local.failed = True
+            return fallback
+        except Exception as e:
+            logger.warning('Cache operation "%s" failed: %s', method, e)
+            self.record_failure()
+            self.local.failed = True
+            return fallback
+
+        self.local.failed = False
+        self.record_success()
+        if self.pending:
+            self.replay()
+        return result
+
+    def defer(self, operation, name):
+        """Remember a delete or invalidation the backend missed."""
+        with self.lock:
+            self.pending.pop((operation, name), None)
+            if len(self.pending) < self.max_pending:
+                self.pending[(operation, name)] = True
+                return
+            self.stats['lost_invalidations'] += 1
+
+        logger.error(
+            'Cache is unavailable, could not %s "%s", the value may be stale '
+            'until it expires.', operation, name)
+
+    def replay(self):
+        """Apply the deletes and invalidations the backend missed."""
+        with self.lock:
+            pending = list(self.pending)
+            self.pending.clear()
+
+        logger.info('Replaying %s missed cache invalidations.', len(pending))
+        for operation, name in pending:
+            if operation == 'delete':
+                self.delete(name)
+            else:
+                self.invalidate_tags([name])
+
+    def after_fork(self):
+        super().after_fork()
+        self.backend.after_fork()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.executor = None
+        self.executor_pid = None
+
+    def get_stale(self, keys):
+        """Return which of ``keys`` have a delete or invalidation pending."""
+        if not self.pending:
+            return set()
+
+        stale = set()
+        with self.lock:
+            for key in keys:
+                if ('delete', key) in self.pending or (
+                        key.startswith(self.TAG_PREFIX) and
+                        ('invalidate', key[len(self.TAG_PREFIX):]) in
+                        self.pending):
+                    stale.add(key)
+        return stale
+
+    def get(self, key, default=None):
+        stale = self.get_stale([key])
+        value = self.call(None, 'get', key)
+        return default if value is None or stale else value
+
+    def get_many(self, keys):
+        stale = self.get_stale(keys)
+        values = self.call({}, 'get_many', keys)
+        return {key: value for key, value in values.items()
+                if key not in stale}
+
+    def get_many_with_ttl(self, keys):
+        stale = self.get_stale(keys)
+        values = self.call({}, 'get_many_with_ttl', keys)
+        return {key: value for key, value in values.items()
+                if key not in stale}
+
+    def incr(self, key, delta=1):
+        return self.call(None, 'incr', key, delta)
+
+    def add(self, key, value, timeout=None):
+        return self.call(False, 'add', key, value, timeout)
+
+    def set(self, key, value, timeout=None):
+        if self.call(_failed, 'set', key, value, timeout) is _failed:
+            # the previous value may still be there
+            self.defer('delete', key)
+
+    def delete(self, key):
+        if self.call(_failed, 'delete', key) is _failed:
+            self.defer('delete', key)
+
+    def invalidate_tags(self, tags):
+        for tag in tags:
+            if self.call(_failed, 'invalidate_tags', [tag]) is _failed:
+                self.defer('invalidate', tag)
+
+    def _wait_for(self, key, timeout, interval):
+        if getattr(self.local, 'failed', False):
+            # the lock was not taken because the backend failed, nobody is
+            # computing the value
+            return None
+        return super()._wait_for(key, timeout, interval)
+
+    def clear(self):
+        self.call(None, 'clear')
+
+    def publish(self, channel, message):
+        self.call(None, 'publish', channel, message)
+
+    def subscribe(self, channel):
+        return self.backend.subscribe(channel)
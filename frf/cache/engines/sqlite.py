@@ -0,0 +1,246 @@
+# Copyright 2016 by Teem, and other contributors,
+# as noted in the individual source code files.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# By contributing to this project, you agree to also license your source
+# code under the terms of the Apache License, Version 2.0, as described
+# above.
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from frf import conf
+from .base import CacheEngine
+
+
+def default_path():
+    """Return the default database path.
+
+    Uses ``/dev/shm`` when it exists, so that the database lives in memory,
+    otherwise the system temporary directory.
+    """
+    directory = '/dev/shm'
+    if not os.path.isdir(directory):
+        directory = tempfile.gettempdir()
+
+    return os.path.join(directory, 'frf-cache-{}.sqlite'.format(
+        conf.get('PROJECT_NAME') or 'frf'))
+
+
+class SQLiteCacheEngine(CacheEngine):
+    """Cache shared by all the processes of a host.
+
+    Stores values in a memory mapped SQLite database in WAL mode, so that
+    every worker on the machine reads and writes the same cache without a
+    separate server.  Useful when Redis isn't available.
+
+    When the cache holds more than ``max_entries`` items, expired items are
+    removed, and then the least recently used items, until only
+    ``max_entries * (1 - cull_ratio)`` are left.  To keep reads cheap, the
+    last access time of an item is updated at most once every
+    ``touch_interval`` seconds.
+
+    Options:
+        path (str): The database file.  Defaults to
+            ``/dev/shm/frf-cache-<PROJECT_NAME>.sqlite``.
+        max_entries (int): Maximum number of items.  Default is ``10000``.
+        cull_ratio (float): The fraction of items to drop when the cache is
+            full.  Default is ``0.1``.
+        cull_every (int): Check if the cache is full every ``cull_every``
+            writes of the current process.  Default is ``100``.
+        touch_interval (int): See above.  Default is ``1``.
+        mmap_size (int): Bytes of the database to memory map.  Default is
+            64MB.
+
+    Values are stored with the ``pickle`` codec unless another one is
+    configured, see :mod:`frf.cache.codecs`.
+    """
+    def __init__(self, **kwargs):
+        self.default_timeout = kwargs.pop('default_timeout')
+        self.path = kwargs.pop('path', None) or default_path()
+        self.max_entries = kwargs.pop('max_entries', 10000)
+        self.cull_ratio = kwargs.pop('cull_ratio', 0.1)
+        self.cull_every = kwargs.pop('cull_every', 100)
+        self.touch_interval = kwargs.pop('touch_interval', 1)
+        self.mmap_size = kwargs.pop('mmap_size', 64 * 1024 * 1024)
+        self.configure_codec(kwargs, default='pickle')
+
+        self.local = threading.local()
+        self.writes = 0
+
+    def get_connection(self):
+        """Return the connection of the current thread and process.
+
+        Connections can't be shared between threads, or across a fork, so a
+        new one is opened when needed.
+        """
+        pid = os.getpid()
+        if getattr(self.local, 'pid', None) != pid:
+            connection = sqlite3.connect(
+                self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('PRAGMA mmap_size={:d}'.format(
+                self.mmap_size))
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, '
+                'value BLOB NOT NULL, '
+                'expires REAL, '
+                'accessed REAL NOT NULL)')
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS cache_accessed '
+                'ON cache (accessed)')
+
+            self.local.connection = connection
+            self.local.pid = pid
+
+        return self.local.connection
+
+    def get_expiration(self, timeout, now):
+        if timeout is None:
+            timeout = self.default_timeout
+
+        return now + timeout if timeout else None
+
+    def after_fork(self):
+        super().after_fork()
+        self.local = threading.local()
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys):
+        return {key: value for key, (value, ttl) in
+                self.get_many_with_ttl(keys).items()}
+
+    def get_many_with_ttl(self, keys):
+        if not keys:
+            return {}
+
+        connection = self.get_connection()
+        now = time.time()
+        rows = connection.execute(
+            'SELECT key, value, expires, accessed FROM cache '
+            'WHERE key IN ({})'.format(', '.join('?' * len(keys))),
+            list(keys)).fetchall()
+
+        values = {}
+        touch = []
+        for key, value, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                continue
+
+            values[key] = (
+                self.decode(value),
+                expires - now if expires is not None else None)
+            if accessed < now - self.touch_interval:
+                touch.append(key)
+
+        if touch:
+            connection.execute(
+                'UPDATE cache SET accessed = ? WHERE key IN ({})'.format(
+                    ', '.join('?' * len(touch))), [now] + touch)
+
+        return values
+
+    def set(self, key, value, timeout=None):
+        now = time.time()
+        self.get_connection().execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?)',
+            (key, self.encode(value), self.get_expiration(timeout, now), now))
+        self.wrote()
+
+    def add(self, key, value, timeout=None):
+        connection = self.get_connection()
+        now = time.time()
+
+        connection.execute(
+            'DELETE FROM cache WHERE key = ? AND expires <= ?', (key, now))
+        cursor = connection.execute(
+            'INSERT OR IGNORE INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?)',
+            (key, self.encode(value), self.get_expiration(timeout, now), now))
+
+        added = cursor.rowcount == 1
+        if added:
+            self.wrote()
+        return added
+
+    def incr(self, key, delta=1):
+        connection = self.get_connection()
+        now = time.time()
+
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ?',
+                (key, )).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                value, expires = delta, None
+            else:
+                value, expires = int(self.decode(row[0])) + delta, row[1]
+
+            connection.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+                'VALUES (?, ?, ?, ?)', (key, self.encode(value), expires, now))
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+        connection.execute('COMMIT')
+        self.wrote()
+        return value
+
+    def delete(self, key):
+        self.get_connection().execute(
+            'DELETE FROM cache WHERE key = ?', (key, ))
+
+    def clear(self):
+        self.get_connection().execute('DELETE FROM cache')
+
+    def wrote(self):
+        self.writes += 1
+        if self.cull_every and self.writes % self.cull_every == 0:
+            self.cull()
+
+    def cull(self):
+        """Remove expired items, and old items if the cache is full."""
+        if not self.max_entries:
+            return
+
+        connection = self.get_connection()
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count <= self.max_entries:
+            return
+
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(), ))
+
+        keep = int(self.max_entries * (1 - self.cull_ratio))
+        keys = [row[0] for row in connection.execute(
+            'SELECT key FROM cache ORDER BY accessed '
+            'LIMIT MAX(0, (SELECT COUNT(*) FROM cache) - ?)', (keep, ))]
+
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            connection.execute('DELETE FROM cache WHERE key IN ({})'.format(
+                ', '.join('?' * len(chunk))), chunk)
+
+        for key in keys:
+            self.evicted(key)
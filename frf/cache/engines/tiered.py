@@ -0,0 +1,307 @@
+# Copyright 2016 by Teem, and other contributors,
+# as noted in the individual source code files.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# By contributing to this project, you agree to also license your source
+# code under the terms of the Apache License, Version 2.0, as described
+# above.
+
+import threading
+import time
+import uuid
+
+from frf import cache
+from .base import CacheEngine
+from .locmem import LocMemCacheEngine
+
+#: stored in the first level for sidecar keys known to be missing.
+_missing = object()
+
+
+class TieredCacheEngine(CacheEngine):
+    """Two level cache.
+
+    Reads are served from a small per-process LRU (the first level) when
+    possible, and fall back to a shared ``backend`` engine (the second level).
+    Writes go to both levels.
+
+    Every write through this engine also appends the key to an invalidation
+    log kept in the backend: numbered entries under ``log_key``, and the
+    number of the last one, which writers increment to number their entry.
+    Each process reads the entries written since its last check at most once
+    every ``version_check_interval`` milliseconds, and drops those keys from
+    its first level, so stale local values live for at most
+    ``version_check_interval`` milliseconds after another worker changes
+    them, and writes don't affect the other keys.  An entry that is numbered
+    but still missing at the next check has expired, after ``log_timeout``
+    seconds, and the process drops its whole first level instead, as it does
+    right away after :meth:`clear`.  ``local_timeout`` caps how long any
+    value is kept in the first level regardless, as does the time the value
+    has left in the backend, for engines that report it.
+
+    The XFetch data of values (see :meth:`get_or_set`) is looked up with
+    every read, and most values don't have it, so the first level also
+    remembers which of these are missing instead of asking the backend
+    again.
+
+    Options:
+        backend (dict): Configuration of the second level engine, in the same
+            format as the ``CACHE`` setting.  If it does not define
+            ``default_timeout``, the one from this engine is used.
+        local_timeout (int): Maximum time, in seconds, a value is kept in the
+            first level.  Default is ``5``.
+        local_max_entries (int): Maximum number of items in the first level.
+            Default is ``1000``.
+        version_check_interval (int): How often, in milliseconds, to check
+            the backend for writes from other processes.  Default is ``1000``.
+        log_key (str): The prefix of the backend keys holding the
+            invalidation log.
+        log_timeout (int): How long, in seconds, entries of the invalidation
+            log are kept.  Default is ``300``.
+    """
+    #: how many entries of the invalidation log are read at once.
+    LOG_BATCH_SIZE = 50
+
+    #: suffixes of the keys whose absence is remembered in the first level.
+    SIDECAR_SUFFIXES = (CacheEngine.XFETCH_SUFFIX, )
+
+    def __init__(self, **kwargs):
+        self.default_timeout = kwargs.pop('default_timeout')
+        self.local_timeout = kwargs.pop('local_timeout', 5)
+        self.version_check_interval = kwargs.pop(
+            'version_check_interval', 1000) / 1000.0
+        self.log_key = kwargs.pop('log_key', '__frf_tiered_log')
+        self.log_timeout = kwargs.pop('log_timeout', 300)
+
+        backend_args = dict(kwargs.pop('backend', {}))
+        backend_args.setdefault('default_timeout', self.default_timeout)
+
+        self.backend = cache.create_engine(backend_args)
+        self.local = LocMemCacheEngine(
+            default_timeout=self.local_timeout,
+            max_entries=kwargs.pop('local_max_entries', 1000))
+
+        self.lock = threading.Lock()
+        self.worker_id = uuid.uuid4().hex
+        self.position = None
+        self.gap = None
+        self.last_check = None
+
+    @property
+    def head_key(self):
+        """The backend key holding the number of the last log entry."""
+        return '{}:head'.format(self.log_key)
+
+    def get_entry_key(self, number):
+        return '{}:{}'.format(self.log_key, number)
+
+    def get_head(self):
+        head = self.backend.get(self.head_key)
+        return int(head) if head is not None else 0
+
+    def get_position(self):
+        """Return the number of the last log entry this process has read.
+
+        A new process has nothing cached locally, so it starts from the end
+        of the log.
+        """
+        with self.lock:
+            if self.position is None:
+                self.position = self.get_head()
+                self.last_check = time.monotonic()
+            return self.position
+
+    def check_log(self):
+        """Drop the keys other processes wrote to from the first level."""
+        now = time.monotonic()
+        position = self.get_position()
+
+        with self.lock:
+            if self.last_check is not None and \
+                    now - self.last_check < self.version_check_interval:
+                return
+            self.last_check = now
+
+        while True:
+            numbers = range(position + 1, position + 1 + self.LOG_BATCH_SIZE)
+            keys = [self.get_entry_key(n) for n in numbers]
+            found = self.backend.get_many(keys + [self.head_key])
+            head = int(found.get(self.head_key) or 0)
+
+            for number, key in zip(numbers, keys):
+                entry = found.get(key)
+                if entry is None:
+                    break
+                self.apply_entry(entry)
+                position = number
+            else:
+                continue
+
+            gap = None
+            if head > position:
+                # the next entry is numbered, but missing: its writer may not
+                # have stored it yet, so wait for the next check, unless the
+                # backend was cleared since
+                gap = position + 1
+                if gap == self.gap or self.is_clear_entry(
+                        self.backend.get(self.get_entry_key(head))):
+                    # we can't tell which keys changed
+                    self.local.clear()
+                    position = head
+                    gap = None
+            break
+
+        with self.lock:
+            self.position = max(self.position, position)
+            self.gap = gap
+
+    def is_clear_entry(self, entry):
+        return entry is not None and ' ' not in entry and \
+            entry != self.worker_id
+
+    def apply_entry(self, entry):
+        worker_id, separator, key = entry.partition(' ')
+        if worker_id == self.worker_id:
+            # the first level of this process is already up to date
+            return
+
+        if separator:
+            self.local.delete(key)
+        else:
+            self.local.clear()
+
+    def log_write(self, key=None):
+        """Append ``key`` to the invalidation log of the backend.
+
+        If ``key`` is ``None``, the entry tells the other processes to drop
+        their whole first level.
+        """
+        self.get_position()
+
+        if key is None:
+            entry = self.worker_id
+        else:
+            entry = '{} {}'.format(self.worker_id, key)
+
+        number = self.backend.incr(self.head_key)
+        self.backend.set(self.get_entry_key(number), entry, self.log_timeout)
+
+    def get_local_timeout(self, timeout):
+        if timeout is None:
+            timeout = self.default_timeout
+
+        if not timeout:
+            return self.local_timeout
+
+        return min(timeout, self.local_timeout)
+
+    def set_local(self, key, value, ttl):
+        """Keep a value read from the backend in the first level.
+
+        ``ttl`` is the time the value has left in the backend, if known.
+        """
+        timeout = self.local_timeout
+        if ttl is not None:
+            if ttl <= 0:
+                return
+            timeout = min(timeout, ttl)
+
+        self.local.set(key, value, timeout)
+
+    def after_fork(self):
+        super().after_fork()
+        self.backend.after_fork()
+        self.local.after_fork()
+        self.lock = threading.Lock()
+        self.worker_id = uuid.uuid4().hex
+        self.position = None
+        self.gap = None
+        self.last_check = None
+
+    def get(self, key, default=None):
+        self.check_log()
+
+        value = self.local.get(key)
+        if value is _missing:
+            return default
+        if value is not None:
+            return value
+
+        found = self.backend.get_many_with_ttl([key]).get(key)
+        if found is None:
+            return default
+
+        value, ttl = found
+        self.set_local(key, value, ttl)
+        return value
+
+    def get_many(self, keys):
+        self.check_log()
+
+        values = {}
+        missing = []
+        for key in keys:
+            value = self.local.get(key)
+            if value is None:
+                missing.append(key)
+            elif value is not _missing:
+                values[key] = value
+
+        if missing:
+            found = self.backend.get_many_with_ttl(missing)
+            for key in missing:
+                if key in found:
+                    value, ttl = found[key]
+                    values[key] = value
+                    self.set_local(key, value, ttl)
+                elif key.endswith(self.SIDECAR_SUFFIXES):
+                    self.local.set(key, _missing, self.local_timeout)
+
+        return values
+
+    def add(self, key, value, timeout=None):
+        # never served from the first level, so that all processes see the
+        # same value
+        return self.backend.add(key, value, timeout)
+
+    def incr(self, key, delta=1):
+        value = self.backend.incr(key, delta)
+        self.log_write(key)
+        self.local.delete(key)
+        return value
+
+    def set(self, key, value, timeout=None):
+        self.backend.set(key, value, timeout)
+        self.log_write(key)
+        self.local.set(key, value, self.get_local_timeout(timeout))
+
+    def delete(self, key):
+        self.backend.delete(key)
+        self.log_write(key)
+        self.local.delete(key)
+
+    def clear(self):
+        # the log is cleared too, keep numbering after its end so that the
+        # other processes notice the missing entries
+        head = self.get_head()
+        self.backend.clear()
+        self.backend.incr(self.head_key, head)
+        self.log_write()
+        self.local.clear()
+
+    def publish(self, channel, message):
+        self.backend.publish(channel, message)
+
+    def subscribe(self, channel):
+        return self.backend.subscribe(channel)
@@ -0,0 +1,612 @@
+# Copyright 2016 by Teem, and other contributors,
+# as noted in the individual source code files.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# By contributing to this project, you agree to also license your source
+# code under the terms of the Apache License, Version 2.0, as described
+# above.
+"""Change feed.
+
+Streams the creations, updates and deletions of selected models to clients,
+as `Server-Sent Events
+<https://html.spec.whatwg.org/multipage/server-sent-events.html>`_, so that
+they can stay up to date without polling.  Track the models to publish,
+with the serializer used for the ``data`` of their events:
+
+.. code-block:: python
+   :caption: viewsets.py
+
+    from frf import changes
+
+    changes.track(Article, serializer=ArticleSerializer())
+
+and add the feed to your urls with :func:`frf.urls.changes`:
+
+.. code-block:: python
+   :caption: urls.py
+
+    from frf.urls import changes, include
+
+    urlpatterns = [
+        changes('/api/changes/'),
+        ('/api/', include('blog.urls')),
+    ]
+
+Changes are collected when the database session is flushed, and published
+once it is committed, so the changes of transactions that are rolled back
+are never sent.  This covers the objects saved by
+:class:`frf.viewsets.mixins.CreateModelMixin`,
+:class:`frf.viewsets.mixins.UpdateModelMixin` and
+:class:`frf.viewsets.mixins.DestroyModelMixin`, as well as those saved by
+your own code through ``db.session``.  Each event is a JSON object like:
+
+.. code-block:: json
+
+    {"id": "9f0c1e2a-42", "model": "article", "action": "update",
+     "key": 12, "data": {"id": 12, "title": "Hello"}}
+
+Deletion events have no ``data``.  Several changes to the same object in a
+transaction are merged into one event.
+
+Events are kept in the memory of each process, the last
+``CHANGES_BUFFER_SIZE`` of them, 1000 by default, so that clients that
+reconnect can resume from the ``Last-Event-ID`` they got, which browsers do
+on their own.  If that event is no longer buffered, clients receive a
+``reset`` event, telling them to reload their data.
+
+By default, clients only see the changes made by the process serving them.
+Set ``CHANGES_BROADCAST = True`` to publish them to all the processes
+through the pub/sub of the cache engine, such as
+:class:`frf.cache.engines.redis.RedisCacheEngine`, on the
+``CHANGES_CHANNEL`` channel, ``changes`` by default.
+
+Events carry the data of any tracked object, so the feed sends none until
+you say who may see what.  Authenticate clients with the ``authentication``
+and ``permissions`` of the view, like any other, and pass ``can_see``, which
+gets the request and each event, and must check that the user may see that
+object, the way your viewsets restrict their querysets:
+
+.. code-block:: python
+   :caption: urls.py
+
+    def can_see(req, change):
+        user = req.context['user']
+        if change['model'] == 'article':
+            return Article.query.filter_by(
+                id=change['key'], company_id=user.company_id).count() > 0
+        return False
+
+    urlpatterns = [
+        changes('/api/changes/', authentication=[TokenAuthentication()],
+                can_see=can_see),
+    ]
+
+Deletion events are sent after the object is gone, so ``can_see`` has to
+decide them from the ``key`` alone, or from data kept elsewhere.
+
+Each client holds a connection, and with the WSGI app, a worker thread, for
+as long as it is subscribed, so serve the feed with gevent workers or
+:mod:`frf.asgi`.  Streams end after ``max_duration`` seconds, to let
+clients reconnect to other workers.
+"""
+
+import collections
+from gettext import gettext as _
+import itertools
+import logging
+import os
+import threading
+import time
+import uuid
+
+import falcon
+from sqlalchemy import event, orm
+
+from frf import cache, conf, db, views
+from frf.utils import concurrency
+from frf.utils.json import serialize
+
+logger = logging.getLogger(__name__)
+
+#: the actions of change events.
+ACTIONS = ('create', 'update', 'delete')
+
+#: the ``Session.info`` key holding the changes of the current transaction.
+PENDING_KEY = '_frf_changes'
+
+#: the ``Session.info`` key holding the changes made before each savepoint.
+SAVEPOINTS_KEY = '_frf_changes_savepoints'
+
+#: the tracked models, and their name and serializer.
+_tracked = {}
+
+_installed = False
+_bus = None
+_bus_pid = None
+_bus_lock = threading.Lock()
+
+
+def track(model, serializer=None, name=None):
+    """Publish the changes to the objects of ``model``.
+
+    Args:
+        model (class): The model class.  Its subclasses are tracked too.
+        serializer (frf.serializers.Serializer): Serializes the ``data`` of
+            the events.  Without one, events only have the primary key.
+        name (str): The name of the model in events, its table name by
+            default.
+    """
+    _tracked[model] = (name or model.__tablename__, serializer)
+    install()
+
+
+def untrack(model):
+    """Stop publishing the changes to the objects of ``model``."""
+    _tracked.pop(model, None)
+
+
+def get_tracked(obj):
+    """Return the name and serializer of the model of ``obj``, or ``None``.
+    """
+    for cls in type(obj).__mro__:
+        if cls in _tracked:
+            return _tracked[cls]
+    return None
+
+
+def get_model_names():
+    """Return the names of the tracked models."""
+    return sorted(set(name for name, serializer in _tracked.values()))
+
+
+def get_key(obj):
+    """Return the primary key of ``obj``, a list if it has several columns.
+    """
+    key = orm.object_mapper(obj).primary_key_from_instance(obj)
+    return key[0] if len(key) == 1 else key
+
+
+def install():
+    """Listen to the events of ``frf.db.session``, once."""
+    global _installed
+    if _installed:
+        return
+
+    event.listen(db.session, 'after_flush', _collect)
+    event.listen(db.session, 'after_transaction_create', _savepoint)
+    event.listen(db.session, 'after_commit', _publish)
+    event.listen(db.session, 'after_soft_rollback', _discard)
+    _installed = True
+
+
+def merge(previous, change):
+    """Merge two changes to the same object, or return ``None``.
+
+    An object created then deleted in the same transaction was never seen
+    by anyone, and the creation or deletion of an object hides its updates.
+    """
+    if previous is None:
+        return change
+    if previous['action'] == 'create':
+        if change['action'] == 'delete':
+            return None
+        return dict(change, action='create')
+    return change
+
+
+def _collect(session, flush_context):
+    if not _tracked:
+        return
+
+    pending = session.info.setdefault(PENDING_KEY, collections.OrderedDict())
+    for action, objs in (('create', session.new), ('update', session.dirty),
+                         ('delete', session.deleted)):
+        for obj in objs:
+            tracked = get_tracked(obj)
+            if tracked is None:
+                continue
+            if action == 'update' and not session.is_modified(
+                    obj, include_collections=False):
+                continue
+
+            name, serializer = tracked
+            change = {
+                'model': name,
+                'action': action,
+                'key': get_key(obj),
+                'data': None,
+            }
+            if serializer is not None and action != 'delete':
+                change['data'] = serializer.serialize(obj)
+
+            ident = (name, serialize(change['key']))
+            change = merge(pending.pop(ident, None), change)
+            if change is not None:
+                pending[ident] = change
+
+
+def _savepoint(session, transaction):
+    if transaction.nested:
+        session.info.setdefault(SAVEPOINTS_KEY, {})[transaction] = \
+            collections.OrderedDict(session.info.get(PENDING_KEY) or ())
+
+
+def _publish(session):
+    session.info.pop(SAVEPOINTS_KEY, None)
+    pending = session.info.pop(PENDING_KEY, None)
+    if not pending:
+        return
+
+    try:
+        bus = get_bus()
+        for change in pending.values():
+            bus.publish(change)
+    except Exception:
+        logger.exception('Could not publish the change events.')
+
+
+def _discard(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop(SAVEPOINTS_KEY, None)
+        session.info.pop(PENDING_KEY, None)
+    elif previous_transaction.nested:
+        # only the changes made since the savepoint are rolled back
+        pending = session.info.get(SAVEPOINTS_KEY, {}).pop(
+            previous_transaction, None)
+        if pending is not None:
+            session.info[PENDING_KEY] = pending
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class ChangeBus(object):
+    """Buffer of the latest change events of the process.
+
+    Events are numbered by their position, the number of events appended
+    before them, which subscribers use to know where they are in the
+    buffer.  Each event also has an ``id``, unique across processes and
+    restarts, that clients use to resume.
+
+    Args:
+        size (int): The number of events to keep.
+        engine (frf.cache.engines.base.CacheEngine): If set, events are
+            published through its pub/sub, and only appended to the buffer
+            when they are received from it, as they are in every other
+            process.
+        channel (str): The channel of the cache engine.
+    """
+    def __init__(self, size=1000, engine=None, channel='changes'):
+        self.events = collections.deque(maxlen=size)
+        self.position = 0
+        self.engine = engine
+        self.channel = channel
+        self.prefix = uuid.uuid4().hex[:8]
+        self.counter = itertools.count(1)
+        self.condition = threading.Condition()
+        self.waiters = set()
+        self.listener = None
+
+    def next_id(self):
+        return '{}-{}'.format(self.prefix, next(self.counter))
+
+    def publish(self, change):
+        """Give ``change`` an id, and send it to the subscribers."""
+        change = dict(change, id=self.next_id())
+        if self.engine is not None:
+            self.engine.publish(self.channel, change)
+        else:
+            self.append(change)
+        return change
+
+    def append(self, change):
+        """Add an event to the buffer, and wake up the subscribers."""
+        with self.condition:
+            self.events.append(change)
+            self.position += 1
+            self.condition.notify_all()
+            waiters, self.waiters = self.waiters, set()
+
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def listen(self):
+        """Append the events received from the cache engine, forever."""
+        while True:
+            try:
+                for change in self.engine.subscribe(self.channel):
+                    self.append(change)
+            except Exception:
+                logger.exception(
+                    'Lost the change events subscription, retrying.')
+                time.sleep(1)
+
+    def start(self):
+        """Start receiving the events of the cache engine, in a thread."""
+        if self.engine is None or self.listener is not None:
+            return
+        self.listener = threading.Thread(
+            target=self.listen, name='frf-changes', daemon=True)
+        self.listener.start()
+
+    def find(self, event_id):
+        """Return the position following the event ``event_id``.
+
+        Returns ``None`` if that event is not in the buffer.
+        """
+        with self.condition:
+            start = self.position - len(self.events)
+            for index, change in enumerate(self.events):
+                if change['id'] == event_id:
+                    return start + index + 1
+        return None
+
+    def read(self, position):
+        """Return the events from ``position``, and the next position.
+
+        The events are ``None`` if some of them were dropped from the
+        buffer since ``position``.
+        """
+        with self.condition:
+            start = self.position - len(self.events)
+            if position < start:
+                return None, self.position
+            return (list(itertools.islice(
+                self.events, position - start, None)), self.position)
+
+    def wait(self, position, timeout):
+        """Like :meth:`read`, once there are new events, or after
+        ``timeout`` seconds.
+        """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.position != position, timeout)
+        return self.read(position)
+
+    async def async_wait(self, position, timeout):
+        """Asynchronous version of :meth:`wait`."""
+        import asyncio
+
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        waiter = (loop, future)
+        with self.condition:
+            if self.position == position:
+                self.waiters.add(waiter)
+            else:
+                future.set_result(None)
+
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self.condition:
+                self.waiters.discard(waiter)
+
+        return self.read(position)
+
+
+def get_bus():
+    """Return the :class:`ChangeBus` of the current process."""
+    global _bus, _bus_pid
+    pid = os.getpid()
+    if _bus is None or _bus_pid != pid:
+        with _bus_lock:
+            if _bus is None or _bus_pid != pid:
+                engine = None
+                if conf.get('CHANGES_BROADCAST', False):
+                    engine = cache.get_engine()
+                _bus = ChangeBus(
+                    size=conf.get('CHANGES_BUFFER_SIZE', 1000),
+                    engine=engine,
+                    channel=conf.get('CHANGES_CHANNEL', 'changes'))
+                _bus.start()
+                _bus_pid = pid
+    return _bus
+
+
+class EventStream(object):
+    """The body of a :class:`ChangeFeedView` response.
+
+    Iterating it, or iterating it asynchronously under :mod:`frf.asgi`,
+    yields the encoded events as they are published, and heartbeat
+    comments while there are none, until the view's ``max_duration``.
+    """
+    def __init__(self, view, req, bus, position, reset=False):
+        self.view = view
+        self.req = req
+        self.bus = bus
+        self.position = position
+        self.deadline = time.monotonic() + view.max_duration
+        self.last_write = time.monotonic()
+        self.closed = False
+        self.chunks = collections.deque([
+            'retry: {}\n\n'.format(view.retry).encode('utf-8')])
+        if reset:
+            self.chunks.append(view.format_event(None, 'reset'))
+        self.collect(bus.read(position))
+
+    def get_timeout(self):
+        now = time.monotonic()
+        return max(0, min(self.last_write + self.view.heartbeat,
+                          self.deadline) - now)
+
+    def collect(self, result):
+        changes, self.position = result
+        if changes is None:
+            self.chunks.append(self.view.format_event(None, 'reset'))
+            changes = []
+
+        for change in changes:
+            if self.view.filter_event(self.req, change):
+                self.chunks.append(self.view.format_event(change))
+
+        now = time.monotonic()
+        if self.chunks:
+            self.last_write = now
+        elif now >= self.deadline:
+            self.closed = True
+        elif now >= self.last_write + self.view.heartbeat:
+            self.chunks.append(b': heartbeat\n\n')
+            self.last_write = now
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while not self.chunks:
+            if self.closed:
+                raise StopIteration()
+            self.collect(self.bus.wait(self.position, self.get_timeout()))
+        return self.chunks.popleft()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self.chunks:
+            if self.closed:
+                raise StopAsyncIteration()
+            result = await self.bus.async_wait(
+                self.position, self.get_timeout())
+            if result[0]:
+                # ``filter_event`` may query the database, keep it off the
+                # event loop
+                await concurrency.run_sync(self.collect, result)
+            else:
+                self.collect(result)
+        return self.chunks.popleft()
+
+
+class ChangeFeedView(views.View):
+    """Stream change events, see the module documentation.
+
+    Clients can select the events they receive with the ``models`` and
+    ``actions`` query parameters, such as
+    ``?models=article,comment&actions=create``.  Events are only sent if
+    ``can_see`` allows them, see :meth:`can_see_event`.
+
+    Args:
+        models (list): The names of the models clients can subscribe to,
+            all the tracked ones by default.
+        heartbeat (int): Seconds between the comments sent while there are
+            no events, to keep the connection open.
+        max_duration (int): Seconds after which the stream ends.
+        retry (int): Milliseconds clients wait before reconnecting.
+        authentication (list): The authentication methods of the feed.
+        permissions (list): The permissions of the feed.
+        can_see (callable): Called with the request and each event, returns
+            whether the user may see the object of the event.  Without it,
+            no event is sent.
+    """
+    allowed_methods = ['get']
+    content_type = 'text/event-stream'
+
+    def __init__(self, models=None, heartbeat=15, max_duration=300,
+                 retry=3000, authentication=None, permissions=None,
+                 can_see=None):
+        self.models = models
+        self.heartbeat = heartbeat
+        self.max_duration = max_duration
+        self.retry = retry
+        if authentication is not None:
+            self.authentication = authentication
+        if permissions is not None:
+            self.permissions = permissions
+        self.can_see = can_see
+        super().__init__()
+
+    def get_choices(self, req, name, choices):
+        values = req.get_param_as_list(name) or []
+        for value in values:
+            if value not in choices:
+                raise falcon.HTTPBadRequest(
+                    title=_('Invalid {name}').format(name=name),
+                    description=_(
+                        '{value} is not valid, expected one of: '
+                        '{choices}').format(
+                        value=value, choices=', '.join(choices)))
+        return set(values)
+
+    def get_subscription(self, req):
+        """Return the models and actions requested, empty for all."""
+        models = self.models if self.models is not None else \
+            get_model_names()
+        return (self.get_choices(req, 'models', models),
+                self.get_choices(req, 'actions', ACTIONS))
+
+    def filter_event(self, req, change):
+        """Return whether to send ``change`` to the client.
+
+        Checks that the client subscribed to the event, then
+        :meth:`can_see_event`.
+        """
+        models, actions = req.context['changes_subscription']
+        if models and change['model'] not in models:
+            return False
+        if self.models is not None and change['model'] not in self.models:
+            return False
+        if actions and change['action'] not in actions:
+            return False
+        return self.can_see_event(req, change)
+
+    def can_see_event(self, req, change):
+        """Return whether the user of ``req`` may see the object of ``change``.
+
+        Calls ``can_see``, and denies every event without it.  Override, or
+        pass ``can_see``, to check access to each object, the way the
+        viewsets of the models do.
+        """
+        if self.can_see is None:
+            return False
+        return bool(self.can_see(req, change))
+
+    def format_event(self, change, name='change'):
+        """Encode an event in the ``text/event-stream`` format."""
+        lines = []
+        if change is not None:
+            lines.append('id: {}'.format(change['id']))
+        lines.append('event: {}'.format(name))
+        lines.append('data: {}'.format(serialize(change or {})))
+        return '{}\n\n'.format('\n'.join(lines)).encode('utf-8')
+
+    def get_last_event_id(self, req):
+        """Return the id of the last event the client received.
+
+        Taken from the ``Last-Event-ID`` header, or the ``last_event_id``
+        query parameter, for the first connection.
+        """
+        return req.get_header('Last-Event-ID') or \
+            req.get_param('last_event_id')
+
+    def get(self, req, resp, **kwargs):
+        req.context['changes_subscription'] = self.get_subscription(req)
+
+        bus = get_bus()
+        position = bus.position
+        reset = False
+        last_event_id = self.get_last_event_id(req)
+        if last_event_id:
+            found = bus.find(last_event_id)
+            if found is None:
+                reset = True
+            else:
+                position = found
+
+        resp.set_header('Cache-Control', 'no-cache')
+        resp.set_header('X-Accel-Buffering', 'no')
+        resp.stream = EventStream(self, req, bus, position, reset)
@@ -0,0 +1,94 @@
+# Copyright 2016 by Teem, and other contributors,
+# as noted in the individual source code files.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# By contributing to this project, you agree to also license your source
+# code under the terms of the Apache License, Version 2.0, as described
+# above.
+
+import tabulate
+
+from frf import cache
+from frf.cache.engines import instrumented
+from frf.commands.base import BaseCommand
+from frf.utils.json import serialize
+
+
+def find_instrumented_engine(engine):
+    while engine is not None:
+        if isinstance(engine, instrumented.InstrumentedCacheEngine):
+            return engine
+        engine = getattr(engine, 'backend', None)
+
+
+def format_value(value, unit=''):
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return '{:.2f}{}'.format(value, unit)
+    return '{}{}'.format(value, unit)
+
+
+class Command(BaseCommand):
+    description = 'show cache statistics by key prefix'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--local', action='store_true',
+            help='Only show the statistics of this process')
+        parser.add_argument(
+            '--json', action='store_true', help='Output raw JSON')
+
+    def handle(self, args):
+        engine = find_instrumented_engine(cache._cache_engine)
+        if engine is None:
+            self.error(
+                'The cache engine is not instrumented.  Wrap it with '
+                '"frf.cache.engines.instrumented.InstrumentedCacheEngine" '
+                'in the "CACHE" setting.')
+            return
+
+        stats = engine.get_stats() if args.local else engine.collect_stats()
+
+        if args.json:
+            self.info(serialize(stats))
+            return
+
+        if not stats:
+            self.warning('No statistics have been recorded yet.')
+            return
+
+        table = []
+        for prefix, counters in sorted(stats.items()):
+            summary = instrumented.summarize(counters)
+            hit_rate = summary['hit_rate']
+            table.append((
+                prefix,
+                counters['hits'],
+                counters['misses'],
+                format_value(
+                    hit_rate * 100 if hit_rate is not None else None, '%'),
+                counters['sets'],
+                counters['deletes'],
+                counters['evictions'],
+                format_value(summary['latency_avg'], 'ms'),
+                format_value(summary['latency_p99'], 'ms'),
+                format_value(summary['size_p50'], 'B'),
+                format_value(summary['size_p99'], 'B'),
+            ))
+
+        self.info(tabulate.tabulate(table, headers=(
+            'prefix', 'hits', 'misses', 'hit rate', 'sets', 'deletes',
+            'evictions', 'latency avg', 'latency p99', 'size p50',
+            'size p99')))
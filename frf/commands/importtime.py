@@ -0,0 +1,106 @@
+# Copyright 2016 by Teem, and other contributors,
+# as noted in the individual source code files.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# By contributing to this project, you agree to also license your source
+# code under the terms of the Apache License, Version 2.0, as described
+# above.
+
+import subprocess
+import sys
+
+from frf import conf
+from frf.commands.base import BaseCommand
+from frf.utils.json import deserialize, serialize
+
+#: run in a fresh interpreter to time the import of ``sys.argv[1]``.
+TIMER_SCRIPT = '''
+import builtins
+import json
+import sys
+import time
+
+times = {}
+original_import = builtins.__import__
+
+
+def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level or name in sys.modules:
+        return original_import(name, globals, locals, fromlist, level)
+
+    start = time.perf_counter()
+    try:
+        return original_import(name, globals, locals, fromlist, level)
+    finally:
+        times.setdefault(name, time.perf_counter() - start)
+
+
+builtins.__import__ = timed_import
+start = time.perf_counter()
+__import__(sys.argv[1])
+total = time.perf_counter() - start
+builtins.__import__ = original_import
+
+print()
+print(json.dumps({'total': total, 'modules': times}))
+'''
+
+
+def measure_imports(module_name):
+    """Import ``module_name`` in a new interpreter and time it.
+
+    Returns:
+        dict: ``total``, the time the import took in seconds, and
+        ``modules``, the time each module imported along the way took,
+        including the modules it imported itself.
+    """
+    output = subprocess.check_output(
+        [sys.executable, '-c', TIMER_SCRIPT, module_name])
+    return deserialize(output.decode('utf-8').strip().splitlines()[-1])
+
+
+class Command(BaseCommand):
+    description = 'show which modules are slow to import'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'module', nargs='?', default=None,
+            help='The module to import, by default the main module of the '
+            'project')
+        parser.add_argument(
+            '-l', '--limit', type=int, default=20,
+            help='How many modules to show')
+        parser.add_argument(
+            '--json', action='store_true', help='Output raw JSON')
+
+    def handle(self, args):
+        import tabulate
+
+        module_name = args.module or conf.get('MAIN_APP') or 'frf.app'
+        result = measure_imports(module_name)
+
+        if args.json:
+            self.info(serialize(result))
+            return
+
+        modules = sorted(
+            result['modules'].items(), key=lambda item: item[1],
+            reverse=True)
+        table = [
+            (name, '{:.1f}'.format(seconds * 1000))
+            for name, seconds in modules[:args.limit]]
+
+        self.info('Importing {} took {:.1f}ms.\n'.format(
+            module_name, result['total'] * 1000))
+        self.info(tabulate.tabulate(table, headers=('module', 'ms')))
@@ -17,12 +17,48 @@
 # code under the terms of the Apache License, Version 2.0, as described
 # above.
 
+import gc
 import os
 
-from frf import conf
+from frf import app, conf
 from frf.commands.base import BaseCommand
 
 
+def when_ready(server):
+    """Freeze the objects of the preloaded app before workers fork.
+
+    Objects moved to the permanent generation are never touched by the
+    garbage collector, so the memory pages holding them stay shared between
+    the master and the workers instead of being copied on write.  Needs
+    Python 3.7 or newer, and does nothing on older versions.
+    """
+    if hasattr(gc, 'freeze'):
+        gc.collect()
+        gc.freeze()
+
+
+def run_gunicorn(wsgi_app, options):
+    """Run ``wsgi_app`` in gunicorn, in this process.
+
+    Args:
+        wsgi_app (callable): The WSGI application, loaded once in this
+            process and shared with the workers.
+        options (dict): Gunicorn settings.  ``None`` values are skipped.
+    """
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                if value is not None:
+                    self.cfg.set(key, value)
+
+        def load(self):
+            return wsgi_app
+
+    Application().run()
+
+
 class Command(BaseCommand):
     description = 'start a gunicorn server'
 
@@ -30,29 +66,111 @@ class Command(BaseCommand):
         parser.add_argument(
             '-b', '--bind', help='Address to bind to', default='0.0.0.0:8080')
         parser.add_argument(
-            '-t', '--threads', help='Number of threads', default=1)
+            '-t', '--threads', help='Number of threads', type=int, default=1)
+        parser.add_argument(
+            '-w', '--workers', help='Number of workers', type=int, default=2)
         parser.add_argument(
-            '-w', '--workers', help='Number of workers', default=2)
+            '-r', '--reload', action='store_true', default=None,
+            help='Reload on code change, the default when DEBUG is set')
         parser.add_argument(
-            '-r', '--reload', action='store_const', const='reload',
-            default='reload', help='Reload on code change')
+            '--no-reload', action='store_false', dest='reload',
+            help='Do not reload on code change')
 
         default = 30
         if conf.DEBUG:
             default = 120
         parser.add_argument(
-            '-T', '--timeout', help='Worker timeout', default=default)
+            '-T', '--timeout', help='Worker timeout', type=int,
+            default=default)
+
+        parser.add_argument(
+            '-P', '--production', action='store_true',
+            help='Run gunicorn in this process, with the app preloaded and '
+            'shared by the workers, and workers recycled after '
+            '--max-requests requests')
+        parser.add_argument(
+            '-k', '--worker-class', choices=('sync', 'gthread', 'gevent'),
+            default=None,
+            help='Worker class.  Default is gthread in production mode, and '
+            'sync otherwise')
+        parser.add_argument(
+            '--worker-connections', type=int, default=1000,
+            help='Maximum concurrent requests per gevent worker')
+        parser.add_argument(
+            '--max-requests', type=int, default=1000,
+            help='Restart workers after this many requests, in production '
+            'mode.  0 disables it')
+        parser.add_argument(
+            '--max-requests-jitter', type=int, default=None,
+            help='Random extra requests before restarting each worker, so '
+            'they do not all restart at once.  Default is 10%% of '
+            '--max-requests')
 
     def handle(self, args):
+        if args.production:
+            self.run_production(args)
+        else:
+            self.run_development(args)
+
+    def get_production_options(self, args):
+        jitter = args.max_requests_jitter
+        if jitter is None:
+            jitter = args.max_requests // 10
+
+        worker_class = args.worker_class or 'gthread'
+
+        options = {
+            'bind': args.bind,
+            'workers': args.workers,
+            'threads': args.threads,
+            'worker_class': worker_class,
+            'worker_connections': args.worker_connections,
+            'timeout': args.timeout,
+            'max_requests': args.max_requests,
+            'max_requests_jitter': jitter,
+            'preload_app': True,
+            'reload': False,
+            'accesslog': '-',
+            'errorlog': '-',
+            'when_ready': when_ready,
+        }
+
+        # gevent workers monkey-patch after `post_fork`, and the worker must
+        # be prepared after that.
+        if worker_class == 'gevent':
+            options['post_worker_init'] = app.post_worker_init
+        else:
+            options['post_fork'] = app.post_fork
+
+        return options
+
+    def run_production(self, args):
+        if args.reload:
+            self.warning('Reloading is not available in production mode.')
+
+        self.greet('Oh hai, starting gunicorn in production mode...')
+        run_gunicorn(app.api, self.get_production_options(args))
+
+    def run_development(self, args):
+        reload = args.reload
+        if reload is None:
+            reload = conf.get('DEBUG', False)
+
         self.greet('Oh hai, starting gunicorn...')
         app_name = os.path.basename(conf.get('BASE_DIR'))
+        worker_class = ''
+        if args.worker_class:
+            worker_class = '--worker-class {} --worker-connections {}'.format(
+                args.worker_class, args.worker_connections)
+
         os.system(
             'gunicorn {} --access-logfile - --error-logfile - --bind {} '
-            '--workers {} --timeout {} --threads {} {}:app.api'.format(
-                '--reload' if args.reload == 'reload' else '',
+            '--workers {} --timeout {} --threads {} {} {}:app.api'.format(
+                '--reload' if reload else '',
                 args.bind,
                 args.workers,
                 args.timeout,
                 args.threads,
+                worker_class,
                 app_name,
             ))
@@ -20,9 +20,10 @@
 import importlib
 import inspect
 
-from frf import conf, db
+from frf import conf, db, filters
 from frf import models as falconmodels
 from frf.commands.base import BaseCommand
+from frf.utils import importing
 
 
 class Command(BaseCommand):
@@ -49,3 +50,12 @@ class Command(BaseCommand):
             self.info('Creating tables...', end='')
             falconmodels.Model.metadata.create_all(db.engine)
             self.info(' Done.')
+
+            # search filters are declared in viewsets
+            importing.import_submodules(
+                conf.get('INSTALLED_APPS', []), 'viewsets')
+
+            if filters.get_search_indexes():
+                self.info('Creating search indexes...', end='')
+                filters.create_search_indexes(db.engine)
+                self.info(' Done.')
@@ -58,7 +58,6 @@ UUID('2d2fac55-71e9-45c6-b349-13e706efa8f4')
 """
 
 import contextlib
-import importlib
 import inspect
 
 from sqlalchemy import create_engine, orm
@@ -67,6 +66,7 @@ from sqlalchemy.util import ScopedRegistry, ThreadLocalRegistry
 from frf import conf, models
 from frf.exceptions import DatabaseError
 from frf.utils.db import _QueryProperty
+from frf.utils.importing import import_submodules
 from frf.utils.json import deserialize, serialize
 
 
@@ -107,14 +107,69 @@ def init(connection_uri, echo=False, scopefunc=None):
             connection_uri,
             echo=echo)
 
+    configure_scope(scopefunc)
+
+    session.configure(bind=engine)
+    Model.query = _QueryProperty(session)
+
+
+def configure_scope(scopefunc=None):
+    """Set what the sessions of ``session`` are scoped to.
+
+    Existing sessions are forgotten, so this should be called before
+    anything uses the database, or right after a fork.
+
+    Args:
+        scopefunc (func): Function returning the current scope, see
+            :func:`init`.  See :mod:`frf.utils.concurrency` for scopes
+            suited to gevent and asyncio.
+    """
     if scopefunc is not None:
         session.registry = ScopedRegistry(
             session.session_factory, scopefunc=scopefunc)
     else:
         session.registry = ThreadLocalRegistry(session.session_factory)
 
-    session.configure(bind=engine)
-    Model.query = _QueryProperty(session)
+
+def warmup(connections=1):
+    """Do the work the first requests would otherwise do.
+
+    Configures the SQLAlchemy mappers of all the models of
+    ``INSTALLED_APPS``, and opens ``connections`` connections so that they
+    wait in the pool.
+
+    Args:
+        connections (int): How many connections to open.  Capped to the
+            size of the pool.
+    """
+    if not engine:
+        raise DatabaseError('Database is not yet initialized')
+
+    import_submodules(conf.get('INSTALLED_APPS', []), 'models')
+
+    orm.configure_mappers()
+
+    size = getattr(engine.pool, 'size', None)
+    if callable(size):
+        connections = min(connections, size())
+
+    opened = []
+    try:
+        for i in range(connections):
+            opened.append(engine.connect())
+    finally:
+        for connection in opened:
+            connection.close()
+
+
+def dispose():
+    """Close all the connections of the pool.
+
+    Call this in a process forked after connections were opened, so that
+    it does not share them with its parent.
+    """
+    if engine:
+        engine.dispose()
 
 
 def create_all():
@@ -126,11 +181,7 @@ def create_all():
         raise DatabaseError('Database is not yet initialized')
 
     # make sure all models are imported
-    for app_name in conf.get('INSTALLED_APPS', []):
-        try:
-            importlib.import_module('{}.models'.format(app_name))
-        except ImportError:
-            pass
+    import_submodules(conf.get('INSTALLED_APPS', []), 'models')
 
     models.Model.metadata.create_all(engine)
 
@@ -145,12 +196,7 @@ def drop_all():
 
     session.close()
 
-    for app_name in conf.get('INSTALLED_APPS', []):
-        try:
-            importlib.import_module('{}.models'.format(
-                app_name))
-        except ImportError:
-            pass
+    import_submodules(conf.get('INSTALLED_APPS', []), 'models')
 
     models.Model.metadata.drop_all(engine)
 
@@ -167,19 +213,13 @@ def truncate_all():
 
     with contextlib.closing(engine.connect()) as con:
         trans = con.begin()
-        for app_name in conf.get('INSTALLED_APPS', []):
-            try:
-                module = importlib.import_module('{}.models'.format(
-                    app_name))
-                for attr_name in dir(module):
-                    attr = getattr(module, attr_name)
-                    if inspect.isclass(attr) and issubclass(
-                            attr, models.Model):
-
-                        # truncate the table
-                        con.execute(attr.__table__.delete())
-
-            except ImportError:
-                pass
+        for module in import_submodules(
+                conf.get('INSTALLED_APPS', []), 'models'):
+            for attr_name in dir(module):
+                attr = getattr(module, attr_name)
+                if inspect.isclass(attr) and issubclass(attr, models.Model):
+
+                    # truncate the table
+                    con.execute(attr.__table__.delete())
 
         trans.commit()
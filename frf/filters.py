@@ -16,51 +16,253 @@
 # By contributing to this project, you agree to also license your source
 # code under the terms of the Apache License, Version 2.0, as described
 # above.
+import collections
+import datetime
+import decimal
+from gettext import gettext as _
+import logging
+import re
+import string
+import sys
+import uuid
 
+import falcon
+from sqlalchemy import (
+    and_, column, false, func, literal_column, select, table, types)
 
-class BaseFilter(object):
-    """Base Filter.
+from frf import db
+from frf.models.types import GUID
+from frf.serializers.fields import Field, parse_datetime
 
-    Provides a filter contract, and some utility methods for filters.
+logger = logging.getLogger(__name__)
+
+#: folds ASCII letters only, like the ``lower()`` function of SQLite.
+ASCII_LOWERCASE = str.maketrans(
+    string.ascii_uppercase, string.ascii_lowercase)
+
+#: the strings accepted for boolean filters.
+BOOLEAN_VALUES = {
+    'true': True, '1': True, 'yes': True, 'on': True,
+    'false': False, '0': False, 'no': False, 'off': False,
+}
+
+#: set in ``req.context`` during sync requests, see
+#: :class:`frf.viewsets.mixins.ListMixin`.
+SYNC_CONTEXT_KEY = '_frf_sync'
+
+#: the ``req.context`` key holding the :class:`QueryParams` of a request.
+QUERY_PARAMS_CONTEXT_KEY = '_frf_query_params'
+
+
+def flag_key(flag):
+    """Return the key of ``flag`` in :attr:`QueryParams.keys`."""
+    return ('filter', flag)
+
+
+class QueryParams(object):
+    """The query string parameters of a request, parsed once for all the
+    filters.
+
+    Get the one of a request with :func:`get_query_params`.
+
+    Attributes:
+        names (frozenset): The names of the parameters present.
+        flags (frozenset): The flags present in ``filter`` and ``filter[]``.
+        keys (frozenset): The names, and the :func:`flag_key` of the flags,
+            matched against the triggers of filters by :class:`FilterChain`.
     """
-    list_only = True
+    def __init__(self, params):
+        self.params = params
+        self.names = frozenset(params)
+        self.flags = frozenset(self.get_values('filter', 'filter[]'))
+        self.keys = self.names.union(flag_key(flag) for flag in self.flags)
+
+    def get(self, name):
+        """Return the value of a parameter, like ``req.get_param``."""
+        value = self.params.get(name)
+        if isinstance(value, list):
+            value = value[-1]
+        return value
+
+    def get_list(self, name):
+        """Return the values of a parameter, like
+        ``req.get_param_as_list``.
+        """
+        value = self.params.get(name)
+        if value is None:
+            return None
+        return list(value) if isinstance(value, list) else [value]
 
-    def get_field_values(self, req, query_field=None,
-                         multi_query_field=None, multi=True):
+    def get_values(self, query_field, multi_query_field=None, multi=True):
         """Return the values present for a field.
 
-        Checks the query string for flags, or their plural version (usually
-        represented with a ``[]``) and returns a list containing all the
-        values; both plural and not.
+        See :meth:`BaseFilter.get_field_values`.
         """
-
         if not multi_query_field:
             multi_query_field = '{}s[]'.format(query_field)
 
         if multi:
-            values = req.get_param_as_list(multi_query_field) or []
+            values = self.get_list(multi_query_field) or []
         else:
             values = []
 
-        single = req.get_param(query_field)
+        single = self.get(query_field)
 
         if single:
             values.append(single)
 
         return values
 
+
+def get_query_params(req):
+    """Return the :class:`QueryParams` of ``req``, parsing them once."""
+    params = req.context.get(QUERY_PARAMS_CONTEXT_KEY)
+    if params is None:
+        params = QueryParams(req.params)
+        req.context[QUERY_PARAMS_CONTEXT_KEY] = params
+    return params
+
+
+class FilterChain(object):
+    """Filters, compiled to skip the ones that don't apply to a request.
+
+    Filters with triggers, see :meth:`BaseFilter.get_triggers`, only run if
+    one of them is in the :attr:`QueryParams.keys` of the request, so a
+    viewset with many filters only pays for the ones that are used.  The
+    others run for every request.  Filters run in their order.
+
+    Args:
+        filters (list): The filters.
+    """
+    def __init__(self, filters):
+        self.filters = tuple(filters)
+        self.entries = tuple(
+            (f, getattr(f, 'get_triggers', lambda: None)())
+            for f in self.filters)
+        self.unconditional = tuple(
+            f for f, triggers in self.entries if triggers is None)
+        self.triggers = frozenset().union(*[
+            triggers for f, triggers in self.entries if triggers is not None])
+
+    def get_active(self, params):
+        """Return the filters to run for ``params``."""
+        present = self.triggers.intersection(params.keys)
+        if not present:
+            return self.unconditional
+        return [
+            f for f, triggers in self.entries
+            if triggers is None or not triggers.isdisjoint(present)]
+
+    def filter(self, req, qs):
+        """Filter ``qs`` with the filters that apply to ``req``."""
+        for f in self.get_active(get_query_params(req)):
+            qs = f.filter(req, qs)
+
+        return qs
+
+
+class BaseFilter(object):
+    """Base Filter.
+
+    Provides a filter contract, and some utility methods for filters.
+    """
+    list_only = True
+
+    def get_triggers(self):
+        """Return the query string keys this filter depends on.
+
+        A :class:`FilterChain` skips the filter for requests that have none
+        of them, see :attr:`QueryParams.keys`.  Returns ``None`` by default,
+        for filters that always run.  Override to opt in to skipping.
+
+        The built-in filters return their query string keys, unless a
+        subclass overrides the methods they use to filter, which might
+        apply a default without any key present.
+        """
+        return None
+
+    def uses_default(self, *names, owner):
+        """Whether the ``names`` methods are the implementations of ``owner``.
+        """
+        return all(
+            name not in self.__dict__ and
+            getattr(type(self), name) is getattr(owner, name)
+            for name in names)
+
+    def get_field_values(self, req, query_field=None,
+                         multi_query_field=None, multi=True):
+        """Return the values present for a field.
+
+        Checks the query string for flags, or their plural version (usually
+        represented with a ``[]``) and returns a list containing all the
+        values; both plural and not.
+        """
+        return get_query_params(req).get_values(
+            query_field, multi_query_field, multi)
+
     def filter(self, req, qs):
         raise NotImplementedError()
 
 
+def parse_boolean(value):
+    """Convert a query string value to a boolean, see
+    :data:`BOOLEAN_VALUES`.
+    """
+    try:
+        return BOOLEAN_VALUES[value.lower()]
+    except KeyError:
+        raise ValueError(value)
+
+
+def parse_date(value):
+    """Convert a ``YYYY-MM-DD`` query string value to a date."""
+    return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def get_type_coercer(column_type):
+    """Return a function converting strings to values of ``column_type``.
+
+    Returns ``None`` for string types, and the types it does not know.
+    """
+    if isinstance(column_type, GUID):
+        return uuid.UUID
+    if isinstance(column_type, types.TypeDecorator):
+        impl = column_type.impl
+        return get_type_coercer(impl() if isinstance(impl, type) else impl)
+    if isinstance(column_type, types.Enum):
+        def coerce_enum(value):
+            if value not in column_type.enums:
+                raise ValueError(value)
+            return value
+        return coerce_enum
+    if isinstance(column_type, types.Boolean):
+        return parse_boolean
+    if isinstance(column_type, types.Integer):
+        return int
+    if isinstance(column_type, types.Numeric):
+        if column_type.asdecimal:
+            return decimal.Decimal
+        return float
+    if isinstance(column_type, types.DateTime):
+        return parse_datetime
+    if isinstance(column_type, types.Date):
+        return parse_date
+    return None
+
+
 class FieldMatchFilter(BaseFilter):
     """A basic field exact match filter.
 
     Will return all the rows where ``model_field`` equals the value of
     ``query_field``.
+
+    Values are converted to the type of the column, so that the database
+    compares them with the column as it is indexed, and duplicates are
+    dropped.  Values that can't be converted, such as ``?id=abc`` for an
+    integer column, are answered with ``400 Bad Request``.
     """
     def __init__(self, model_field, query_field=None,
-                 multi_query_field=None, multi=True):
+                 multi_query_field=None, multi=True, coerce=None):
         """Initialize the filter.
 
         Args:
@@ -70,6 +272,11 @@ class FieldMatchFilter(BaseFilter):
                 not present, ``'{}s[]'.format(query_field)`` will be used.
             multi (bool): If True, also check ``multi_query_field`` in the
                 query string, otherwise, only use ``query_field``.
+            coerce (object): Converts the values of the query string.  A
+                function raising ``ValueError`` for invalid values, or a
+                serializer field, whose validation errors are reported.  By
+                default, the values are converted according to the type of
+                the column, see :func:`get_type_coercer`.
         """
         super().__init__()
         self.model_field = model_field
@@ -80,15 +287,72 @@ class FieldMatchFilter(BaseFilter):
         self.query_field = query_field
         self.multi_query_field = multi_query_field
         self.multi = multi
-
-    def filter(self, req, qs):
+        self.coerce = coerce
+        if coerce is None:
+            self.coerce = self.get_coercer()
+
+    def get_coercer(self):
+        """Return the function converting values for the column."""
+        try:
+            column_type = self.model_field.property.columns[0].type
+        except (AttributeError, IndexError):
+            return None
+        return get_type_coercer(column_type)
+
+    def coerce_value(self, value):
+        """Convert a value of the query string.
+
+        Raises:
+            falcon.HTTPBadRequest: If the value is invalid.
+        """
+        try:
+            if not isinstance(self.coerce, Field):
+                return self.coerce(value)
+
+            data = {self.coerce.field_name: value}
+            if not self.coerce.validate(None, value, data=data):
+                return self.coerce.to_python(None, data, value)
+        except (ValueError, TypeError, OverflowError,
+                decimal.InvalidOperation):
+            pass
+
+        raise falcon.HTTPBadRequest(
+            title=_('Invalid filter'),
+            description=_(
+                '"{value}" is not a valid value for {field}.').format(
+                value=value, field=self.query_field))
+
+    def get_values(self, req):
+        """Return the converted values of the query string, without
+        duplicates.
+        """
         values = self.get_field_values(
             req=req,
             query_field=self.query_field,
             multi_query_field=self.multi_query_field,
             multi=self.multi)
 
-        if values:
+        if self.coerce is not None:
+            values = [self.coerce_value(value) for value in values]
+
+        return list(collections.OrderedDict.fromkeys(values))
+
+    def get_triggers(self):
+        if not self.uses_default(
+                'filter', 'get_values', owner=FieldMatchFilter):
+            return None
+        if not self.multi:
+            return frozenset([self.query_field])
+        return frozenset([
+            self.query_field,
+            self.multi_query_field or '{}s[]'.format(self.query_field)])
+
+    def filter(self, req, qs):
+        values = self.get_values(req)
+
+        if len(values) == 1:
+            qs = qs.filter(self.model_field == values[0])
+        elif values:
             qs = qs.filter(self.model_field.in_(values))
 
         return qs
@@ -132,10 +396,16 @@ class FlagFilter(BaseFilter):
         self.filter_default_func = filter_default_func
         self.filter_flag_present_func = filter_flag_present_func
 
-    def filter(self, req, qs):
-        filters = self.get_field_values(req, 'filter', 'filter[]')
+    def get_triggers(self):
+        """Return the key of the flag, unless there is a default filter."""
+        if self.uses_default('filter', owner=FlagFilter) and getattr(
+                self.filter_default_func, '__func__', None) is \
+                FlagFilter.filter_default:
+            return frozenset([flag_key(self.flag)])
+        return None
 
-        if self.flag in filters:
+    def filter(self, req, qs):
+        if self.flag in get_query_params(req).flags:
             qs = self.filter_flag_present_func(req=req, qs=qs)
         else:
             qs = self.filter_default_func(req=req, qs=qs)
@@ -151,14 +421,28 @@ class CompoundFilter(BaseFilter):
     ``inactive`` flag filters, and this provides an easy way to organize them
     together.
     """
+    _chain = None
+
     def __init__(self, filters=tuple()):
         self.filters = filters
 
-    def filter(self, req, qs):
-        for f in self.filters:
-            qs = f.filter(req, qs)
+    def get_chain(self):
+        """Return the :class:`FilterChain` of ``self.filters``."""
+        if self._chain is None or self._chain_source is not self.filters:
+            self._chain = FilterChain(self.filters)
+            self._chain_source = self.filters
+        return self._chain
+
+    def get_triggers(self):
+        if not self.uses_default('filter', owner=CompoundFilter):
+            return None
+        chain = self.get_chain()
+        if chain.unconditional:
+            return None
+        return chain.triggers
 
-        return qs
+    def filter(self, req, qs):
+        return self.get_chain().filter(req, qs)
 
 
 class ArchiveFlagFilter(FlagFilter):
@@ -166,9 +450,12 @@ class ArchiveFlagFilter(FlagFilter):
 
     By default, does not include rows where `deleted_at` is not null.  If the
     filter flag `deleted` is present, rows where `deleted_at` is not null will
-    also be present.
+    also be present, as they are in sync requests, which report them as
+    deleted.
     """
     def filter_default(self, req, qs):
+        if req.context.get(SYNC_CONTEXT_KEY):
+            return qs
         return qs.filter(self.model_field.is_(None))
 
     def __init__(self, model_field):
@@ -176,10 +463,188 @@ class ArchiveFlagFilter(FlagFilter):
         super().__init__('deleted')
 
 
+def get_prefix_upper_bound(prefix):
+    """Return the smallest string greater than all those starting with
+    ``prefix``, in code point order.
+
+    The last character that can be incremented is, and the ones after it are
+    dropped.  Returns ``None`` if there is no such string.
+    """
+    chars = list(prefix)
+    while chars:
+        code = ord(chars.pop()) + 1
+        if 0xd800 <= code <= 0xdfff:
+            # surrogates are not valid characters on their own
+            code = 0xe000
+        if code <= sys.maxunicode:
+            return ''.join(chars) + chr(code)
+    return None
+
+
+#: the search indexes of the :class:`SearchFilter` instances, by name.
+_search_indexes = collections.OrderedDict()
+
+
+class SearchIndex(object):
+    """The index making the searches of a :class:`SearchFilter` fast.
+
+    Created by :func:`create_search_indexes`, which ``manage.py syncdb``
+    calls:
+
+    * ``prefix`` mode: a B-tree index of ``lower(column)``, or of the column
+      itself for case sensitive searches.  With PostgreSQL, the index uses
+      the ``text_pattern_ops`` operator class, so that ``LIKE 'term%'`` can
+      read from it whatever the collation of the database.
+    * ``fulltext`` mode: with PostgreSQL, a GIN index of the ``tsvector`` of
+      the column.  With SQLite, an FTS5 table named
+      ``<table>_<column>_fts``, kept up to date with triggers on the table,
+      and rebuilt from it each time the index is created.
+
+    Indexes are created with ``IF NOT EXISTS``, which PostgreSQL supports
+    since 9.5.
+
+    Args:
+        model_field (object): The SQLAlchemy field.
+        mode (str): ``prefix`` or ``fulltext``.
+        case_insensitive (bool): Whether the prefix index is lower cased.
+        language (str): The text search configuration of PostgreSQL.
+    """
+    def __init__(self, model_field, mode, case_insensitive=True,
+                 language='english'):
+        self.column = model_field.property.columns[0]
+        self.table = self.column.table.name
+        self.mode = mode
+        self.case_insensitive = case_insensitive
+        self.language = language
+
+    @property
+    def name(self):
+        suffix = 'lower' if self.case_insensitive else 'prefix'
+        if self.mode == 'fulltext':
+            suffix = 'fts'
+        return 'ix_{}_{}_{}'.format(self.table, self.column.name, suffix)
+
+    @property
+    def fts_table(self):
+        """The name of the SQLite FTS5 table."""
+        return '{}_{}_fts'.format(self.table, self.column.name)
+
+    def get_statements(self, connection):
+        """Return the SQL statements creating the index, for the dialect
+        of ``connection``, or ``None`` if it is not supported.
+        """
+        quote = connection.dialect.identifier_preparer.quote
+        dialect = connection.dialect.name
+        values = {
+            'name': quote(self.name),
+            'table': quote(self.table),
+            'column': quote(self.column.name),
+            'fts': quote(self.fts_table),
+            'language': self.language,
+        }
+
+        if self.mode == 'prefix':
+            if dialect not in ('postgresql', 'sqlite'):
+                return None
+            expression = '{column}'
+            if self.case_insensitive:
+                expression = 'lower({column})'
+            if dialect == 'postgresql':
+                expression += ' text_pattern_ops'
+            return [(
+                'CREATE INDEX IF NOT EXISTS {name} ON {table} (' +
+                expression + ')').format(**values)]
+
+        if dialect == 'postgresql':
+            return [
+                "CREATE INDEX IF NOT EXISTS {name} ON {table} USING GIN "
+                "(to_tsvector('{language}', {column}))".format(**values)]
+
+        if dialect == 'sqlite':
+            statements = [
+                "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                "{column}, content={table})",
+                "CREATE TRIGGER IF NOT EXISTS {name}_insert AFTER INSERT ON "
+                "{table} BEGIN INSERT INTO {fts}(rowid, {column}) VALUES "
+                "(new.rowid, new.{column}); END",
+                "CREATE TRIGGER IF NOT EXISTS {name}_delete AFTER DELETE ON "
+                "{table} BEGIN INSERT INTO {fts}({fts}, rowid, {column}) "
+                "VALUES ('delete', old.rowid, old.{column}); END",
+                "CREATE TRIGGER IF NOT EXISTS {name}_update AFTER UPDATE ON "
+                "{table} BEGIN INSERT INTO {fts}({fts}, rowid, {column}) "
+                "VALUES ('delete', old.rowid, old.{column}); "
+                "INSERT INTO {fts}(rowid, {column}) VALUES "
+                "(new.rowid, new.{column}); END",
+                "INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+            ]
+            return [statement.format(**values) for statement in statements]
+
+        return None
+
+    def create(self, connection):
+        """Create the index, if the database supports it.
+
+        Returns:
+            bool: ``False`` if the database does not support it.
+        """
+        statements = self.get_statements(connection)
+        if statements is None:
+            logger.warning(
+                'The %s search index of %s.%s is not supported by %s.',
+                self.mode, self.table, self.column.name,
+                connection.dialect.name)
+            return False
+
+        for statement in statements:
+            connection.execute(statement)
+        return True
+
+
+def get_search_indexes():
+    """Return the :class:`SearchIndex` of the search filters."""
+    return list(_search_indexes.values())
+
+
+def create_search_indexes(engine=None):
+    """Create the indexes of the search filters, see :class:`SearchIndex`.
+
+    Only the search filters that were created, which is usually when the
+    viewsets module of their app is imported, are covered.
+
+    Args:
+        engine (object): The database engine, ``frf.db.engine`` by default.
+    """
+    engine = engine or db.get_engine()
+    with engine.begin() as connection:
+        for index in get_search_indexes():
+            index.create(connection)
+
+
 class SearchFilter(BaseFilter):
-    """Filter allowing for a text search on a field."""
+    """Filter allowing for a text search on a field.
+
+    Three modes are available:
+
+    * ``contains``, the default: rows where the field contains the search
+      term, with ``LIKE '%term%'``, which scans the table.
+    * ``prefix``: rows where the field starts with the search term.  With
+      its :class:`SearchIndex`, the database only reads the matching rows,
+      with any database supporting indexes of expressions.
+    * ``fulltext``: rows where the field contains all the words of the
+      search, with the full-text search of PostgreSQL or SQLite, and their
+      :class:`SearchIndex`.  Rows are ordered from the most relevant when
+      ``rank`` is set.  With other databases, this falls back to
+      ``contains``.
+
+    Run ``manage.py syncdb`` to create the indexes, see
+    :func:`create_search_indexes`.
+    """
+    #: the search modes.
+    MODES = ('contains', 'prefix', 'fulltext')
+
     def __init__(self, model_field, query_field='search',
-                 case_insensitive=True):
+                 case_insensitive=True, mode='contains', rank=False,
+                 language='english'):
         """Initialize the filter.
 
         Args:
@@ -187,18 +652,127 @@ class SearchFilter(BaseFilter):
             query_field (str): The field to look for in the query string.
                 Default is ``search``.
             case_insensitive (bool): Set to True to use case insensitive
-                searching.
+                searching.  Full-text searches are always case insensitive.
+            mode (str): One of :attr:`MODES`.
+            rank (bool): For full-text searches, order the results by
+                relevance.
+            language (str): The text search configuration used by
+                PostgreSQL for full-text searches, such as ``english`` or
+                ``simple``.
         """
+        if mode not in self.MODES:
+            raise ValueError(
+                'Unknown search mode {}, expected one of {}.'.format(
+                    mode, ', '.join(self.MODES)))
+        if not re.match(r'^\w+$', language):
+            raise ValueError('Invalid language {}.'.format(language))
+
         self.model_field = model_field
         self.query_field = query_field
         self.case_insensitive = case_insensitive
+        self.mode = mode
+        self.rank = rank
+        self.language = language
         self.func = getattr(model_field, 'like')
         if case_insensitive:
             self.func = getattr(model_field, 'ilike')
 
+        self.index = None
+        if mode != 'contains':
+            self.index = SearchIndex(
+                model_field, mode, case_insensitive, language)
+            _search_indexes.setdefault(self.index.name, self.index)
+
+    def get_triggers(self):
+        if not self.uses_default('filter', owner=SearchFilter):
+            return None
+        return frozenset([self.query_field])
+
     def filter(self, req, qs):
-        search = req.get_param('search')
+        search = get_query_params(req).get(self.query_field)
         if search is not None:
-            qs = qs.filter(self.func(r'%{}%'.format(search)))
+            qs = getattr(self, 'filter_{}'.format(self.mode))(qs, search)
+
+        return qs
+
+    def filter_contains(self, qs, search):
+        return qs.filter(self.func(r'%{}%'.format(search)))
+
+    def filter_prefix(self, qs, search):
+        if not search:
+            return qs
+
+        dialect = db.get_engine().dialect.name
+        expression = self.model_field
+        if self.case_insensitive:
+            expression = func.lower(expression)
+            if dialect == 'sqlite':
+                # the range below needs the term lower cased here, the way
+                # SQLite lowers the column
+                search = search.translate(ASCII_LOWERCASE)
+
+        escaped = re.sub(r'([\\%_])', r'\\\1', search)
+        pattern = escaped + '%'
+        if self.case_insensitive and dialect != 'sqlite':
+            # lower the term with the same function as the column
+            pattern = func.lower(pattern)
+
+        if dialect == 'postgresql':
+            # backslash is the default escape, and without an explicit one
+            # the prefix is read from the index, see `SearchIndex`
+            return qs.filter(expression.like(pattern))
+
+        clauses = [expression.like(pattern, escape='\\')]
+
+        # SQLite does not read the prefix of a LIKE with an ESCAPE from the
+        # index, so give it the range, in the code point order of its
+        # strings.  Other databases may order them otherwise, and only get
+        # the LIKE.
+        if dialect == 'sqlite':
+            clauses.append(expression >= search)
+            upper = get_prefix_upper_bound(search)
+            if upper is not None:
+                clauses.append(expression < upper)
+
+        return qs.filter(and_(*clauses))
+
+    def filter_fulltext(self, qs, search):
+        dialect = db.get_engine().dialect.name
+        if dialect == 'postgresql':
+            return self.filter_postgresql(qs, search)
+        if dialect == 'sqlite':
+            return self.filter_sqlite(qs, search)
+        return self.filter_contains(qs, search)
+
+    def filter_postgresql(self, qs, search):
+        language = literal_column("'{}'::regconfig".format(self.language))
+        vector = func.to_tsvector(language, self.model_field)
+        query = func.plainto_tsquery(language, search)
+
+        qs = qs.filter(vector.op('@@')(query))
+        if self.rank:
+            qs = qs.order_by(func.ts_rank(vector, query).desc())
+        return qs
 
+    def filter_sqlite(self, qs, search):
+        words = re.findall(r'\w+', search)
+        if not words:
+            return qs.filter(false())
+
+        # the matches are joined on the primary key of the mapped table,
+        # which queries adapt to their aliases, unlike its rowid
+        keys = list(self.index.column.table.primary_key.columns)
+        rows = table(
+            self.index.table, column('rowid'), *[column(c.name) for c in keys])
+        fts = table(self.index.fts_table, column('rowid'), column('rank'))
+        match = literal_column(self.index.fts_table).op('MATCH')(
+            ' '.join('"{}"'.format(word) for word in words))
+        found = select(
+            [rows.c[c.name] for c in keys] + [fts.c.rank.label('rank')]
+        ).select_from(rows.join(fts, fts.c.rowid == rows.c.rowid)).where(
+            match).alias()
+
+        qs = qs.join(found, and_(*[found.c[c.name] == c for c in keys]))
+        if self.rank:
+            qs = qs.order_by(found.c.rank)
         return qs
@@ -4,16 +4,20 @@ import argparse
 import importlib
 import sys
 
-import tabulate
-
-try:
-    import pyfiglet
-except ImportError:
-    pyfiglet = None
-
 from frf import conf
 from frf.utils.cli import colors
 
+#: the commands that come with frf.
+DEFAULT_COMMAND_MODULES = [
+    'frf.commands.runserver',
+    'frf.commands.shell',
+    'frf.commands.test',
+    'frf.commands.syncdb',
+    'frf.commands.startapp',
+    'frf.commands.cachestats',
+    'frf.commands.importtime',
+    ]
+
 globalparser = argparse.ArgumentParser(
     description='Run management commmands.', add_help=False)
 globalparser.add_argument(
@@ -40,92 +44,112 @@ class CommandArgumentParser(argparse.ArgumentParser):
 
 
 def find_commands():
-    """Load command modules.
+    """Find the command modules, without importing them.
 
-    Loads the default command modules, plus the modules from the
-    `COMMAND_MODULES` setting.
-    """
-    module_names = [
-        'frf.commands.runserver',
-        'frf.commands.shell',
-        'frf.commands.test',
-        'frf.commands.syncdb',
-        'frf.commands.startapp',
-        ]
+    Finds the default command modules, plus the modules from the
+    `COMMAND_MODULES` setting.  Commands are named after the last part of
+    their module name, and later modules replace earlier ones.
 
-    module_names += conf.get('COMMAND_MODULES', [])
+    Returns:
+        dict: Module names by command name.
+    """
+    module_names = DEFAULT_COMMAND_MODULES + list(
+        conf.get('COMMAND_MODULES', []))
 
     commands = {}
-
     for module_name in module_names:
-        module = importlib.import_module(module_name)
-        cls = getattr(module, 'Command', None)
-        if not cls:
-            sys.stderr.write(
-                'Could not get management command'
-                ' from class: {}.Command\n'.format(module_name))
-            sys.exit(-1)
-        command_name = module_name[module_name.rfind('.') + 1:]
-        commands[command_name] = cls
+        commands[module_name[module_name.rfind('.') + 1:]] = module_name
 
     return commands
 
 
-def main():
-    """The main command loader.
+def load_command(module_name):
+    """Import a command module and return its ``Command`` class."""
+    module = importlib.import_module(module_name)
+    cls = getattr(module, 'Command', None)
+    if not cls:
+        sys.stderr.write(
+            'Could not get management command'
+            ' from class: {}.Command\n'.format(module_name))
+        sys.exit(-1)
 
-    Args:
-        module_name (str): The main module name (where `app.init()` lives).
-    """
-    if pyfiglet:
+    return cls
+
+
+def print_banner():
+    """Print the project name, in big letters if pyfiglet is installed."""
+    try:
+        import pyfiglet
+    except ImportError:
+        text = conf.get('PROJECT_NAME', 'frf') + '\n'
+    else:
         figlet = pyfiglet.Figlet(font='slant')
         text = figlet.renderText(conf.get('PROJECT_NAME'))
-    else:
-        text = conf.get('PROJECT_NAME', 'frf') + '\n'
 
     col = colors.ColorText()
     sys.stdout.writelines([
         col.lightmagenta(text).value(), '~' * 70, '\n'])
 
+
+def print_commands(commands):
+    """Print the usage and the description of every command.
+
+    This imports all the command modules.
+    """
+    import tabulate
+
+    col = colors.ColorText()
+    sys.stdout.writelines([
+        'usage: manage.py [command] [options]...\n\n',
+        'The following commands are available:\n\n',
+        ])
+    table = []
+
+    for command in sorted(commands):
+        cls = load_command(commands[command])
+        table.append((
+            col.reset(' ').green(command).reset('').value(),
+            col.reset('- ').reset(getattr(
+                cls, 'description', 'no description provided')).value()))
+
+    sys.stdout.writelines([
+        tabulate.tabulate(table, tablefmt='plain'), '\n'])
+
+
+def main():
+    """The main command loader.
+
+    Only the module of the command being run is imported.  The banner is
+    printed when listing the commands, and before running one if the
+    ``MANAGE_BANNER`` setting is set.
+    """
     argv = sys.argv[:]
     args, _ = globalparser.parse_known_args()
     commands = find_commands()
 
-    if args.command:
-        if args.command not in commands:
-            sys.stderr.writelines([
-                'Command not found: {}\n\n'.format(args.command),
-                '\n'])
-            sys.exit(-1)
+    if not args.command:
+        print_banner()
+        print_commands(commands)
+        return
 
-        argv = argv[2:]
+    if args.command not in commands:
+        sys.stderr.writelines([
+            'Command not found: {}\n\n'.format(args.command),
+            '\n'])
+        sys.exit(-1)
 
-        # create a new parser
-        parser = CommandArgumentParser(
-            args.command, description='Run management commands.')
-        command = commands[args.command]()
-        command.add_arguments(parser)
+    if conf.get('MANAGE_BANNER', False):
+        print_banner()
 
-        if getattr(command, 'parse_arguments', True):
-            args = parser.parse_args(argv)
+    argv = argv[2:]
 
-        command.handle(args)
-    else:
-        sys.stdout.writelines([
-            'usage: manage.py [command] [options]...\n\n',
-            'The following commands are available:\n\n',
-            ])
-        table = []
+    # create a new parser
+    parser = CommandArgumentParser(
+        args.command, description='Run management commands.')
+    command = load_command(commands[args.command])()
+    command.add_arguments(parser)
 
-        keys = list(commands.keys())
-        keys.sort()
+    if getattr(command, 'parse_arguments', True):
+        args = parser.parse_args(argv)
 
-        for command in keys:
-            cls = commands.get(command)
-            table.append((
-                col.reset(' ').green(command).reset('').value(),
-                col.reset('- ').reset(getattr(
-                    cls, 'description', 'no description provided')).value()))
-
-        sys.stdout.writelines([
-            tabulate.tabulate(table, tablefmt='plain'), '\n'])
+    command.handle(args)
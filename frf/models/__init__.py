@@ -17,7 +17,10 @@
 # code under the terms of the Apache License, Version 2.0, as described
 # above.
 
+import importlib
 import logging
+import sys
+from types import ModuleType
 
 from sqlalchemy.ext.declarative import declarative_base, declared_attr  # noqa
 from sqlalchemy.ext.mutable import MutableDict  # noqa
@@ -70,10 +73,32 @@ from frf.utils.db import BaseQuery
 logger = logging.getLogger(__name__)
 
 
-try:
-    from sqlalchemy.dialects.postgresql import JSON, JSONB  # noqa
-except ImportError:
-    logger.warning('Error importing PostgreSQL JSON types.')
+#: attributes imported on first use, because their modules are slow to
+#: import.
+LAZY_ATTRIBUTES = {
+    'JSON': 'sqlalchemy.dialects.postgresql',
+    'JSONB': 'sqlalchemy.dialects.postgresql',
+}
+
+
+class _LazyModule(ModuleType):
+    def __getattr__(self, name):
+        module_name = LAZY_ATTRIBUTES.get(name)
+        if module_name is None:
+            raise AttributeError(name)
+
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            logger.warning('Error importing {}.'.format(module_name))
+            raise AttributeError(name)
+
+        value = getattr(module, name)
+        setattr(self, name, value)
+        return value
+
+
+sys.modules[__name__].__class__ = _LazyModule
 
 
 class Choices(list):
@@ -20,11 +20,8 @@
 import binascii
 import uuid
 
-from Crypto.Cipher import AES
 import pytz
 import sqlalchemy
-
-from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.mutable import Mutable
 from sqlalchemy.types import CHAR, Text, TypeDecorator
 
@@ -64,6 +61,8 @@ class GUID(TypeDecorator):
 
     def load_dialect_impl(self, dialect):
         if dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import UUID
+
             return dialect.type_descriptor(UUID())
         else:
             return dialect.type_descriptor(CHAR(32))
@@ -146,12 +145,16 @@ class MutableList(Mutable, list):
 
 
 def aes_encrypt(data, key):
+    from Crypto.Cipher import AES
+
     cipher = AES.new(key)
     data = data + (" " * (16 - (len(data) % 16)))
     return binascii.hexlify(cipher.encrypt(data))
 
 
 def aes_decrypt(data, key):
+    from Crypto.Cipher import AES
+
     cipher = AES.new(key)
     return cipher.decrypt(binascii.unhexlify(data)).rstrip()
 
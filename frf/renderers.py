@@ -57,6 +57,10 @@ class ListMetaRenderer(BaseRenderer):
               "page_limit": 100
           }
         }
+
+    Objects side-loaded with ``?include=``, see
+    :class:`frf.viewsets.BasicModelViewSet`, are added to an ``included``
+    dictionary, by relationship name.
     """
     list_only = True
 
@@ -67,4 +71,8 @@ class ListMetaRenderer(BaseRenderer):
                 'results': data,
             }
 
+            included = req.context.get(ViewSet.INCLUDED_CONTEXT_KEY)
+            if included is not None:
+                data['included'] = included
+
         return data
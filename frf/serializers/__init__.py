@@ -22,7 +22,8 @@ from gettext import gettext as _
 from .fields import (  # noqa
     Field, StringField, EmailField, BooleanField,
     ISODateTimeField, SerializerField, ListField, UUIDField, JSONField,
-    IntField, PrimaryKeyRelatedField,
+    IntField, PrimaryKeyRelatedField, BatchMethodField, AggregateField,
+    CountField, SumField, ExistsField,
 )
 from frf.exceptions import InvalidFieldException,  ValidationError
 
@@ -290,6 +291,9 @@ class Serializer(object):
             objs (object): The object or objects to serialize.
             many (bool): Set to True if `objs` is a list of more than one
                 object.
+            ctx (dict): Passed to the fields.  Each
+                :class:`frf.serializers.fields.BatchMethodField` adds the
+                values it computed for ``objs`` to a copy of it.
 
         Returns:
             dict: The serialized data.
@@ -300,6 +304,13 @@ class Serializer(object):
         if not many:
             objs = [objs]
 
+        batch_fields = [f for f in self.fields.values() if f.batch]
+        if batch_fields:
+            objs = list(objs)
+            ctx = dict(ctx)
+            for field in batch_fields:
+                field.resolve(objs, ctx)
+
         serialized_objs = []
 
         for obj in objs:
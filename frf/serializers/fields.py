@@ -18,18 +18,28 @@
 # above.
 
 import datetime
+import decimal
 from gettext import gettext as _
 import json
 import re
 import uuid
 
-import dateutil.parser
-
+from sqlalchemy import and_, exists, func, orm, select
 
 from frf import exceptions
 from frf.utils.json import deserialize
 
 
+def parse_datetime(value):
+    """Parse a date and time string with ``dateutil``.
+
+    ``dateutil`` is slow to import, so it is only imported on first use.
+    """
+    import dateutil.parser
+
+    return dateutil.parser.parse(value)
+
+
 class Field(object):
     """Base field - all other fields inherit from this field.
 
@@ -51,6 +61,8 @@ class Field(object):
     order they are defined on the class.
     """
     requires_model_serializer = False
+    #: whether ``resolve`` must be called with the objects to serialize.
+    batch = False
 
     def __init__(self, required=False, default=None,
                  read_only=False, update_read_only=False, write_only=False,
@@ -391,7 +403,7 @@ class ISODateTimeField(Field):
         if isinstance(value, datetime.datetime):
             return
         try:
-            dateutil.parser.parse(value)
+            parse_datetime(value)
         except Exception as e:
             raise exceptions.ValidationError(
                 _('Error converting datetime: {message}'.format(message=e)))
@@ -402,7 +414,7 @@ class ISODateTimeField(Field):
 
         if isinstance(value, datetime.datetime):
             return value
-        return dateutil.parser.parse(value)
+        return parse_datetime(value)
 
     def to_data(self, obj, value, ctx=None):
         if not value:
@@ -820,3 +832,212 @@ class PrimaryKeyRelatedField(Field):
             raise exceptions.ValidationError(
                 _('A row with the key "{key}" does'
                   ' not exist in the database.'.format(key=keys)))
+
+
+class BatchMethodField(Field):
+    """A read-only value computed for all the serialized objects at once.
+
+    Calls a method of the serializer once per call to ``serialize``, with
+    the list of objects, which returns a mapping from each object to its
+    value, so that a page of objects costs one query:
+
+    .. code-block:: python
+       :caption: serializers.py
+
+       from sqlalchemy import func
+
+       from frf import db, serializers
+       from myproject import models
+
+
+       class ProjectSerializer(serializers.ModelSerializer):
+           open_tasks = serializers.BatchMethodField(default=0)
+
+           def get_open_tasks(self, objs, ctx=None):
+               counts = dict(db.session.query(
+                   models.Task.project_id, func.count(models.Task.id)).filter(
+                   models.Task.project_id.in_([o.id for o in objs]),
+                   models.Task.is_open.is_(True)).group_by(
+                   models.Task.project_id))
+               return {o: counts.get(o.id, 0) for o in objs}
+
+           class Meta:
+               model = models.Project
+
+    Objects missing from the mapping get ``default``.
+    """
+    batch = True
+
+    def __init__(self, method_name=None, **kwargs):
+        """
+        Args:
+            method_name (str): The name of the serializer method, by default
+                ``get_<field_name>``.
+        """
+        self.method_name = method_name
+        kwargs.setdefault('read_only', True)
+        super().__init__(**kwargs)
+
+    @property
+    def ctx_key(self):
+        return ('_frf_batch', id(self))
+
+    def resolve(self, objs, ctx):
+        """Compute the values of ``objs`` and keep them in ``ctx``."""
+        method = getattr(
+            self._serializer, self.method_name or 'get_' + self.field_name)
+        ctx[self.ctx_key] = method(objs, ctx=ctx)
+
+    def to_data(self, obj, value, ctx=None):
+        if ctx is None:
+            ctx = {}
+
+        if self.ctx_key not in ctx:
+            self.resolve([obj], ctx)
+
+        value = ctx[self.ctx_key].get(obj, self.default)
+        return value() if callable(value) else value
+
+
+class AggregateField(Field):
+    """Base class of the fields aggregating a relationship in SQL.
+
+    Requires that you use this field on a
+    :class:`frf.serializers.ModelSerializer`.  The value is computed by a
+    correlated subquery, that :class:`frf.viewsets.BasicModelViewSet` adds
+    to the query of its objects with
+    :meth:`frf.utils.db.BaseQuery.annotate`, so it comes in the same
+    ``SELECT`` as the objects.  Objects loaded otherwise, such as a newly
+    created one, run the subquery on their own.
+
+    Subclasses implement ``aggregate``.
+    """
+    requires_model_serializer = True
+
+    def __init__(self, relationship, filter=None, **kwargs):
+        """
+        Args:
+            relationship (str): The name of the relationship to aggregate.
+            filter (callable): Called with the related model, returns a
+                clause restricting the related rows, for instance
+                ``lambda Task: Task.is_open.is_(True)``.
+        """
+        self.relationship = relationship
+        self.filter = filter
+        self._expressions = {}
+        kwargs.setdefault('read_only', True)
+        super().__init__(**kwargs)
+
+    @property
+    def annotation_name(self):
+        """The name of the attribute the value is loaded into."""
+        return '_frf_{}'.format(self.field_name)
+
+    def aggregate(self, related, clause):
+        """Return the aggregate of the ``related`` rows matching ``clause``.
+        """
+        raise NotImplementedError()
+
+    def expression(self, model):
+        """Return the SQL expression of the value, for objects of ``model``.
+        """
+        try:
+            return self._expressions[model]
+        except KeyError:
+            pass
+
+        prop = getattr(model, self.relationship).property
+        related = prop.mapper.class_
+        clauses = [prop.primaryjoin]
+        if prop.secondary is not None:
+            clauses.append(prop.secondaryjoin)
+        if self.filter is not None:
+            clauses.append(self.filter(related))
+
+        expression = self._expressions[model] = self.aggregate(
+            related, and_(*clauses))
+        return expression
+
+    def load(self, obj):
+        """Compute the value of ``obj`` with a query of its own."""
+        session = orm.object_session(obj)
+        if session is None:
+            return None
+
+        mapper = orm.object_mapper(obj)
+        keys = mapper.primary_key_from_instance(obj)
+        return session.query(self.expression(mapper.class_)).filter(and_(*[
+            column == key
+            for column, key in zip(mapper.primary_key, keys)])).scalar()
+
+    def to_data(self, obj, value, ctx=None):
+        try:
+            return getattr(obj, self.annotation_name)
+        except AttributeError:
+            return self.load(obj)
+
+
+class CountField(AggregateField):
+    """The number of related rows.
+
+    .. code-block:: python
+       :caption: serializers.py
+
+       class AuthorSerializer(serializers.ModelSerializer):
+           book_count = serializers.CountField('books')
+
+           class Meta:
+               model = models.Author
+    """
+    def aggregate(self, related, clause):
+        return select([func.count()]).where(clause).as_scalar()
+
+    def to_data(self, obj, value, ctx=None):
+        return super().to_data(obj, value, ctx=ctx) or 0
+
+
+class SumField(AggregateField):
+    """The sum of a column of the related rows, 0 if there are none.
+
+    .. code-block:: python
+       :caption: serializers.py
+
+       class OrderSerializer(serializers.ModelSerializer):
+           total = serializers.SumField('lines', 'price')
+    """
+    def __init__(self, relationship, column, **kwargs):
+        """
+        Args:
+            column (str): The name of the column of the related model.
+        """
+        self.column = column
+        super().__init__(relationship, **kwargs)
+
+    def aggregate(self, related, clause):
+        return select([
+            func.coalesce(func.sum(getattr(related, self.column)), 0),
+            ]).where(clause).as_scalar()
+
+    def to_data(self, obj, value, ctx=None):
+        value = super().to_data(obj, value, ctx=ctx)
+        # sums of ``Numeric`` columns are decimals, which JSON can't encode
+        if isinstance(value, decimal.Decimal):
+            return float(value)
+        return value
+
+
+class ExistsField(AggregateField):
+    """Whether there are related rows.
+
+    .. code-block:: python
+       :caption: serializers.py
+
+       class ProjectSerializer(serializers.ModelSerializer):
+           has_open_tasks = serializers.ExistsField(
+               'tasks', filter=lambda Task: Task.is_open.is_(True))
+    """
+    def aggregate(self, related, clause):
+        return exists().where(clause)
+
+    def to_data(self, obj, value, ctx=None):
+        return bool(super().to_data(obj, value, ctx=ctx))
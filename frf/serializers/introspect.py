@@ -17,6 +17,7 @@
 # code under the terms of the Apache License, Version 2.0, as described
 # above.
 
+from sqlalchemy import types
 from sqlalchemy.inspection import inspect
 
 from frf import models
@@ -68,10 +69,25 @@ CONVERTER_MAP = {
     models.Integer:       integer_converter,
     models.BigInteger:    integer_converter,
     models.Float:         float_converter,
-    models.JSON:          json_converter,
-    models.JSONB:         json_converter,
     }
 
+#: base types whose subclasses are all converted the same way, such as the
+#: PostgreSQL ``JSON`` and ``JSONB`` types, which are not imported until a
+#: model uses them.
+BASE_CONVERTER_MAP = {
+    types.JSON:           json_converter,
+    }
+
+
+def get_converter(column_type):
+    converter = CONVERTER_MAP.get(type(column_type))
+    if converter is None:
+        for base, base_converter in BASE_CONVERTER_MAP.items():
+            if isinstance(column_type, base):
+                return base_converter
+
+    return converter
+
 
 def table_fields(serializer, model):
     """Get list of serializer fields from the table model.
@@ -87,8 +103,9 @@ def table_fields(serializer, model):
     columns = info.c.items()
 
     for attr_name, column in columns:
-        if type(column.type) in CONVERTER_MAP:
-            field = CONVERTER_MAP[type(column.type)](column)
+        converter = get_converter(column.type)
+        if converter is not None:
+            field = converter(column)
             field.required = False
             field.nullable = column.nullable
             field.source = attr_name
@@ -19,6 +19,8 @@
 
 import uuid
 
+from sqlalchemy import Numeric
+
 from frf import models
 
 
@@ -46,6 +48,7 @@ class Author(models.Model):
 class Book(models.Model):
     id = models.Column(models.Integer, primary_key=True)
     title = models.Column(models.String)
+    price = models.Column(Numeric(10, 2))
     author_uuid1 = models.Column(
         models.GUID, models.ForeignKey('author.uuid1'))
     author_uuid2 = models.Column(
@@ -49,3 +49,17 @@ class BookSerialzier(serializers.ModelSerializer):
     class Meta:
         fields = ('id', 'title', 'author')
         model = models.Book
+
+
+class LibraryAuthorSerializer(AuthorSerializer):
+    book_count = serializers.CountField('books')
+    book_id_total = serializers.SumField('books', 'id')
+    book_price_total = serializers.SumField('books', 'price')
+    has_sinbad = serializers.ExistsField(
+        'books', filter=lambda Book: Book.title == 'Sinbad')
+
+    class Meta:
+        fields = (
+            'uuid1', 'uuid2', 'name', 'company', 'books', 'book_count',
+            'book_id_total', 'book_price_total', 'has_sinbad')
+        model = models.Author
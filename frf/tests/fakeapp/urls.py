@@ -31,5 +31,7 @@ urlpatterns = [
     ('/books/{id}/', book_viewset),
     ('/authors/', author_viewset),
     ('/authors/{uuid1}/{uuid2}/', author_viewset),
+    ('/library/books/', viewsets.LibraryBookViewSet()),
+    ('/library/authors/', viewsets.LibraryAuthorViewSet()),
     ('/test_permissions_view/', viewsets.TestView()),
     ]
@@ -17,7 +17,7 @@
 # code under the terms of the Apache License, Version 2.0, as described
 # above.
 
-from frf import permissions, views, viewsets
+from frf import permissions, renderers, views, viewsets
 from frf.tests.fakeapp import models, serializers
 
 
@@ -44,6 +44,22 @@ class BookViewSet(viewsets.ModelViewSet):
     serializer = serializers.BookSerialzier()
 
 
+class LibraryBookViewSet(BookViewSet):
+    renderers = [renderers.ListMetaRenderer()]
+    includes = {
+        'author': AuthorViewSet(),
+    }
+
+
+class LibraryAuthorViewSet(AuthorViewSet):
+    renderers = [renderers.ListMetaRenderer()]
+    serializer = serializers.LibraryAuthorSerializer()
+    includes = {
+        'books': BookViewSet(),
+        'company': CompanyViewSet(),
+    }
+
+
 class TestPermission(permissions.BasePermission):
     def has_permission(self, req, view, **kwargs):
         return req.method != 'POST'
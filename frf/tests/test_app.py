@@ -19,9 +19,11 @@
 
 import unittest
 
+import mock
+
 from frf.tests import fakeproject  # noqa
 from frf.cache.engines.dummy import DummyCacheEngine  # noqa
-from frf import conf, cache, db  # noqa
+from frf import app, conf, cache, db  # noqa
 
 #: NOTE: The tests here are initializeed when we import ``fakeproject`` above.
 
@@ -40,3 +42,19 @@ class TestCase(unittest.TestCase):
     def test_app_init_conf(self):
         self.assertTrue(conf.DEBUG)
         self.assertEqual(conf['TIMEZONE'], 'US/Mountain')
+
+    def test_app_init_warmup(self):
+        from frf.tests.fakeapp import urls
+
+        self.assertIn('get', urls.book_viewset._dispatch_plans)
+        self.assertIn('post', urls.book_viewset._dispatch_plans)
+
+    @mock.patch('frf.db.engine')
+    def test_post_fork(self, engine_mock):
+        engine_mock.pool.size.return_value = 2
+        with mock.patch('frf.app.logger') as logger_mock:
+            app.post_fork()
+
+        self.assertTrue(engine_mock.dispose.called)
+        self.assertEqual(engine_mock.connect.call_count, 1)
+        self.assertFalse(logger_mock.exception.called)
@@ -0,0 +1,269 @@
+# Copyright 2016 by Teem, and other contributors,
+# as noted in the individual source code files.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# By contributing to this project, you agree to also license your source
+# code under the terms of the Apache License, Version 2.0, as described
+# above.
+
+import asyncio
+import json
+from unittest import TestCase
+
+import falcon
+from falcon import testing
+import mock
+
+from frf import asgi, serializers, views, viewsets
+from frf.utils import concurrency
+
+
+class User(object):
+    pass
+
+
+class AsyncKeyAuthentication(object):
+    def __init__(self):
+        self.calls = 0
+
+    async def async_authenticate(self, req, view):
+        self.calls += 1
+        await asyncio.sleep(0)
+        return self.authenticate(req, view)
+
+    def authenticate(self, req, view):
+        if req.get_param('auth_key') == 'superpassword':
+            return User()
+
+    def __str__(self):
+        return 'key'
+
+
+class ItemSerializer(serializers.Serializer):
+    name = serializers.StringField(required=True)
+
+
+class Item(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class ItemViewSet(viewsets.ViewSet):
+    serializer = ItemSerializer()
+    obj_lookup_kwarg = 'name'
+
+    def get_qs(self, req, **kwargs):
+        return self.items
+
+    def get_obj(self, req, **kwargs):
+        for item in self.items:
+            if item.name == kwargs['name']:
+                return item
+        raise falcon.HTTPNotFound()
+
+    def create_save_obj(self, req, obj, **kwargs):
+        self.items.append(obj)
+
+    def paginate_qs(self, req, qs, **kwargs):
+        return qs
+
+
+class AsyncItemViewSet(ItemViewSet):
+    authentication = [AsyncKeyAuthentication()]
+
+    async def retrieve(self, req, resp, **kwargs):
+        obj = await concurrency.run_sync(self.get_obj, req, **kwargs)
+        await asyncio.sleep(0)
+        resp.body = self.get_serializer(req, **kwargs).serialize(obj)
+
+
+class HelloView(views.View):
+    allowed_methods = ('get', )
+
+    async def get(self, req, resp, **kwargs):
+        await asyncio.sleep(0)
+        resp.body = json.dumps({'hello': 'world'})
+
+
+class StreamView(views.View):
+    allowed_methods = ('get', )
+
+    def get(self, req, resp, **kwargs):
+        resp.stream = iter([b'one', b'two'])
+
+
+class RecordingMiddleware(object):
+    def __init__(self):
+        self.calls = []
+
+    def process_request(self, req, resp):
+        self.calls.append('request')
+
+    def process_resource(self, req, resp, resource, params):
+        self.calls.append('resource')
+
+    def process_response(self, req, resp, resource, req_succeeded):
+        self.calls.append('response')
+        resp.set_header('X-Recorded', 'yes')
+
+
+class ASGIAppTestCase(TestCase):
+    native = True
+
+    def setUp(self):
+        super().setUp()
+        self.middleware = RecordingMiddleware()
+        self.api = falcon.API(middleware=[self.middleware])
+
+        items = [Item('first'), Item('second')]
+        self.viewset = ItemViewSet()
+        self.viewset.items = items
+        self.async_viewset = AsyncItemViewSet()
+        self.async_viewset.authentication = [AsyncKeyAuthentication()]
+        self.async_viewset.items = items
+
+        self.api.add_route('/items/', self.viewset)
+        self.api.add_route('/items/{name}/', self.viewset)
+        self.api.add_route('/async/{name}/', self.async_viewset)
+        self.api.add_route('/hello/', HelloView())
+        self.api.add_route('/stream/', StreamView())
+
+        self.app = asgi.ASGIApp(self.api, native=self.native)
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        # falcon decides whether to wrap ``wsgi.input`` from the type of the
+        # first one it sees; let the other tests decide from theirs.
+        falcon.Request._wsgi_input_type_known = False
+        super().tearDown()
+
+    def request(self, method, path, query_string=b'', body=b''):
+        scope = {
+            'type': 'http',
+            'method': method,
+            'path': path,
+            'query_string': query_string,
+            'headers': [(b'content-type', b'application/json')],
+        }
+        messages = [{'type': 'http.request', 'body': body}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        self.loop.run_until_complete(self.app(scope, receive, send))
+
+        start = sent.pop(0)
+        self.assertEqual(start['type'], 'http.response.start')
+        headers = dict(start['headers'])
+        self.chunks = [message['body'] for message in sent]
+        return start['status'], headers, b''.join(self.chunks)
+
+    def test_sync_action(self):
+        status, headers, body = self.request('GET', '/items/second/')
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body.decode()), {'name': 'second'})
+        self.assertTrue(
+            headers[b'content-type'].startswith(b'application/json'))
+        self.assertEqual(headers[b'x-recorded'], b'yes')
+        self.assertEqual(
+            self.middleware.calls, ['request', 'resource', 'response'])
+
+    def test_create(self):
+        status, headers, body = self.request(
+            'POST', '/items/', body=b'{"name": "third"}')
+        self.assertEqual(status, 201)
+        self.assertEqual(
+            [i.name for i in self.viewset.items],
+            ['first', 'second', 'third'])
+
+    def test_async_action(self):
+        status, headers, body = self.request(
+            'GET', '/async/first/', b'auth_key=superpassword')
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body.decode()), {'name': 'first'})
+        self.assertEqual(
+            self.async_viewset.authentication[0].calls, int(self.native))
+
+    def test_async_authentication(self):
+        status, headers, body = self.request('GET', '/async/first/')
+        self.assertEqual(status, 401)
+        self.assertEqual(headers[b'www-authenticate'], b'key')
+
+    def test_async_view(self):
+        status, headers, body = self.request('GET', '/hello/')
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body.decode()), {'hello': 'world'})
+
+    def test_stream(self):
+        status, headers, body = self.request('GET', '/stream/')
+        self.assertEqual(status, 200)
+        self.assertEqual(self.chunks, [b'one', b'two', b''])
+
+    def test_errors(self):
+        status, headers, body = self.request('GET', '/items/third/')
+        self.assertEqual(status, 404)
+
+        status, headers, body = self.request('DELETE', '/hello/')
+        self.assertEqual(status, 405)
+
+        status, headers, body = self.request('GET', '/missing/')
+        self.assertEqual(status, 404)
+        self.assertEqual(
+            self.middleware.calls[-3:], ['response', 'request', 'response'])
+
+    def test_lifespan(self):
+        messages = [
+            {'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        self.loop.run_until_complete(
+            self.app({'type': 'lifespan'}, receive, send))
+        self.assertEqual(
+            sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+
+class WSGIFallbackTestCase(ASGIAppTestCase):
+    native = False
+
+    def test_other_falcon_release(self):
+        app = asgi.ASGIApp(self.api)
+        with mock.patch.object(falcon, '__version__', '1.2.0'):
+            self.assertFalse(app.is_native())
+
+
+class RunSyncTestCase(TestCase):
+    def test_run_sync(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+
+        result = loop.run_until_complete(
+            concurrency.run_sync(lambda a, b=0: a + b, 1, b=2))
+        self.assertEqual(result, 3)
+
+    def test_coroutine_handler_under_wsgi(self):
+        api = falcon.API()
+        api.add_route('/hello/', HelloView())
+        result = testing.TestClient(api).simulate_get('/hello/')
+        self.assertEqual(result.json, {'hello': 'world'})
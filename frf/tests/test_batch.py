@@ -0,0 +1,198 @@
+# Copyright 2016 by Teem, and other contributors,
+# as noted in the individual source code files.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# By contributing to this project, you agree to also license your source
+# code under the terms of the Apache License, Version 2.0, as described
+# above.
+
+import json
+import threading
+
+import falcon
+from falcon import testing
+
+from frf import urls, views
+
+
+class EchoView(views.View):
+    def __init__(self, barrier=None):
+        self.barrier = barrier
+        self.items = []
+
+    def get(self, req, resp, **kwargs):
+        if self.barrier is not None:
+            self.barrier.wait()
+        resp.body = json.dumps({
+            'authorization': req.get_header('authorization'),
+            'tags': req.get_header('x-tag'),
+            'page': req.get_param('page'),
+            'items': self.items,
+        })
+
+    def post(self, req, resp, **kwargs):
+        self.items.append(json.loads(req.stream.read().decode('utf-8')))
+        resp.status = falcon.HTTP_201
+
+    def delete(self, req, resp, **kwargs):
+        raise RuntimeError('boom')
+
+
+class CookiesView(views.View):
+    def get(self, req, resp, **kwargs):
+        resp.set_cookie('one', '1')
+        resp.set_cookie('two', '2')
+
+
+class KeyAuthentication(object):
+    def __init__(self):
+        self.calls = 0
+
+    def authenticate(self, req, view):
+        self.calls += 1
+        req.context['auth_thread'] = threading.get_ident()
+        if req.get_header('authorization') == 'Key secret':
+            return 'alice'
+
+    def __str__(self):
+        return 'key'
+
+
+class UserView(views.View):
+    def __init__(self):
+        self.authentication = [KeyAuthentication()]
+
+    def get(self, req, resp, **kwargs):
+        resp.body = json.dumps({'user': req.context['user']})
+        if req.context['auth_thread'] != threading.get_ident():
+            raise RuntimeError('authenticated in another thread')
+
+
+class BatchTestCase(testing.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.api = falcon.API()
+        self.echo = EchoView()
+        self.api.add_route('/echo/', self.echo)
+        self.api.add_route('/cookies/', CookiesView())
+        self.user_view = UserView()
+        self.api.add_route('/user/', self.user_view)
+        self.api.add_route(
+            '/together/', EchoView(threading.Barrier(2, timeout=5)))
+        self.api.add_route(*urls.batch('/batch/', api=self.api))
+
+    def batch(self, requests, **kwargs):
+        return self.simulate_post(
+            '/batch/', body=json.dumps(requests), **kwargs)
+
+    def test_batch(self):
+        res = self.batch([
+            {'path': '/echo/?page=2'},
+            {'method': 'POST', 'path': '/echo/', 'body': {'name': 'one'}},
+            {'path': '/echo/', 'query_string': 'page=3'},
+            {'path': '/missing/'},
+        ])
+        self.assertEqual(res.status_code, 200)
+
+        responses = res.json
+        self.assertEqual(
+            [r['status'] for r in responses], [200, 201, 200, 404])
+        self.assertEqual(responses[0]['body']['page'], '2')
+        self.assertEqual(responses[0]['body']['items'], [])
+        self.assertEqual(responses[2]['body']['page'], '3')
+        self.assertEqual(responses[2]['body']['items'], [{'name': 'one'}])
+
+    def test_concurrent_gets(self):
+        res = self.batch([{'path': '/together/'}, {'path': '/together/'}])
+        self.assertEqual([r['status'] for r in res.json], [200, 200])
+
+    def test_headers(self):
+        res = self.batch([
+            {'path': '/echo/'},
+            {'path': '/echo/', 'headers': {'Authorization': 'Token other'}},
+            {'path': '/echo/', 'headers': [
+                ['X-Tag', 'one'], ['X-Tag', 'two']]},
+        ], headers={'Authorization': 'Token outer'})
+
+        # requests without their own authorization inherit the batch one
+        self.assertEqual(
+            [r['body']['authorization'] for r in res.json],
+            ['Token outer', 'Token other', 'Token outer'])
+        self.assertEqual(res.json[2]['body']['tags'], 'one,two')
+
+        res = self.batch(
+            [{'path': '/echo/', 'headers': {'X-Tag': 'inner'}}],
+            headers={'X-Tag': 'outer'})
+        self.assertEqual(res.json[0]['body']['tags'], 'inner')
+
+    def test_repeated_response_headers(self):
+        res = self.batch([{'path': '/cookies/'}])
+
+        cookies = [value for name, value in res.json[0]['headers']
+                   if name == 'set-cookie']
+        self.assertEqual(len(cookies), 2)
+        self.assertTrue(cookies[0].startswith('one=1;'))
+        self.assertTrue(cookies[1].startswith('two=2;'))
+
+    def test_authentication(self):
+        auth = KeyAuthentication()
+        user_auth = self.user_view.authentication[0]
+        self.api.add_route(*urls.batch(
+            '/authenticated/batch/', api=self.api, authentication=[auth]))
+
+        res = self.simulate_post(
+            '/authenticated/batch/', body=json.dumps([{'path': '/user/'}]))
+        self.assertEqual(res.status_code, 401)
+
+        res = self.simulate_post(
+            '/authenticated/batch/',
+            body=json.dumps([{'path': '/user/'}, {'path': '/user/'}]),
+            headers={'Authorization': 'Key secret'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            [r['body'] for r in res.json], [{'user': 'alice'}] * 2)
+        # each request of the batch was authenticated by its view
+        self.assertEqual(auth.calls, 2)
+        self.assertEqual(user_auth.calls, 2)
+
+        res = self.batch([
+            {'path': '/user/'},
+            {'path': '/user/', 'headers': {'Authorization': 'Key wrong'}},
+        ], headers={'Authorization': 'Key secret'})
+        self.assertEqual([r['status'] for r in res.json], [200, 401])
+        self.assertEqual(res.json[0]['body'], {'user': 'alice'})
+
+    def test_failing_request(self):
+        res = self.batch([
+            {'method': 'DELETE', 'path': '/echo/'}, {'path': '/echo/'}])
+        self.assertEqual([r['status'] for r in res.json], [500, 200])
+
+    def test_invalid_batches(self):
+        res = self.simulate_post('/batch/', body='not json')
+        self.assertEqual(res.status_code, 400)
+
+        res = self.batch({'path': '/echo/'})
+        self.assertEqual(res.status_code, 400)
+
+        res = self.batch([{'path': '/echo/', 'headers': [['X-Tag']]}])
+        self.assertEqual(res.status_code, 400)
+
+        res = self.batch([{'path': '/echo/'}] * 26)
+        self.assertEqual(res.status_code, 400)
+
+        res = self.batch([{'method': 'POST', 'path': '/batch/', 'body': []}])
+        self.assertEqual(res.json[0]['status'], 400)
+
+        res = self.simulate_get('/batch/')
+        self.assertEqual(res.status_code, 405)
@@ -18,12 +18,25 @@
 # above.
 
 import datetime
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
 import unittest
 
+import falcon
+from falcon import testing
 import mock
 import pytz
 
 from frf import cache
+from frf.cache import codecs, exceptions
+from frf.cache.engines import instrumented
+from frf.cache.engines.dummy import DummyCacheEngine
+from frf.cache.engines.locmem import LocMemCacheEngine
+from frf.decorators import simpleview
 
 
 class DummyCacheEngineTestCase(unittest.TestCase):
@@ -81,6 +94,1070 @@ class DummyCacheEngineTestCase(unittest.TestCase):
         self.assertEqual(len(cache._cache_engine.items), 0)
 
 
+class LocMemCacheEngineTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        cache.init({
+            'engine': 'frf.cache.engines.locmem.LocMemCacheEngine',
+            'max_entries': 3,
+            })
+
+    def test_cache_get_set(self):
+        cache.set('testing', 'onetwothree')
+
+        self.assertEqual(cache.get('testing'), 'onetwothree')
+
+    def test_cache_get_default(self):
+        self.assertEqual('bwent', cache.get('woot', 'bwent'))
+
+    @mock.patch('time.monotonic')
+    def test_cache_set_timeout(self, monotonic_mock):
+        monotonic_mock.return_value = 100
+
+        cache.set('test', 'value', timeout=30)
+
+        monotonic_mock.return_value = 129
+        self.assertEqual(cache.get('test'), 'value')
+
+        monotonic_mock.return_value = 131
+        self.assertIsNone(cache.get('test'))
+
+    def test_cache_evicts_least_recently_used(self):
+        for i in range(3):
+            cache.set(str(i), str(i))
+
+        # touch the oldest item so that "1" becomes the least recently used
+        cache.get('0')
+        cache.set('3', '3')
+
+        self.assertEqual(cache.get('0'), '0')
+        self.assertIsNone(cache.get('1'))
+        self.assertEqual(cache.get('3'), '3')
+        self.assertEqual(len(cache.get_engine().items), 3)
+
+    @mock.patch('time.monotonic')
+    def test_cache_incr(self, monotonic_mock):
+        engine = cache.get_engine()
+        monotonic_mock.return_value = 100
+
+        self.assertEqual(engine.incr('test'), 1)
+        self.assertEqual(engine.incr('test', 2), 3)
+
+        cache.set('other', 5, timeout=30)
+        self.assertEqual(engine.incr('other'), 6)
+        self.assertEqual(engine.get_many_with_ttl(['other', 'test']), {
+            'other': (6, 30), 'test': (3, None)})
+
+        monotonic_mock.return_value = 131
+        self.assertIsNone(cache.get('other'))
+
+    def test_cache_clear(self):
+        for i in range(3):
+            cache.set(str(i), str(i))
+
+        cache.clear()
+
+        self.assertEqual(len(cache.get_engine().items), 0)
+
+
+class TieredCacheEngineTestCase(unittest.TestCase):
+    config = {
+        'engine': 'frf.cache.engines.tiered.TieredCacheEngine',
+        'local_timeout': 5,
+        'version_check_interval': 1000,
+        'backend': {
+            'engine': 'frf.cache.engines.dummy.DummyCacheEngine',
+            },
+        }
+
+    def setUp(self):
+        super().setUp()
+
+        monotonic_patcher = mock.patch('time.monotonic', return_value=100)
+        self.monotonic_mock = monotonic_patcher.start()
+        self.addCleanup(monotonic_patcher.stop)
+
+        # two workers sharing the same backend
+        self.worker1 = cache.create_engine(self.config)
+        self.worker2 = cache.create_engine(self.config)
+        self.worker2.backend = self.worker1.backend
+
+    def test_init_from_settings(self):
+        self.assertIsInstance(self.worker1.backend, DummyCacheEngine)
+        self.assertIsInstance(self.worker1.local, LocMemCacheEngine)
+        self.assertEqual(self.worker1.backend.default_timeout, 30)
+
+    def test_get_set(self):
+        self.worker1.set('test', 'value')
+
+        self.assertEqual(self.worker1.get('test'), 'value')
+        self.assertEqual(self.worker2.get('test'), 'value')
+
+    def test_get_default(self):
+        self.assertEqual(self.worker1.get('test', 'default'), 'default')
+
+    def test_get_served_from_local(self):
+        self.worker1.set('test', 'value')
+
+        with mock.patch.object(self.worker1.backend, 'get_many_with_ttl') \
+                as get_mock:
+            self.assertEqual(self.worker1.get('test'), 'value')
+            self.assertFalse(get_mock.called)
+
+    def test_missing_xfetch_served_from_local(self):
+        self.worker1.get_or_set('test', lambda: 'value', timeout=0)
+        self.assertEqual(
+            self.worker2.get_or_set('test', lambda: 'other'), 'value')
+
+        with mock.patch.object(
+                self.worker2.backend, 'get_many_with_ttl') as get_mock:
+            self.assertEqual(
+                self.worker2.get_or_set('test', lambda: 'other'), 'value')
+            self.assertFalse(get_mock.called)
+
+    def test_missing_tags_invalidated(self):
+        self.worker1.tagged_set('test', 'one')
+        self.assertEqual(self.worker2.tagged_get('test'), 'one')
+
+        self.worker1.tagged_set('test', 'two', tags=['tag'])
+        self.worker1.invalidate_tags(['tag'])
+
+        self.monotonic_mock.return_value = 101.5
+        self.assertIsNone(self.worker2.tagged_get('test'))
+
+    def test_get_fills_local(self):
+        self.worker1.set('test', 'value')
+        self.worker2.get('test')
+
+        self.assertEqual(self.worker2.local.get('test'), 'value')
+
+    def test_local_timeout(self):
+        self.worker1.set('test', 'value', timeout=30)
+
+        self.worker1.backend.delete('test')
+        self.assertEqual(self.worker1.get('test'), 'value')
+
+        self.monotonic_mock.return_value = 106
+        self.assertIsNone(self.worker1.get('test'))
+
+    def test_invalidation_from_other_worker(self):
+        self.worker1.set('test', 'one')
+        self.assertEqual(self.worker2.get('test'), 'one')
+
+        self.worker1.set('test', 'two')
+
+        # worker2 does not check the invalidation log again before the
+        # interval is over
+        self.monotonic_mock.return_value = 100.5
+        self.assertEqual(self.worker2.get('test'), 'one')
+
+        self.monotonic_mock.return_value = 101.5
+        self.assertEqual(self.worker2.get('test'), 'two')
+
+    def test_invalidation_keeps_other_keys(self):
+        self.worker1.set('one', '1')
+        self.worker1.set('two', '2')
+        self.assertEqual(self.worker2.get_many(['one', 'two']),
+                         {'one': '1', 'two': '2'})
+
+        self.worker1.set('one', '3')
+        self.monotonic_mock.return_value = 101.5
+        self.assertEqual(self.worker2.get('one'), '3')
+
+        with mock.patch.object(self.worker2.backend, 'get_many_with_ttl') \
+                as get_mock:
+            self.assertEqual(self.worker2.get('two'), '2')
+            self.assertFalse(get_mock.called)
+
+    def test_writes_keep_own_local(self):
+        self.worker1.set('test', 'value')
+        self.worker1.set('other', 'value')
+
+        self.monotonic_mock.return_value = 101.5
+        self.assertEqual(self.worker1.local.get('test'), 'value')
+        self.worker1.get('other')
+        self.assertEqual(self.worker1.local.get('test'), 'value')
+
+    def test_expired_log(self):
+        self.worker1.set('test', 'one')
+        self.assertEqual(self.worker2.get('test'), 'one')
+
+        self.worker1.set('test', 'two')
+        self.worker1.set('other', 'two')
+        self.worker1.backend.delete('__frf_tiered_log:2')
+
+        # the entry could still be written by a slow worker
+        self.monotonic_mock.return_value = 101.5
+        self.assertEqual(self.worker2.get('test'), 'one')
+        self.assertEqual(self.worker2.position, 1)
+
+        self.monotonic_mock.return_value = 102.5
+        self.assertEqual(self.worker2.get('other'), 'two')
+        self.assertIsNone(self.worker2.local.get('test'))
+        self.assertEqual(self.worker2.position, 3)
+
+    def test_log_entry_written_late(self):
+        self.worker1.set('test', 'one')
+        self.worker1.set('other', 'one')
+        self.assertEqual(self.worker2.get('test'), 'one')
+        self.assertEqual(self.worker2.get('other'), 'one')
+
+        # a write numbered its entry, but has not stored it yet
+        self.worker1.backend.set('test', 'two')
+        number = self.worker1.backend.incr('__frf_tiered_log:head')
+
+        self.monotonic_mock.return_value = 101.5
+        self.assertEqual(self.worker2.get('test'), 'one')
+
+        self.worker1.backend.set(
+            '__frf_tiered_log:{}'.format(number),
+            '{} test'.format(self.worker1.worker_id))
+
+        self.monotonic_mock.return_value = 102.5
+        self.assertEqual(self.worker2.get('test'), 'two')
+        with mock.patch.object(self.worker2.backend, 'get_many_with_ttl') \
+                as get_mock:
+            self.assertEqual(self.worker2.get('other'), 'one')
+            self.assertFalse(get_mock.called)
+
+    def test_log_numbers_never_reused(self):
+        self.worker1.set('one', '1')
+        self.worker2.set('two', '2')
+        self.worker1.set('three', '3')
+
+        backend = self.worker1.backend
+        self.assertEqual(backend.get('__frf_tiered_log:head'), 3)
+        self.assertEqual(
+            [backend.get('__frf_tiered_log:{}'.format(n)).split()[1]
+             for n in range(1, 4)],
+            ['one', 'two', 'three'])
+
+    def test_local_capped_at_backend_ttl(self):
+        self.worker1.backend.set('test', 'value', 2)
+        self.assertEqual(self.worker2.get('test'), 'value')
+
+        self.monotonic_mock.return_value = 101.5
+        self.assertEqual(self.worker2.local.get('test'), 'value')
+
+        self.monotonic_mock.return_value = 102.5
+        self.assertIsNone(self.worker2.local.get('test'))
+
+    def test_delete(self):
+        self.worker1.set('test', 'one')
+        self.assertEqual(self.worker2.get('test'), 'one')
+
+        self.worker1.delete('test')
+
+        self.assertIsNone(self.worker1.get('test'))
+        self.monotonic_mock.return_value = 101.5
+        self.assertIsNone(self.worker2.get('test'))
+
+    def test_clear(self):
+        for i in range(3):
+            self.worker1.set(str(i), str(i))
+            self.worker2.get(str(i))
+
+        self.worker1.clear()
+        self.monotonic_mock.return_value = 101.5
+
+        for i in range(3):
+            self.assertIsNone(self.worker1.get(str(i)))
+            self.assertIsNone(self.worker2.get(str(i)))
+
+
+class GetOrSetTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        cache.init({'engine': 'frf.cache.engines.locmem.LocMemCacheEngine'})
+        self.calls = 0
+
+    def producer(self, value='value', delay=0):
+        def produce():
+            self.calls += 1
+            if delay:
+                time.sleep(delay)
+            return value
+        return produce
+
+    def test_get_or_set(self):
+        self.assertEqual(cache.get_or_set('test', self.producer()), 'value')
+        self.assertEqual(cache.get_or_set('test', self.producer()), 'value')
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(cache.get('test'), 'value')
+
+    def test_get_or_set_existing_value(self):
+        cache.set('test', 'existing')
+
+        self.assertEqual(
+            cache.get_or_set('test', self.producer()), 'existing')
+        self.assertEqual(self.calls, 0)
+
+    def test_get_or_set_single_flight_threads(self):
+        results = []
+
+        def worker():
+            results.append(
+                cache.get_or_set('test', self.producer(delay=0.1)))
+
+        threads = [threading.Thread(target=worker) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ['value'] * 5)
+
+    def test_get_or_set_waits_for_other_process(self):
+        # another process holds the lock, and stores the value shortly after
+        cache.get_engine().add('test:__lock', 'other', 10)
+        timer = threading.Timer(0.1, cache.set, ('test', 'from other'))
+        timer.start()
+
+        self.assertEqual(
+            cache.get_or_set('test', self.producer()), 'from other')
+        self.assertEqual(self.calls, 0)
+        timer.join()
+
+    def test_get_or_set_lock_timeout(self):
+        cache.get_engine().add('test:__lock', 'other', 10)
+
+        self.assertEqual(cache.get_or_set(
+            'test', self.producer(), lock_timeout=0.1), 'value')
+        self.assertEqual(self.calls, 1)
+        # the lock held by the other process is left alone
+        self.assertEqual(cache.get('test:__lock'), 'other')
+
+    def test_get_or_set_releases_lock(self):
+        cache.get_or_set('test', self.producer())
+
+        self.assertIsNone(cache.get('test:__lock'))
+
+    @mock.patch('random.random', return_value=0.0)
+    def test_get_or_set_not_refreshed_early(self, random_mock):
+        cache.get_or_set('test', self.producer(), timeout=30)
+        cache.get_or_set('test', self.producer(), timeout=30)
+
+        self.assertEqual(self.calls, 1)
+
+    @mock.patch('random.random', return_value=1 - 1e-12)
+    def test_get_or_set_refreshed_early(self, random_mock):
+        # a value that took a while to compute, and expires soon
+        cache.get_or_set('test', self.producer('one', delay=0.05), timeout=1)
+
+        self.assertEqual(
+            cache.get_or_set('test', self.producer('two'), timeout=1), 'two')
+        self.assertEqual(self.calls, 2)
+
+    @mock.patch('random.random', return_value=1 - 1e-12)
+    def test_get_or_set_early_refresh_in_progress(self, random_mock):
+        cache.get_or_set('test', self.producer('one', delay=0.05), timeout=1)
+        cache.get_engine().add('test:__lock', 'other', 10)
+
+        # someone else is already refreshing the value, so the current value
+        # is returned right away.
+        self.assertEqual(
+            cache.get_or_set('test', self.producer('two'), timeout=1), 'one')
+        self.assertEqual(self.calls, 1)
+
+    def test_get_or_set_beta_zero(self):
+        with mock.patch('random.random', return_value=1 - 1e-12):
+            cache.get_or_set(
+                'test', self.producer('one', delay=0.05), timeout=1)
+            cache.get_or_set(
+                'test', self.producer('two'), timeout=1, beta=0)
+
+        self.assertEqual(self.calls, 1)
+
+
+class CodecTestCase(unittest.TestCase):
+    value = {'name': 'test', 'items': list(range(10))}
+
+    def test_get_codec_none(self):
+        self.assertIsNone(codecs.get_codec(None))
+
+    def test_get_codec_by_path(self):
+        codec = codecs.get_codec('frf.cache.codecs.JSONCodec')
+
+        self.assertIsInstance(codec, codecs.JSONCodec)
+
+    def test_string_codec(self):
+        codec = codecs.get_codec('string')
+
+        self.assertEqual(codec.encode('tést'), 'tést'.encode('utf8'))
+        self.assertEqual(codec.decode(codec.encode('tést')), 'tést')
+        self.assertEqual(codec.decode(codec.encode(1)), '1')
+
+    def test_json_codec(self):
+        codec = codecs.get_codec('json')
+
+        self.assertIsInstance(codec.encode(self.value), bytes)
+        self.assertEqual(codec.decode(codec.encode(self.value)), self.value)
+
+    def test_pickle_codec(self):
+        codec = codecs.get_codec('pickle')
+        value = {'when': datetime.datetime(2016, 10, 5, 10, 10, 10)}
+
+        self.assertEqual(codec.decode(codec.encode(value)), value)
+
+    def test_msgpack_codec(self):
+        try:
+            import msgpack  # noqa
+        except ImportError:
+            with self.assertRaises(exceptions.CacheInvalidEngine):
+                codecs.get_codec('msgpack')
+        else:
+            codec = codecs.get_codec('msgpack')
+            self.assertEqual(
+                codec.decode(codec.encode(self.value)), self.value)
+
+    def test_compression(self):
+        codec = codecs.get_codec('json', compress_threshold=100)
+        large = {'items': ['same value'] * 100}
+
+        small_data = codec.encode(self.value)
+        large_data = codec.encode(large)
+
+        self.assertEqual(small_data[:1], codecs.CompressedCodec.RAW)
+        self.assertEqual(large_data[:1], codecs.CompressedCodec.ZLIB)
+        self.assertLess(
+            len(large_data), len(codecs.JSONCodec().encode(large)))
+
+        self.assertEqual(codec.decode(small_data), self.value)
+        self.assertEqual(codec.decode(large_data), large)
+
+    def test_compression_defaults_to_pickle(self):
+        codec = codecs.get_codec(None, compress_threshold=0)
+
+        self.assertIsInstance(codec.codec, codecs.PickleCodec)
+
+    def test_engine_codec(self):
+        cache.init({
+            'engine': 'frf.cache.engines.locmem.LocMemCacheEngine',
+            'codec': 'json',
+            'compress_threshold': 100,
+            })
+
+        cache.set('test', self.value)
+        value = cache.get('test')
+        value['name'] = 'changed'
+
+        self.assertIsInstance(cache.get_engine().items['test'][0], bytes)
+        self.assertEqual(cache.get('test'), self.value)
+
+
+class CachedTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        cache.init({'engine': 'frf.cache.engines.locmem.LocMemCacheEngine'})
+        self.calls = []
+
+        @cache.cached(timeout=30)
+        def add(a, b):
+            self.calls.append((a, b))
+            return a + b
+
+        @simpleview()
+        @cache.cached(timeout=30, params=('page', ))
+        def hello(req, resp):
+            self.calls.append(req.params)
+            resp.body = 'hello {}'.format(len(self.calls))
+            if req.get_param('fail'):
+                resp.status = falcon.HTTP_400
+
+        self.add = add
+        self.api = falcon.API()
+        self.api.add_route('/hello/', hello)
+        self.client = testing.TestClient(self.api)
+
+    def test_function(self):
+        self.assertEqual(self.add(1, 2), 3)
+        self.assertEqual(self.add(1, 2), 3)
+        self.assertEqual(self.add(1, b=2), 3)
+        self.assertEqual(self.calls, [(1, 2), (1, 2)])
+
+    def test_method(self):
+        class Calculator(object):
+            def __init__(self):
+                self.calls = 0
+
+            @cache.cached()
+            def double(self, a):
+                self.calls += 1
+                return a * 2
+
+        first, second = Calculator(), Calculator()
+        self.assertEqual(first.double(2), 4)
+        self.assertEqual(second.double(2), 4)
+        self.assertEqual(first.calls + second.calls, 1)
+
+    def test_controls(self):
+        self.add(1, 2)
+        self.assertEqual(self.add.bypass(1, 2), 3)
+        self.assertEqual(self.add.refresh(1, 2), 3)
+        self.assertEqual(len(self.calls), 3)
+
+        self.add.invalidate(1, 2)
+        self.assertIsNone(cache.get(self.add.make_key(1, 2)))
+        self.add(1, 2)
+        self.assertEqual(len(self.calls), 4)
+
+    def test_key(self):
+        @cache.cached(key=lambda a: 'square:{}'.format(a))
+        def square(a):
+            return a * a
+
+        square(3)
+        self.assertEqual(cache.get('square:3'), 9)
+
+        @cache.cached(key='cube')
+        def cube(a):
+            return a ** 3
+
+        self.assertTrue(cube.make_key(3).startswith('cube:'))
+
+    def test_view(self):
+        self.assertEqual(self.client.simulate_get('/hello/').text, 'hello 1')
+        self.assertEqual(self.client.simulate_get('/hello/').text, 'hello 1')
+        self.assertEqual(self.client.simulate_get(
+            '/hello/', query_string='other=1').text, 'hello 1')
+        self.assertEqual(self.client.simulate_get(
+            '/hello/', query_string='page=2').text, 'hello 2')
+
+    def test_view_error_not_cached(self):
+        self.client.simulate_get('/hello/', query_string='page=2&fail=1')
+        self.client.simulate_get('/hello/', query_string='page=2&fail=1')
+
+        self.assertEqual(len(self.calls), 2)
+
+
+class SQLiteCacheEngineTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.config = {
+            'engine': 'frf.cache.engines.sqlite.SQLiteCacheEngine',
+            'path': os.path.join(self.directory, 'cache.sqlite'),
+            'max_entries': 10,
+            'cull_ratio': 0.5,
+            'cull_every': 1,
+            'touch_interval': 0,
+            }
+
+        cache.init(self.config)
+
+    def test_cache_get_set(self):
+        cache.set('testing', {'one': [1, 2, 3]})
+
+        self.assertEqual(cache.get('testing'), {'one': [1, 2, 3]})
+
+    def test_cache_get_default(self):
+        self.assertEqual('bwent', cache.get('woot', 'bwent'))
+
+    def test_cache_shared_between_engines(self):
+        other = cache.create_engine(self.config)
+
+        cache.set('test', 'value')
+
+        self.assertEqual(other.get('test'), 'value')
+        other.delete('test')
+        self.assertIsNone(cache.get('test'))
+
+    @mock.patch('time.time')
+    def test_cache_set_timeout(self, time_mock):
+        time_mock.return_value = 1000
+
+        cache.set('test', 'value', timeout=30)
+
+        time_mock.return_value = 1029
+        self.assertEqual(cache.get('test'), 'value')
+
+        time_mock.return_value = 1031
+        self.assertIsNone(cache.get('test'))
+
+    def test_cache_add(self):
+        engine = cache.get_engine()
+
+        self.assertTrue(engine.add('test', 'one'))
+        self.assertFalse(engine.add('test', 'two'))
+        self.assertEqual(cache.get('test'), 'one')
+
+    @mock.patch('time.time')
+    def test_cache_add_expired(self, time_mock):
+        engine = cache.get_engine()
+        time_mock.return_value = 1000
+
+        engine.add('test', 'one', 30)
+        time_mock.return_value = 1031
+
+        self.assertTrue(engine.add('test', 'two'))
+        self.assertEqual(cache.get('test'), 'two')
+
+    @mock.patch('time.time')
+    def test_cache_incr(self, time_mock):
+        engine = cache.get_engine()
+        other = cache.create_engine(self.config)
+        time_mock.return_value = 1000
+
+        self.assertEqual(engine.incr('test'), 1)
+        self.assertEqual(other.incr('test', 2), 3)
+        self.assertEqual(cache.get('test'), 3)
+
+        cache.set('expiring', 5, timeout=30)
+        self.assertEqual(engine.incr('expiring'), 6)
+        self.assertEqual(engine.get_many_with_ttl(['expiring', 'test']), {
+            'expiring': (6, 30), 'test': (3, None)})
+
+        time_mock.return_value = 1031
+        self.assertEqual(engine.incr('expiring'), 1)
+
+    @mock.patch('time.time')
+    def test_cache_evicts_least_recently_used(self, time_mock):
+        for i in range(10):
+            time_mock.return_value = 1000 + i
+            cache.set(str(i), i)
+
+        # "0" is the oldest, but has just been used
+        time_mock.return_value = 1010
+        cache.get('0')
+
+        time_mock.return_value = 1011
+        cache.set('10', 10)
+
+        engine = cache.get_engine()
+        count = engine.get_connection().execute(
+            'SELECT COUNT(*) FROM cache').fetchone()[0]
+
+        self.assertEqual(count, 5)
+        self.assertEqual(cache.get('0'), 0)
+        self.assertEqual(cache.get('10'), 10)
+        self.assertIsNone(cache.get('1'))
+
+    def test_cache_clear(self):
+        for i in range(3):
+            cache.set(str(i), str(i))
+
+        cache.clear()
+
+        for i in range(3):
+            self.assertIsNone(cache.get(str(i)))
+
+    def test_get_or_set(self):
+        self.assertEqual(cache.get_or_set('test', lambda: 'value'), 'value')
+        self.assertEqual(cache.get_or_set('test', lambda: 'other'), 'value')
+
+
+class TagsTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        cache.init({'engine': 'frf.cache.engines.locmem.LocMemCacheEngine'})
+
+    def test_set_tags(self):
+        cache.set('test', 'value', tags=['one', 'two'])
+
+        self.assertEqual(cache.get('test'), 'value')
+
+    def test_invalidate_tags(self):
+        cache.set('test1', 'value', tags=['one', 'two'])
+        cache.set('test2', 'value', tags=['two'])
+        cache.set('test3', 'value', tags=['three'])
+        cache.set('test4', 'value')
+
+        cache.invalidate_tags(['two'])
+
+        self.assertIsNone(cache.get('test1'))
+        self.assertIsNone(cache.get('test2'))
+        self.assertEqual(cache.get('test3'), 'value')
+        self.assertEqual(cache.get('test4'), 'value')
+
+    def test_set_after_invalidation(self):
+        cache.set('test', 'one', tags=['tag'])
+        cache.invalidate_tags(['tag'])
+        cache.set('test', 'two', tags=['tag'])
+
+        self.assertEqual(cache.get('test'), 'two')
+
+    def test_set_without_tags(self):
+        cache.set('test', 'one', tags=['tag'])
+        cache.set('test', 'two')
+        cache.invalidate_tags(['tag'])
+
+        self.assertEqual(cache.get('test'), 'two')
+
+    def test_set_without_tags_single_write(self):
+        engine = cache.get_engine()
+        cache.set('test', 'one', tags=['tag'])
+
+        with mock.patch.object(engine, 'delete') as delete_mock:
+            cache.set('test', 'two')
+            self.assertFalse(delete_mock.called)
+
+    def test_tags_stored_with_value(self):
+        engine = cache.create_engine({
+            'engine': 'frf.cache.engines.dummy.DummyCacheEngine',
+            'codec': 'json',
+            })
+
+        engine.tagged_set('test', {'one': 1}, tags=['tag'])
+        self.assertEqual(list(engine.items), ['__frf_tag:tag', 'test'])
+        self.assertEqual(engine.tagged_get('test'), {'one': 1})
+
+        engine.invalidate_tags(['tag'])
+        self.assertIsNone(engine.tagged_get('test'))
+
+        engine.tagged_set('test', {'two': 2})
+        self.assertEqual(engine.tagged_get('test'), {'two': 2})
+
+    def test_invalidate_evicted_tag(self):
+        cache.set('test', 'value', tags=['tag'])
+
+        # losing the generation of a tag must not resurrect stale values
+        cache.get_engine().delete('__frf_tag:tag')
+
+        self.assertIsNone(cache.get('test'))
+
+    def test_get_or_set_tags(self):
+        self.assertEqual(
+            cache.get_or_set('test', lambda: 'one', tags=['tag']), 'one')
+
+        cache.invalidate_tags(['tag'])
+
+        self.assertEqual(
+            cache.get_or_set('test', lambda: 'two', tags=['tag']), 'two')
+
+    def test_namespace(self):
+        company1 = cache.namespace('company:1')
+        company2 = cache.namespace('company:2')
+
+        company1.set('calendars', 'one')
+        company2.set('calendars', 'two')
+
+        self.assertEqual(company1.get('calendars'), 'one')
+        self.assertEqual(company2.get('calendars'), 'two')
+        self.assertIsNone(cache.get('calendars'))
+
+        company1.clear()
+
+        self.assertIsNone(company1.get('calendars'))
+        self.assertEqual(company2.get('calendars'), 'two')
+
+    def test_namespace_get_or_set(self):
+        company = cache.namespace('company:1')
+
+        self.assertEqual(company.get_or_set('rooms', lambda: 'one'), 'one')
+        company.clear()
+        self.assertEqual(company.get_or_set('rooms', lambda: 'two'), 'two')
+
+    def test_namespace_delete(self):
+        company = cache.namespace('company:1')
+        company.set('rooms', 'one')
+
+        company.delete('rooms')
+
+        self.assertIsNone(company.get('rooms'))
+
+
+class FaultyCacheEngine(DummyCacheEngine):
+    """Dummy engine that fails or hangs on demand."""
+    fail = False
+    delay = 0
+
+    def maybe_fail(self):
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError('Connection refused')
+
+    def get(self, key, default=None):
+        self.maybe_fail()
+        return super().get(key, default)
+
+    def set(self, key, value, timeout=None):
+        self.maybe_fail()
+        super().set(key, value, timeout)
+
+    def add(self, key, value, timeout=None):
+        self.maybe_fail()
+        return super().add(key, value, timeout)
+
+    def delete(self, key):
+        self.maybe_fail()
+        super().delete(key)
+
+
+class ResilientCacheEngineTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        monotonic_patcher = mock.patch('time.monotonic', return_value=100)
+        self.monotonic_mock = monotonic_patcher.start()
+        self.addCleanup(monotonic_patcher.stop)
+
+        cache.init({
+            'engine': 'frf.cache.engines.resilient.ResilientCacheEngine',
+            'operation_timeout': 50,
+            'failure_threshold': 3,
+            'reset_timeout': 30,
+            'backend': {
+                'engine': 'frf.tests.test_cache.FaultyCacheEngine',
+                },
+            })
+        self.engine = cache.get_engine()
+        self.backend = self.engine.backend
+
+    def test_get_set(self):
+        cache.set('test', 'value')
+
+        self.assertEqual(cache.get('test'), 'value')
+        self.assertEqual(self.engine.get_stats()['state'], 'closed')
+
+    def test_failure_is_a_miss(self):
+        cache.set('test', 'value')
+        self.backend.fail = True
+
+        self.assertEqual(cache.get('test', 'default'), 'default')
+        # writes are dropped without raising
+        cache.set('test', 'other')
+        cache.delete('test')
+
+        self.assertEqual(self.engine.get_stats()['failures'], 3)
+
+    def test_failed_add(self):
+        self.backend.fail = True
+
+        self.assertFalse(self.engine.add('test', 'value'))
+
+    def test_failed_tags_not_stored(self):
+        with mock.patch.object(self.backend, 'add', return_value=False):
+            cache.set('test', 'value', tags=['tag'])
+
+        self.assertIsNone(self.backend.get('test'))
+
+    def test_deletes_replayed(self):
+        cache.set('one', '1')
+        cache.set('two', '2', tags=['tag'])
+        self.backend.fail = True
+
+        cache.delete('one')
+        cache.invalidate_tags(['tag'])
+        self.assertEqual(self.engine.get_stats()['pending'], 2)
+
+        self.backend.fail = False
+        self.monotonic_mock.return_value = 131
+        cache.get('other')
+
+        self.assertIsNone(self.backend.get('one'))
+        self.assertIsNone(cache.get('two'))
+        self.assertEqual(self.engine.get_stats()['pending'], 0)
+
+    def test_failed_set_deletes_previous_value(self):
+        cache.set('test', 'one')
+        self.backend.fail = True
+
+        cache.set('test', 'two')
+
+        self.backend.fail = False
+        self.monotonic_mock.return_value = 131
+        self.assertIsNone(cache.get('test'))
+
+    def test_pending_limit(self):
+        self.engine.max_pending = 1
+        self.backend.fail = True
+
+        with self.assertLogs('frf.cache.engines.resilient', 'ERROR'):
+            cache.delete('one')
+            cache.delete('two')
+
+        stats = self.engine.get_stats()
+        self.assertEqual(stats['pending'], 1)
+        self.assertEqual(stats['lost_invalidations'], 1)
+
+    def test_timeout_is_a_miss(self):
+        cache.set('test', 'value')
+        self.backend.delay = 0.2
+
+        start = time.time()
+        self.assertIsNone(self.engine.get('test'))
+        self.assertLess(time.time() - start, 0.2)
+
+        stats = self.engine.get_stats()
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertEqual(stats['failures'], 1)
+
+    def test_circuit_opens(self):
+        self.backend.fail = True
+        for i in range(3):
+            self.engine.get('test')
+
+        self.assertEqual(self.engine.get_stats()['state'], 'open')
+
+        with mock.patch.object(self.backend, 'get') as get_mock:
+            self.assertIsNone(self.engine.get('test'))
+            self.assertFalse(get_mock.called)
+
+        stats = self.engine.get_stats()
+        self.assertEqual(stats['opened'], 1)
+        self.assertEqual(stats['short_circuits'], 1)
+
+    def test_success_resets_failures(self):
+        self.backend.fail = True
+        self.engine.get('test')
+        self.engine.get('test')
+        self.backend.fail = False
+        self.engine.get('test')
+        self.backend.fail = True
+        self.engine.get('test')
+
+        self.assertEqual(self.engine.get_stats()['state'], 'closed')
+
+    def test_half_open_probe_closes(self):
+        self.backend.fail = True
+        for i in range(3):
+            self.engine.get('test')
+
+        self.backend.fail = False
+        self.backend.set('test', 'value')
+        self.monotonic_mock.return_value = 131
+
+        self.assertEqual(self.engine.get('test'), 'value')
+        self.assertEqual(self.engine.get_stats()['state'], 'closed')
+
+    def test_half_open_probe_fails(self):
+        self.backend.fail = True
+        for i in range(3):
+            self.engine.get('test')
+
+        self.monotonic_mock.return_value = 131
+        self.engine.get('test')
+
+        stats = self.engine.get_stats()
+        self.assertEqual(stats['state'], 'open')
+        self.assertEqual(stats['opened'], 2)
+
+    def test_get_or_set_while_failing(self):
+        self.backend.fail = True
+
+        start = time.time()
+        self.assertEqual(
+            cache.get_or_set('test', lambda: 'value'), 'value')
+        self.assertLess(time.time() - start, 1)
+
+
+class InstrumentedCacheEngineTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.engine_config = {
+            'engine': 'frf.cache.engines.instrumented.InstrumentedCacheEngine',
+            'flush_interval': 0,
+            'backend': {
+                'engine': 'frf.cache.engines.locmem.LocMemCacheEngine',
+                },
+            }
+        cache.init(self.engine_config)
+        self.engine = cache.get_engine()
+
+    def test_get_set(self):
+        cache.set('calendars:1', 'value')
+
+        self.assertEqual(cache.get('calendars:1'), 'value')
+        self.assertIsNone(cache.get('calendars:2'))
+        cache.delete('calendars:1')
+
+        stats = self.engine.get_stats()['calendars']
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['sets'], 1)
+        self.assertEqual(stats['deletes'], 1)
+        self.assertEqual(stats['bytes_written'], 5)
+        self.assertEqual(stats['bytes_read'], 5)
+        self.assertEqual(sum(stats['latency']), stats['operations'])
+
+    def test_prefixes(self):
+        cache.set('calendars:1', 'value', tags=['calendar'])
+        cache.get('users:1')
+        cache.get('single')
+
+        stats = self.engine.get_stats()
+        self.assertEqual(
+            sorted(stats.keys()), ['__frf', 'calendars', 'single', 'users'])
+
+    def test_evictions(self):
+        self.engine.backend.max_entries = 2
+        self.engine.set('a:1', 'value')
+        self.engine.set('a:2', 'value')
+        self.engine.set('b:1', 'value')
+
+        stats = self.engine.get_stats()
+        self.assertEqual(stats['a']['evictions'], 1)
+        self.assertEqual(stats['b']['evictions'], 0)
+
+    def test_reset_stats(self):
+        cache.get('test')
+        self.engine.reset_stats()
+
+        self.assertEqual(self.engine.get_stats(), {})
+
+    def test_collect_stats(self):
+        cache.get('test')
+        self.engine.flush()
+
+        # another process
+        other = cache.create_engine(self.engine_config)
+        other.backend = self.engine.backend
+        other.get('test')
+        other.get('test')
+        other.flush()
+
+        cache.get('test')
+        self.engine.flush()
+
+        self.assertEqual(self.engine.collect_stats()['test']['misses'], 4)
+        self.assertEqual(
+            self.engine.backend.get(instrumented.STATS_INDEX_KEY), 2)
+
+    def test_collect_stats_forgets_stale_workers(self):
+        cache.get('test')
+        self.engine.flush()
+        self.engine.backend.delete(self.engine.get_worker_key(1))
+
+        self.assertEqual(self.engine.collect_stats(), {})
+
+    @mock.patch('random.random')
+    def test_sizes_sampled(self, random_mock):
+        random_mock.return_value = 0.5
+        self.engine.set('test', {'one': 1})
+        self.assertEqual(self.engine.get_stats()['test']['bytes_written'], 0)
+
+        random_mock.return_value = 0.05
+        self.engine.set('test', {'one': 1})
+        stats = self.engine.get_stats()['test']
+        self.assertEqual(stats['sets'], 2)
+        self.assertEqual(sum(stats['sizes']), 1)
+        self.assertEqual(stats['bytes_written'], int(
+            sys.getsizeof({'one': 1}) / 0.1))
+
+    def test_summarize(self):
+        stats = instrumented.new_stats()
+        stats['hits'] = 3
+        stats['misses'] = 1
+        stats['latency'][0] = 98
+        stats['latency'][-1] = 2
+
+        summary = instrumented.summarize(stats)
+        self.assertEqual(summary['hit_rate'], 0.75)
+        self.assertEqual(summary['latency_p50'], 0.1)
+        self.assertIsNone(summary['latency_p99'])
+        self.assertIsNone(summary['size_p50'])
+
+
 class RedisCacheEngineTestCase(unittest.TestCase):
     # couldn't figure out how to test redis timeout, because I can't mock the
     # datetime for redis itself.
@@ -122,3 +1199,11 @@ class RedisCacheEngineTestCase(unittest.TestCase):
 
         for i in range(3):
             self.assertIsNone(cache.get(str(i)))
+
+    def test_publish_subscribe(self):
+        engine = cache.get_engine()
+        messages = engine.subscribe('testchannel')
+        engine.publish('testchannel', {'action': 'create', 'key': 1})
+
+        self.assertEqual(next(messages), {'action': 'create', 'key': 1})
+        messages.close()
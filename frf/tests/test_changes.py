@@ -0,0 +1,267 @@
+# Copyright 2016 by Teem, and other contributors,
+# as noted in the individual source code files.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# By contributing to this project, you agree to also license your source
+# code under the terms of the Apache License, Version 2.0, as described
+# above.
+import asyncio
+import json
+import threading
+import time
+
+import falcon
+from falcon import testing
+from falcon.testing import TestCase as BaseTestCase
+
+from frf import changes, db, models, serializers, urls, viewsets
+
+
+class Memo(models.Model):
+    id = models.Column(models.Integer, primary_key=True)
+    text = models.Column(models.String(255))
+
+    __tablename__ = 'memo_table'
+
+
+class MemoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Memo
+        fields = ('id', 'text')
+
+
+class MemoViewSet(viewsets.ModelViewSet):
+    serializer = MemoSerializer()
+    model = Memo
+    obj_lookup_kwarg = 'id'
+
+
+class KeyAuthentication(object):
+    def authenticate(self, req, view):
+        if req.get_header('authorization') == 'Key secret':
+            return 'alice'
+
+    def __str__(self):
+        return 'key'
+
+
+def parse_events(body):
+    events = []
+    for block in body.split('\n\n'):
+        fields = dict(
+            line.split(': ', 1) for line in block.splitlines()
+            if not line.startswith(':'))
+        if 'event' in fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+class ChangeFeedTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        db.init('sqlite://', echo=False)
+        Memo.metadata.create_all(db.engine)
+        changes._bus = None
+        changes.track(Memo, serializer=MemoSerializer())
+        self.addCleanup(changes.untrack, Memo)
+
+        self.viewset = MemoViewSet()
+        self.api = falcon.API()
+        self.api.add_route('/memos/', self.viewset)
+        self.api.add_route('/memos/{id}/', self.viewset)
+        self.api.add_route(*urls.changes(
+            '/changes/', max_duration=0, can_see=self.can_see))
+
+    def can_see(self, req, change):
+        return change['data'] is None or change['data']['text'] != 'secret'
+
+    def published(self, position=0):
+        events, position = changes.get_bus().read(position)
+        return [(e['model'], e['action'], e['key'], e['data'])
+                for e in events]
+
+    def feed(self, **kwargs):
+        res = self.simulate_get('/changes/', **kwargs)
+        self.assertEqual(res.status, falcon.HTTP_200)
+        self.assertEqual(res.headers['content-type'], 'text/event-stream')
+        return parse_events(res.text)
+
+    def test_viewset_changes(self):
+        self.simulate_post('/memos/', body=json.dumps({'text': 'one'}))
+        self.simulate_patch('/memos/1/', body=json.dumps({'text': 'two'}))
+        self.simulate_delete('/memos/1/')
+
+        self.assertEqual(self.published(), [
+            ('memo_table', 'create', 1, {'id': 1, 'text': 'one'}),
+            ('memo_table', 'update', 1, {'id': 1, 'text': 'two'}),
+            ('memo_table', 'delete', 1, None),
+        ])
+
+    def test_transactions(self):
+        memo = Memo(text='one')
+        db.session.add(memo)
+        db.session.flush()
+        memo.text = 'two'
+        db.session.commit()
+        self.assertEqual(self.published(), [
+            ('memo_table', 'create', 1, {'id': 1, 'text': 'two'})])
+
+        # nothing changed
+        memo.text = memo.text
+        db.session.commit()
+
+        db.session.add(Memo(text='three'))
+        db.session.flush()
+        db.session.rollback()
+
+        memo = Memo(text='four')
+        db.session.add(memo)
+        db.session.flush()
+        db.session.delete(memo)
+        db.session.commit()
+
+        self.assertEqual(len(self.published()), 1)
+
+    def test_savepoints(self):
+        db.session.add(Memo(text='one'))
+        db.session.begin_nested()
+        db.session.add(Memo(text='two'))
+        db.session.flush()
+        db.session.rollback()
+        db.session.begin_nested()
+        db.session.add(Memo(text='three'))
+        db.session.commit()
+        db.session.commit()
+
+        self.assertEqual(
+            [data['text'] for model, action, key, data in self.published()],
+            ['one', 'three'])
+
+    def test_feed(self):
+        for text in ('one', 'two', 'three'):
+            self.simulate_post('/memos/', body=json.dumps({'text': text}))
+        first = changes.get_bus().read(0)[0][0]['id']
+
+        self.assertEqual(self.feed(), [])
+
+        events = self.feed(headers={'Last-Event-ID': first})
+        self.assertEqual(
+            [(name, e['data']['text']) for name, e in events],
+            [('change', 'two'), ('change', 'three')])
+
+        self.simulate_delete('/memos/3/')
+        events = self.feed(params={
+            'last_event_id': first, 'actions': 'delete',
+            'models': 'memo_table'})
+        self.assertEqual(
+            [(e['action'], e['key']) for name, e in events], [('delete', 3)])
+
+    def test_hidden_events(self):
+        for text in ('one', 'secret', 'three'):
+            self.simulate_post('/memos/', body=json.dumps({'text': text}))
+        first = changes.get_bus().read(0)[0][0]['id']
+
+        events = self.feed(headers={'Last-Event-ID': first})
+        self.assertEqual(
+            [e['data']['text'] for name, e in events], ['three'])
+
+        # without can_see, nothing is sent
+        self.api.add_route(*urls.changes('/all/', max_duration=0))
+        res = self.simulate_get(
+            '/all/', headers={'Last-Event-ID': first})
+        self.assertEqual(parse_events(res.text), [])
+
+    def test_authentication(self):
+        self.api.add_route(*urls.changes(
+            '/private/', max_duration=0, can_see=self.can_see,
+            authentication=[KeyAuthentication()]))
+
+        res = self.simulate_get('/private/')
+        self.assertEqual(res.status, falcon.HTTP_401)
+
+        res = self.simulate_get(
+            '/private/', headers={'Authorization': 'Key secret'})
+        self.assertEqual(res.status, falcon.HTTP_200)
+
+    def test_feed_reset(self):
+        events = self.feed(headers={'Last-Event-ID': 'unknown-1'})
+        self.assertEqual(events, [('reset', {})])
+
+    def test_invalid_subscription(self):
+        res = self.simulate_get('/changes/', params={'models': 'secret'})
+        self.assertEqual(res.status, falcon.HTTP_400)
+
+        res = self.simulate_get('/changes/', params={'actions': 'read'})
+        self.assertEqual(res.status, falcon.HTTP_400)
+
+
+class ChangeBusTestCase(BaseTestCase):
+    def test_read(self):
+        bus = changes.ChangeBus(size=2)
+        for key in range(3):
+            bus.publish({'key': key})
+
+        self.assertEqual(bus.read(0), (None, 3))
+        events, position = bus.read(1)
+        self.assertEqual([e['key'] for e in events], [1, 2])
+        self.assertEqual(bus.find(events[0]['id']), 2)
+        self.assertIsNone(bus.find('unknown-1'))
+
+    def test_wait(self):
+        bus = changes.ChangeBus()
+        self.assertEqual(bus.wait(0, 0.01), ([], 0))
+
+        timer = threading.Timer(0.05, bus.publish, [{'key': 1}])
+        timer.start()
+        start = time.monotonic()
+        events, position = bus.wait(0, 5)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual([e['key'] for e in events], [1])
+
+    def test_async_stream(self):
+        threads = []
+
+        def can_see(req, change):
+            threads.append(threading.get_ident())
+            return True
+
+        view = changes.ChangeFeedView(max_duration=5, can_see=can_see)
+        req = falcon.Request(testing.create_environ('/changes/'))
+        req.context['changes_subscription'] = (set(), set())
+        bus = changes.ChangeBus()
+        stream = changes.EventStream(view, req, bus, 0)
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        self.assertTrue(
+            loop.run_until_complete(stream.__anext__()).startswith(b'retry'))
+
+        bus.publish({'model': 'memo_table', 'action': 'create', 'key': 1,
+                     'data': None})
+        chunk = loop.run_until_complete(stream.__anext__())
+        self.assertIn(b'event: change', chunk)
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+
+    def test_async_wait(self):
+        bus = changes.ChangeBus()
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+
+        timer = threading.Timer(0.05, bus.publish, [{'key': 1}])
+        timer.start()
+        events, position = loop.run_until_complete(bus.async_wait(0, 5))
+        self.assertEqual([e['key'] for e in events], [1])
+        self.assertEqual(
+            loop.run_until_complete(bus.async_wait(1, 0.01)), ([], 1))
@@ -0,0 +1,60 @@
+# Copyright 2016 by Teem, and other contributors,
+# as noted in the individual source code files.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# By contributing to this project, you agree to also license your source
+# code under the terms of the Apache License, Version 2.0, as described
+# above.
+
+import subprocess
+import sys
+import unittest
+
+from frf.commands import importtime
+
+#: modules that are slow to import and only needed by some projects, so they
+#: must not be imported until they are used.
+LAZY_MODULES = (
+    'Crypto',
+    'dateutil',
+    'sqlalchemy.dialects.postgresql',
+    'frf.cache.engines.redis',
+    'redis',
+    'tabulate',
+    'jinja2',
+    'pytest',
+    )
+
+IMPORT_FRF = '''
+import sys
+import frf.app, frf.filters, frf.serializers, frf.viewsets
+print(' '.join(sorted(sys.modules)))
+'''
+
+
+class ImportTimeTestCase(unittest.TestCase):
+    def test_lazy_modules(self):
+        output = subprocess.check_output([sys.executable, '-c', IMPORT_FRF])
+        modules = set(output.decode('utf-8').split())
+
+        self.assertIn('sqlalchemy', modules)
+        for module in LAZY_MODULES:
+            self.assertNotIn(module, modules)
+
+    def test_measure_imports(self):
+        result = importtime.measure_imports('frf.models')
+
+        self.assertGreater(result['total'], 0)
+        self.assertIn('frf.models', result['modules'])
+        self.assertNotIn('Crypto.Cipher', result['modules'])
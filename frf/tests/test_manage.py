@@ -0,0 +1,59 @@
+# Copyright 2016 by Teem, and other contributors,
+# as noted in the individual source code files.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# By contributing to this project, you agree to also license your source
+# code under the terms of the Apache License, Version 2.0, as described
+# above.
+
+import subprocess
+import sys
+import unittest
+
+from frf import manage
+
+LOAD_COMMAND = '''
+import sys
+from frf import manage
+manage.load_command(manage.find_commands()[sys.argv[1]])
+print(' '.join(sorted(sys.modules)))
+'''
+
+
+def modules_loaded_by(command):
+    output = subprocess.check_output(
+        [sys.executable, '-c', LOAD_COMMAND, command])
+    return set(output.decode('utf-8').split())
+
+
+class ManageTestCase(unittest.TestCase):
+    def test_find_commands(self):
+        commands = manage.find_commands()
+
+        self.assertEqual(commands['syncdb'], 'frf.commands.syncdb')
+        self.assertEqual(commands['test'], 'frf.commands.test')
+
+    def test_load_command(self):
+        from frf.commands import syncdb
+
+        self.assertIs(
+            manage.load_command('frf.commands.syncdb'), syncdb.Command)
+
+    def test_only_the_command_is_imported(self):
+        modules = modules_loaded_by('syncdb')
+
+        self.assertIn('frf.commands.syncdb', modules)
+        for module in ('frf.commands.test', 'frf.commands.startapp',
+                       'pytest', 'jinja2', 'tabulate', 'pyfiglet'):
+            self.assertNotIn(module, modules)
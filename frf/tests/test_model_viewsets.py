@@ -17,6 +17,7 @@
 # code under the terms of the Apache License, Version 2.0, as described
 # above.
 
+import datetime
 import functools
 import json
 import uuid
@@ -24,10 +25,14 @@ import uuid
 import falcon
 
 from falcon.testing import TestCase as BaseTestCase
+import mock
+from sqlalchemy.dialects import postgresql
 
 from frf import db, models
 from frf import exceptions, filters, renderers, serializers, viewsets
+from frf.models.mixins import ArchiveMixin, TimestampMixin
 from frf.tests.fake import faker
+from frf.viewsets import mixins
 
 
 class User(object):
@@ -262,3 +267,372 @@ class TestCase(BaseTestCase):
             query_string='auth_key=superpassword')
 
         self.assertEqual(res.status, falcon.HTTP_405)
+
+
+class Sale(TimestampMixin, models.Model):
+    id = models.Column(models.Integer, primary_key=True)
+    region = models.Column(models.String(255))
+    price = models.Column(models.Float)
+    secret = models.Column(models.Float)
+
+    __tablename__ = 'sale_table'
+
+
+class SaleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Sale
+
+
+class SaleViewSet(mixins.AggregateModelMixin, viewsets.ModelViewSet):
+    renderers = [renderers.ListMetaRenderer()]
+    filters = [
+        filters.FieldMatchFilter(Sale.region),
+        filters.FieldMatchFilter(Sale.id),
+        filters.FieldMatchFilter(Sale.created_at),
+    ]
+    serializer = SaleSerializer()
+    model = Sale
+    aggregate_fields = ('price', )
+    group_by_fields = ('region', 'created_at')
+
+
+class AggregateTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        db.init('sqlite://', echo=False)
+        Sale.metadata.create_all(db.engine)
+
+        self.api = falcon.API()
+        self.api.add_route('/sales/', SaleViewSet())
+
+        for region, price, created_at in (
+                ('north', 10, datetime.datetime(2016, 9, 5, 10)),
+                ('north', 20, datetime.datetime(2016, 9, 11, 23)),
+                ('south', 5, datetime.datetime(2016, 9, 12, 1)),
+                ('south', 7.5, datetime.datetime(2016, 10, 1, 8))):
+            db.session.add(Sale(
+                region=region, price=price, secret=0,
+                created_at=created_at))
+        db.session.commit()
+
+    def aggregate(self, query_string):
+        return self.simulate_get('/sales/', query_string=query_string)
+
+    def test_aggregate(self):
+        res = self.aggregate('aggregate=count,sum(price),max(price)')
+        self.assertEqual(res.status, falcon.HTTP_200)
+        self.assertEqual(res.json['results'], [
+            {'count': 4, 'sum_price': 42.5, 'max_price': 20},
+        ])
+
+    def test_group_by(self):
+        res = self.aggregate('aggregate=count,avg(price)&group_by=region')
+        self.assertEqual(res.json['meta'], {'total': 2})
+        self.assertEqual(res.json['results'], [
+            {'region': 'north', 'count': 2, 'avg_price': 15},
+            {'region': 'south', 'count': 2, 'avg_price': 6.25},
+        ])
+
+    def test_group_by_date(self):
+        res = self.aggregate('aggregate=count&group_by=created_at:month')
+        self.assertEqual(res.json['results'], [
+            {'created_at': '2016-09-01T00:00:00', 'count': 3},
+            {'created_at': '2016-10-01T00:00:00', 'count': 1},
+        ])
+
+        res = self.aggregate('aggregate=count&group_by=created_at:week')
+        self.assertEqual(
+            [(r['created_at'], r['count']) for r in res.json['results']], [
+                ('2016-09-05T00:00:00', 2),
+                ('2016-09-12T00:00:00', 1),
+                ('2016-09-26T00:00:00', 1),
+            ])
+
+    def test_filters(self):
+        res = self.aggregate('aggregate=sum(price)&region=south')
+        self.assertEqual(res.json['results'], [{'sum_price': 12.5}])
+
+    def test_list(self):
+        res = self.simulate_get('/sales/')
+        self.assertEqual(len(res.json['results']), 4)
+
+    def test_typed_filters(self):
+        res = self.simulate_get('/sales/', query_string='ids[]=1,2,2&id=1')
+        self.assertEqual(
+            sorted(r['id'] for r in res.json['results']), [1, 2])
+
+        res = self.simulate_get(
+            '/sales/', query_string='created_at=2016-09-12T01:00:00')
+        self.assertEqual([r['id'] for r in res.json['results']], [3])
+
+        for query_string in ('id=abc', 'created_at=yesterday'):
+            res = self.simulate_get('/sales/', query_string=query_string)
+            self.assertEqual(res.status, falcon.HTTP_400, query_string)
+
+    def test_fail_not_whitelisted(self):
+        for query_string in (
+                'aggregate=sum(secret)',
+                'aggregate=median(price)',
+                'aggregate=count&group_by=secret',
+                'aggregate=count&group_by=created_at:decade'):
+            res = self.aggregate(query_string)
+            self.assertEqual(res.status, falcon.HTTP_400, query_string)
+
+
+class Note(TimestampMixin, ArchiveMixin, models.Model):
+    id = models.Column(models.Integer, primary_key=True)
+    text = models.Column(models.String(255))
+
+    __tablename__ = 'note_table'
+
+
+class NoteSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Note
+        fields = ('id', 'text')
+
+
+class NoteViewSet(viewsets.ModelViewSet):
+    filters = [filters.ArchiveFlagFilter(Note.deleted_at)]
+    serializer = NoteSerializer()
+    model = Note
+    obj_lookup_kwarg = 'id'
+    allow_sync = True
+    sync_page_size = 2
+
+
+class SyncTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        db.init('sqlite://', echo=False)
+        Note.metadata.create_all(db.engine)
+
+        self.viewset = NoteViewSet()
+        self.api = falcon.API()
+        self.api.add_route('/notes/', self.viewset)
+
+        self.start = datetime.datetime(2016, 9, 22, 12)
+        for i in range(5):
+            # two notes share each timestamp
+            db.session.add(Note(
+                id=i + 1, text='note {}'.format(i + 1),
+                created_at=self.start,
+                updated_at=self.start + datetime.timedelta(minutes=i // 2)))
+        db.session.commit()
+
+    def sync(self, since, **params):
+        params['since'] = since
+        res = self.simulate_get('/notes/', params=params)
+        self.assertEqual(res.status, falcon.HTTP_200)
+        return res.json
+
+    def sync_all(self, since):
+        results, deleted = [], []
+        while True:
+            page = self.sync(since)
+            results += [r['id'] for r in page['results']]
+            deleted += page['deleted']
+            since = page['meta']['next']
+            if not page['meta']['has_more']:
+                return results, deleted, since
+
+    def test_sync(self):
+        page = self.sync('0')
+        self.assertEqual([r['text'] for r in page['results']], [
+            'note 1', 'note 2'])
+        self.assertTrue(page['meta']['has_more'])
+
+        results, deleted, since = self.sync_all('0')
+        self.assertEqual(results, [1, 2, 3, 4, 5])
+        self.assertEqual(deleted, [])
+
+        # nothing changed
+        page = self.sync(since)
+        self.assertEqual(page['results'], [])
+        self.assertEqual(page['meta'], {'next': since, 'has_more': False})
+
+        later = self.start + datetime.timedelta(hours=1)
+        note = Note.query.get(2)
+        note.text = 'edited'
+        note.updated_at = later
+        archived = Note.query.get(4)
+        archived.deleted_at = later
+        archived.updated_at = later
+        db.session.commit()
+
+        results, deleted, since = self.sync_all(since)
+        self.assertEqual(results, [2])
+        self.assertEqual(deleted, [4])
+
+        # archived notes are still hidden from lists
+        res = self.simulate_get('/notes/')
+        self.assertEqual(len(res.json), 4)
+
+    def test_sync_window(self):
+        now = datetime.datetime.utcnow()
+        note = Note.query.get(1)
+        note.updated_at = now - datetime.timedelta(seconds=10)
+        db.session.commit()
+
+        results, deleted, since = self.sync_all('0')
+        self.assertEqual(results, [2, 3, 4, 5, 1])
+
+        # a transaction that started before the last sync commits a change
+        # older than the last one synced
+        late = Note(id=6, text='late', created_at=now,
+                    updated_at=now - datetime.timedelta(seconds=20))
+        db.session.add(late)
+        db.session.commit()
+
+        # the changes of the last minute are synced again
+        results, deleted, since = self.sync_all(since)
+        self.assertEqual(results, [6, 1])
+
+    def test_per_page(self):
+        page = self.sync('0', per_page=1)
+        self.assertEqual(len(page['results']), 1)
+
+        page = self.sync('0', per_page=10)
+        self.assertEqual(len(page['results']), 2)
+
+        for per_page in ('0', '-1'):
+            res = self.simulate_get('/notes/', params={
+                'since': '0', 'per_page': per_page})
+            self.assertEqual(res.status, falcon.HTTP_400)
+
+    def test_fail_invalid_cursor(self):
+        res = self.simulate_get('/notes/', query_string='since=garbage')
+        self.assertEqual(res.status, falcon.HTTP_400)
+
+    def test_sync_not_allowed(self):
+        self.viewset.allow_sync = False
+        res = self.simulate_get('/notes/', query_string='since=0')
+        self.assertEqual(len(res.json), 5)
+
+
+class Post(models.Model):
+    id = models.Column(models.Integer, primary_key=True)
+    title = models.Column(models.String(255))
+
+    __tablename__ = 'post_table'
+
+
+class PostSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Post
+
+
+class PostViewSet(viewsets.ModelViewSet):
+    filters = [
+        filters.SearchFilter(Post.title),
+        filters.SearchFilter(Post.title, 'prefix', mode='prefix'),
+        filters.SearchFilter(Post.title, 'text', mode='fulltext', rank=True),
+    ]
+    serializer = PostSerializer()
+    model = Post
+    obj_lookup_kwarg = 'id'
+
+
+class SearchTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        db.init('sqlite://', echo=False)
+        Post.metadata.create_all(db.engine)
+
+        self.api = falcon.API()
+        self.api.add_route('/posts/', PostViewSet())
+
+        for title in ('Hello world', 'Help', 'Shell', '50% off',
+                      '500 things', 'world world world'):
+            db.session.add(Post(title=title))
+        db.session.commit()
+        filters.create_search_indexes(db.engine)
+
+    def search(self, query_string):
+        res = self.simulate_get('/posts/', query_string=query_string)
+        self.assertEqual(res.status, falcon.HTTP_200)
+        return [r['title'] for r in res.json]
+
+    def test_contains(self):
+        self.assertEqual(self.search('search=ell'), ['Hello world', 'Shell'])
+
+    def test_prefix(self):
+        self.assertEqual(self.search('prefix=HEL'), ['Hello world', 'Help'])
+        self.assertEqual(self.search('prefix=50%25'), ['50% off'])
+
+        query = filters.SearchFilter(
+            Post.title, mode='prefix').filter_prefix(Post.query, 'hel')
+        plan = db.session.execute('EXPLAIN QUERY PLAN {}'.format(
+            query.statement.compile(
+                db.engine, compile_kwargs={'literal_binds': True})))
+        self.assertIn('ix_post_table_title_lower', str(plan.fetchall()))
+
+    def test_prefix_beyond_bmp(self):
+        for title in ('ab\U0001f600x', 'ab\uffff\U0001f600', 'ac'):
+            db.session.add(Post(title=title))
+        db.session.commit()
+
+        self.assertCountEqual(
+            self.search('prefix=ab'), ['ab\U0001f600x', 'ab\uffff\U0001f600'])
+        self.assertEqual(
+            self.search('prefix=ab%EF%BF%BF'), ['ab\uffff\U0001f600'])
+        self.assertEqual(len(self.search('prefix=')), 9)
+
+    def test_prefix_non_ascii(self):
+        for title in ('Émile', 'émile', 'Élan'):
+            db.session.add(Post(title=title))
+        db.session.commit()
+
+        # SQLite only lower cases ASCII letters, in the column and the term
+        self.assertEqual(self.search('prefix=%C3%89M'), ['Émile'])
+        self.assertEqual(self.search('prefix=%C3%A9m'), ['émile'])
+
+    def test_prefix_postgresql(self):
+        engine = mock.Mock(dialect=postgresql.dialect())
+        with mock.patch.object(db, 'get_engine', return_value=engine):
+            query = filters.SearchFilter(
+                Post.title, mode='prefix').filter_prefix(Post.query, '50%')
+        # without an ESCAPE, the text_pattern_ops index is used
+        where = str(query.statement.compile(dialect=engine.dialect))
+        self.assertIn('lower(post_table.title) LIKE', where)
+        self.assertNotIn('ESCAPE', where)
+
+        index = filters.SearchIndex(Post.title, 'prefix')
+        self.assertEqual(index.get_statements(engine), [
+            'CREATE INDEX IF NOT EXISTS ix_post_table_title_lower ON '
+            'post_table (lower(title) text_pattern_ops)'])
+
+    def test_prefix_upper_bound(self):
+        self.assertEqual(filters.get_prefix_upper_bound('ab'), 'ac')
+        self.assertEqual(
+            filters.get_prefix_upper_bound('a\U0010ffff'), 'b')
+        self.assertEqual(
+            filters.get_prefix_upper_bound('a\ud7ff'), 'a\ue000')
+        self.assertIsNone(filters.get_prefix_upper_bound('\U0010ffff'))
+
+    def test_fulltext(self):
+        self.assertEqual(
+            self.search('text=world'), ['world world world', 'Hello world'])
+        self.assertEqual(self.search('text=hello+WORLD'), ['Hello world'])
+        self.assertEqual(self.search('text=%3F%3F'), [])
+
+        # the index follows the table
+        Post.query.filter_by(title='Hello world').update({'title': 'Hi'})
+        Post.query.filter_by(title='world world world').delete()
+        db.session.add(Post(title='new world'))
+        db.session.commit()
+        self.assertEqual(self.search('text=world'), ['new world'])
+
+    def test_fulltext_from_self(self):
+        search = filters.SearchFilter(Post.title, mode='fulltext', rank=True)
+        query = search.filter_sqlite(Post.query.from_self(), 'world')
+        self.assertEqual(
+            [p.title for p in query], ['world world world', 'Hello world'])
+
+        search.rank = False
+        query = search.filter_sqlite(Post.query.from_self(), 'hello')
+        self.assertEqual([p.title for p in query], ['Hello world'])
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            filters.SearchFilter(Post.title, mode='regex')
@@ -18,15 +18,20 @@
 # above.
 
 import datetime
+from decimal import Decimal
+import json
 import unittest
 import uuid
 
 import falcon
+from sqlalchemy import event, func
 
-from frf import db, exceptions, serializers
+from frf import cache, db, exceptions, serializers
 from frf.tests.base import BaseTestCase
 from frf.tests import fakeproject  # noqa
 from frf.tests.fakeapp import models
+from frf.tests.fakeapp import serializers as fakeapp_serializers
+from frf.tests.fakeapp import viewsets as fakeapp_viewsets
 from frf.utils import timezone
 from frf.utils.json import serialize
 
@@ -395,6 +400,57 @@ class TestCase(unittest.TestCase):
                     model=FakeModel()),)
 
 
+class Item(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class BatchSerializer(serializers.Serializer):
+    name = serializers.StringField()
+    name_length = serializers.BatchMethodField(default=0)
+    position = serializers.BatchMethodField(method_name='get_positions')
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def get_name_length(self, objs, ctx=None):
+        self.calls.append(len(objs))
+        return {obj: len(obj.name) for obj in objs if obj.name}
+
+    def get_positions(self, objs, ctx=None):
+        return {obj: i for i, obj in enumerate(objs)}
+
+
+class BatchMethodFieldTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.serializer = BatchSerializer()
+        self.items = [Item('one'), Item('three'), Item(None)]
+
+    def test_serialize_many(self):
+        data = self.serializer.serialize(iter(self.items), many=True)
+        self.assertEqual(
+            data, [
+                {'name': 'one', 'name_length': 3, 'position': 0},
+                {'name': 'three', 'name_length': 5, 'position': 1},
+                {'name': None, 'name_length': 0, 'position': 2},
+            ])
+        self.assertEqual(self.serializer.calls, [3])
+
+    def test_serialize_one(self):
+        ctx = {}
+        data = self.serializer.serialize(self.items[1], ctx=ctx)
+        self.assertEqual(
+            data, {'name': 'three', 'name_length': 5, 'position': 0})
+        self.assertEqual(self.serializer.calls, [1])
+        self.assertEqual(ctx, {})
+
+    def test_read_only(self):
+        with self.assertRaises(exceptions.ValidationError):
+            self.serializer.validate(data={'name': 'one', 'position': 1})
+
+
 class FakeProjectTestCase(BaseTestCase):
     def setUp(self):
         super().setUp()
@@ -416,9 +472,9 @@ class FakeProjectTestCase(BaseTestCase):
 
         self.books = [
             models.Book(author=self.adam,
-                        title='Gone with the wind.'),
+                        title='Gone with the wind.', price=Decimal('9.99')),
             models.Book(author=self.adam,
-                        title='Sinbad'),
+                        title='Sinbad', price=Decimal('5.01')),
             models.Book(author=self.ross,
                         title='Vanishing Friend'),
             models.Book(author=self.ross,
@@ -557,3 +613,182 @@ class FakeProjectTestCase(BaseTestCase):
 
         self.assertEqual(1, len(self.adam.books))
         self.assertEqual(self.adam.books[0], book)
+
+    def count_queries(self, func, *args, **kwargs):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            event.remove(
+                db.engine, 'before_cursor_execute', before_cursor_execute)
+
+        return result, len(statements)
+
+    def test_include(self):
+        db.session.expire_all()
+        res, queries = self.count_queries(
+            self.simulate_get, '/api/library/books/',
+            query_string='include=author')
+        self.assertEqual(falcon.HTTP_200, res.status)
+
+        json = res.json
+        self.assertEqual(len(json['results']), 4)
+        self.assertEqual(json['meta']['total'], 4)
+        self.assertEqual(
+            sorted(a['name'] for a in json['included']['author']),
+            ['Adam Olsen', 'Ross Buchanan'])
+        self.assertEqual(len(json['included']['author'][0]), 5)
+
+        # the count, the books, the authors, and their books and companies
+        self.assertEqual(queries, 5)
+
+    def test_include_many(self):
+        res = self.simulate_get(
+            '/api/library/authors/', query_string='include=books,company')
+        self.assertEqual(falcon.HTTP_200, res.status)
+
+        included = res.json['included']
+        self.assertEqual(
+            sorted(b['title'] for b in included['books']),
+            sorted(b.title for b in self.books))
+        self.assertEqual(len(included['company']), 1)
+        self.assertEqual(included['company'][0]['name'], 'Ender Labs')
+
+    def test_include_paginated(self):
+        class PaginatedBookViewSet(fakeapp_viewsets.LibraryBookViewSet):
+            paginate = (2, 10)
+
+        self.api = falcon.API()
+        self.api.add_route('/books/', PaginatedBookViewSet())
+
+        authors = set()
+        for page in (1, 2):
+            db.session.expire_all()
+            res = self.simulate_get(
+                '/books/', query_string='include=author&page={}'.format(page))
+            self.assertEqual(len(res.json['results']), 2)
+            self.assertEqual(len(res.json['included']['author']), 1)
+            authors.add(res.json['included']['author'][0]['name'])
+
+        self.assertEqual(authors, {'Adam Olsen', 'Ross Buchanan'})
+
+    def test_cached_list(self):
+        calls = []
+
+        class CachedBookViewSet(fakeapp_viewsets.LibraryBookViewSet):
+            paginate = (2, 10)
+
+            @cache.cached(timeout=30)
+            def list(self, req, resp, **kwargs):
+                calls.append(req)
+                resp.set_header('X-Books', 'listed')
+                super().list(req, resp, **kwargs)
+
+        cache.init({'engine': 'frf.cache.engines.locmem.LocMemCacheEngine'})
+        self.api = falcon.API()
+        self.api.add_route('/books/', CachedBookViewSet())
+
+        first = self.simulate_get(
+            '/books/', query_string='include=author')
+        second = self.simulate_get(
+            '/books/', query_string='include=author')
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(second.json, first.json)
+        self.assertEqual(second.json['meta']['page'], 1)
+        self.assertEqual(second.json['meta']['total'], 4)
+        self.assertEqual(len(second.json['results']), 2)
+        self.assertEqual(len(second.json['included']['author']), 1)
+        self.assertEqual(second.headers['x-books'], 'listed')
+        self.assertEqual(
+            second.headers['content-type'], first.headers['content-type'])
+
+    def test_no_include(self):
+        res = self.simulate_get('/api/library/books/')
+        self.assertEqual(falcon.HTTP_200, res.status)
+        self.assertNotIn('included', res.json)
+
+    def test_fail_invalid_include(self):
+        res = self.simulate_get(
+            '/api/library/books/', query_string='include=publisher')
+        self.assertEqual(falcon.HTTP_400, res.status)
+
+    def test_batch_method_field(self):
+        class AuthorSerializer(serializers.ModelSerializer):
+            book_count = serializers.BatchMethodField(default=0)
+
+            def get_book_count(self, objs, ctx=None):
+                counts = db.session.query(
+                    models.Book.author_uuid1, func.count(models.Book.id)
+                ).filter(models.Book.author_uuid1.in_(
+                    [o.uuid1 for o in objs])).group_by(
+                    models.Book.author_uuid1)
+                counts = dict(counts)
+                return {o: counts.get(o.uuid1, 0) for o in objs}
+
+            class Meta:
+                model = models.Author
+                fields = ('name', 'book_count')
+
+        authors = models.Author.query.order_by(models.Author.name).all()
+        data, queries = self.count_queries(
+            AuthorSerializer().serialize, authors, many=True)
+
+        self.assertEqual(data, [
+            {'name': 'Adam Olsen', 'book_count': 2},
+            {'name': 'Ross Buchanan', 'book_count': 2},
+        ])
+        self.assertEqual(queries, 1)
+
+    def test_aggregate_fields(self):
+        db.session.expire_all()
+        res, queries = self.count_queries(
+            self.simulate_get, '/api/library/authors/')
+        self.assertEqual(falcon.HTTP_200, res.status)
+
+        authors = {a['name']: a for a in res.json['results']}
+        adam, ross = authors['Adam Olsen'], authors['Ross Buchanan']
+        self.assertEqual(adam['book_count'], 2)
+        self.assertEqual(ross['book_count'], 2)
+        self.assertEqual(
+            adam['book_id_total'], sum(b.id for b in self.adam.books))
+        self.assertEqual(adam['book_price_total'], 15.0)
+        self.assertEqual(ross['book_price_total'], 0)
+        self.assertTrue(adam['has_sinbad'])
+        self.assertFalse(ross['has_sinbad'])
+
+        # the count, and the authors with their aggregates, plus the books
+        # of each author and their company, which are not aggregated
+        self.assertEqual(queries, 5)
+
+    def test_aggregate_fields_without_annotations(self):
+        company = models.Company(name='Empty')
+        author = models.Author(name='Nobody', company=company)
+        db.session.add(author)
+        db.session.commit()
+
+        data = fakeapp_serializers.LibraryAuthorSerializer().serialize(author)
+        self.assertEqual(data['book_count'], 0)
+        self.assertEqual(data['book_id_total'], 0)
+        self.assertEqual(data['book_price_total'], 0)
+        self.assertFalse(data['has_sinbad'])
+        json.dumps(data)
+
+    def test_annotate(self):
+        field = fakeapp_serializers.LibraryAuthorSerializer().fields[
+            'book_count']
+        qs = models.Author.query.annotate(
+            book_count=field.expression(models.Author)).order_by(
+            models.Author.name)
+
+        self.assertEqual(qs.count(), 2)
+        author = qs.first()
+        self.assertIsInstance(author, models.Author)
+        self.assertEqual(author.book_count, 2)
+        self.assertEqual(
+            [a.name for a in qs.paginate(per_page=1).items], ['Adam Olsen'])
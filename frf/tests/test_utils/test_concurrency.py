@@ -0,0 +1,148 @@
+# Copyright 2016 by Teem, and other contributors,
+# as noted in the individual source code files.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# By contributing to this project, you agree to also license your source
+# code under the terms of the Apache License, Version 2.0, as described
+# above.
+
+import json
+import subprocess
+import sys
+import threading
+import unittest
+
+import mock
+
+from frf import exceptions
+from frf.utils import concurrency
+
+try:
+    import gevent
+except ImportError:
+    gevent = None
+
+#: serves concurrent requests in a gevent monkey-patched process, and prints
+#: the greenlet and session each request ran in.
+GEVENT_REQUESTS = '''
+from gevent import monkey
+monkey.patch_all()
+
+import json
+import time
+
+import falcon
+import falcon.testing
+import gevent
+
+from frf import db
+from frf.middleware import SQLAlchemyMiddleware
+from frf.utils import concurrency
+
+db.init('sqlite://', scopefunc=concurrency.get_scopefunc('auto'))
+seen = []
+
+
+class Resource(object):
+    def on_get(self, req, resp):
+        session = db.session()
+        time.sleep(0.2)
+        session.execute('SELECT 1')
+        seen.append({
+            'greenlet': id(gevent.getcurrent()),
+            'session': id(session),
+            'same_session': db.session() is session,
+        })
+
+
+api = falcon.API(middleware=[SQLAlchemyMiddleware()])
+api.add_route('/', Resource())
+
+
+def request():
+    api(falcon.testing.create_environ('/'),
+        falcon.testing.StartResponseMock())
+
+
+start = time.time()
+gevent.joinall([gevent.spawn(request) for i in range(5)])
+print(json.dumps({
+    'patched': concurrency.is_gevent_patched(),
+    'duration': time.time() - start,
+    'requests': seen,
+}))
+'''
+
+
+class ConcurrencyTestCase(unittest.TestCase):
+    def test_thread_scope(self):
+        self.assertIsNone(concurrency.get_scopefunc('thread'))
+
+    def test_auto_scope(self):
+        self.assertIsNone(concurrency.get_scopefunc('auto'))
+
+    @unittest.skipIf(gevent is None, 'gevent is not installed')
+    def test_auto_scope_gevent(self):
+        with mock.patch.object(
+                concurrency, 'is_gevent_patched', return_value=True):
+            self.assertIs(
+                concurrency.get_scopefunc('auto'), gevent.getcurrent)
+
+    def test_unknown_scope(self):
+        with self.assertRaises(exceptions.InitializationError):
+            concurrency.get_scopefunc('process')
+
+    @unittest.skipIf(gevent is None, 'gevent is not installed')
+    def test_greenlet_scope(self):
+        scopefunc = concurrency.get_scopefunc('greenlet')
+        scopes = [gevent.spawn(scopefunc) for i in range(2)]
+        gevent.joinall(scopes)
+
+        self.assertIsNot(scopes[0].value, scopes[1].value)
+        self.assertIs(scopefunc(), scopefunc())
+
+    @unittest.skipIf(gevent is None, 'gevent is not installed')
+    def test_gevent_requests(self):
+        # monkey-patching can't be undone, so it is done in another process
+        output = subprocess.check_output(
+            [sys.executable, '-c', GEVENT_REQUESTS])
+        result = json.loads(output.decode('utf-8'))
+        requests = result['requests']
+
+        self.assertTrue(result['patched'])
+        self.assertEqual(len(requests), 5)
+        # the requests waited at the same time
+        self.assertLess(result['duration'], 0.2 * 5)
+        self.assertEqual(len({r['greenlet'] for r in requests}), 5)
+        self.assertEqual(len({r['session'] for r in requests}), 5)
+        self.assertTrue(all(r['same_session'] for r in requests))
+
+    @unittest.skipIf(
+        concurrency.contextvars is None, 'contextvars needs Python 3.7')
+    def test_contextvars_scope(self):
+        scopefunc = concurrency.get_scopefunc('contextvars')
+        scope = scopefunc()
+        other_scopes = []
+
+        thread = threading.Thread(
+            target=lambda: other_scopes.append(scopefunc()))
+        thread.start()
+        thread.join()
+
+        self.assertIs(scopefunc(), scope)
+        self.assertIsNot(other_scopes[0], scope)
+        self.assertIsNot(concurrency.new_scope(), scope)
+
+    def test_patch_database_driver_without_gevent(self):
+        self.assertFalse(concurrency.patch_database_driver())
@@ -62,3 +62,21 @@ class TestCase(unittest.TestCase):
 
         self.assertEqual(
             d, datetime.datetime(2016, 1, 1, 10, 32, 1, tzinfo=tzinfo))
+
+    def test_truncate(self):
+        d = datetime.datetime(2016, 9, 22, 17, 11, 41, 500)
+
+        self.assertEqual(
+            dateutils.truncate(d, 'hour'),
+            datetime.datetime(2016, 9, 22, 17))
+        self.assertEqual(
+            dateutils.truncate(d, 'day'), datetime.datetime(2016, 9, 22))
+        self.assertEqual(
+            dateutils.truncate(d, 'week'), datetime.datetime(2016, 9, 19))
+        self.assertEqual(
+            dateutils.truncate(d, 'month'), datetime.datetime(2016, 9, 1))
+        self.assertEqual(
+            dateutils.truncate(d, 'year'), datetime.datetime(2016, 1, 1))
+
+        with self.assertRaises(ValueError):
+            dateutils.truncate(d, 'decade')
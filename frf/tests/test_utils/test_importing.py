@@ -40,3 +40,14 @@ class TestCase(unittest.TestCase):
             importing.import_class('frf.tests.test_utils.test_importing')
 
         self.assertIn('does not refer to a class', str(context.exception))
+
+    def test_import_submodules(self):
+        modules = importing.import_submodules(
+            ['frf.tests', 'frf.tests.test_utils'], 'dummy_class')
+
+        self.assertEqual([m.__name__ for m in modules],
+                         ['frf.tests.test_utils.dummy_class'])
+
+    def test_import_submodules_errors(self):
+        with self.assertRaises(ImportError):
+            importing.import_submodules(['frf.tests.test_utils'], 'broken')
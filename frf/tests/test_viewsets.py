@@ -24,8 +24,9 @@ import uuid
 import falcon
 
 from falcon.testing import TestCase as BaseTestCase
+import mock
 
-from frf import exceptions, filters, renderers, serializers, viewsets
+from frf import exceptions, filters, renderers, serializers, views, viewsets
 from frf.tests.fake import faker
 
 ITEMS = []
@@ -270,3 +271,179 @@ class TestCase(BaseTestCase):
             query_string='auth_key=superpassword')
 
         self.assertEqual(res.status, falcon.HTTP_405)
+
+    def test_fail_update_without_lookup(self):
+        res = self.simulate_patch(
+            '/dummies/', body=json.dumps({}),
+            query_string='auth_key=superpassword')
+
+        self.assertEqual(res.status, falcon.HTTP_400)
+
+    def test_dispatch_plan(self):
+        plan = self.viewset.get_dispatch_plan('get')
+
+        self.assertIs(self.viewset.get_dispatch_plan('get'), plan)
+        self.assertEqual(plan.action, 'list')
+        self.assertEqual(plan.list_renderers, tuple(self.viewset.renderers))
+        self.assertEqual(plan.renderers, ())
+        self.assertEqual(plan.filters, ())
+        self.assertEqual(
+            plan.authentication, tuple(self.viewset.authentication))
+
+        self.viewset.reset_dispatch_plans()
+        self.assertIsNot(self.viewset.get_dispatch_plan('get'), plan)
+
+    def test_dispatch_plan_overridden_getters(self):
+        class OtherViewSet(DummyViewSet):
+            def get_renderers(self, req, **kwargs):
+                return []
+
+        plan = OtherViewSet().get_dispatch_plan('get')
+        self.assertIsNone(plan.renderers)
+        self.assertIsNotNone(plan.authentication)
+
+        self.api.add_route('/others/', OtherViewSet())
+        res = self.simulate_get(
+            '/others/', query_string='auth_key=superpassword')
+        self.assertIsInstance(res.json, list)
+
+    def test_view_method_not_allowed(self):
+        class HelloView(views.View):
+            allowed_methods = ('get', )
+
+            def get(self, req, resp, **kwargs):
+                resp.body = 'hello'
+
+        self.api.add_route('/hello/', HelloView())
+
+        self.assertEqual(self.simulate_get('/hello/').text, 'hello')
+        res = self.simulate_post('/hello/')
+        self.assertEqual(res.status, falcon.HTTP_405)
+        self.assertEqual(res.headers['allow'], 'GET')
+
+    def test_view_without_authentication(self):
+        class HelloView(views.View):
+            allowed_methods = ('get', )
+
+            def get(self, req, resp, **kwargs):
+                resp.body = repr(req.context['user'])
+
+        view = HelloView()
+        view.build_dispatch_plans()
+        self.api.add_route('/hello/', view)
+
+        with mock.patch.object(
+                view, 'run_authentication',
+                side_effect=AssertionError) as run_authentication:
+            self.assertEqual(self.simulate_get('/hello/').text, 'None')
+        self.assertFalse(run_authentication.called)
+
+    def test_dispatch_plan_used(self):
+        self.viewset.allowed_actions = ('list', )
+        self.viewset.build_dispatch_plans()
+        getters = (
+            'get_allowed_methods', 'get_authentication', 'get_permissions',
+            'get_renderers', 'get_filters')
+        patches = [
+            mock.patch.object(
+                self.viewset, name, side_effect=AssertionError(name))
+            for name in getters]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        res = self.simulate_get(
+            '/dummies/', query_string='auth_key=superpassword')
+        self.assertEqual(len(res.json['results']), 3)
+
+        res = self.simulate_post(
+            '/dummies/', body=json.dumps({}),
+            query_string='auth_key=superpassword')
+        self.assertEqual(res.status, falcon.HTTP_405)
+
+    def test_handler_replaced_after_first_request(self):
+        self.simulate_get('/dummies/', query_string='auth_key=superpassword')
+
+        def list(req, resp, **kwargs):
+            resp.body = ['replaced']
+
+        with mock.patch.object(self.viewset, 'list', list):
+            res = self.simulate_get(
+                '/dummies/', query_string='auth_key=superpassword')
+        self.assertEqual(res.json['results'], ['replaced'])
+
+
+class RecordingFilter(filters.FieldMatchFilter):
+    def get_triggers(self):
+        return frozenset([self.query_field, self.query_field + 's[]'])
+
+    def filter(self, req, qs):
+        return qs + [self.query_field]
+
+
+class DefaultMatchFilter(filters.FieldMatchFilter):
+    def filter(self, req, qs):
+        if not self.get_values(req):
+            return qs + ['default']
+        return super().filter(req, qs)
+
+
+class FilterChainTestCase(BaseTestCase):
+    def request(self, query_string):
+        return falcon.Request(
+            falcon.testing.create_environ(query_string=query_string))
+
+    def test_query_params(self):
+        req = self.request('filter=b&filter[]=c&ids[]=1,2&id=3')
+        params = filters.get_query_params(req)
+
+        self.assertIs(filters.get_query_params(req), params)
+        self.assertEqual(params.flags, {'b', 'c'})
+        self.assertEqual(params.get_values('id'), ['1', '2', '3'])
+        self.assertEqual(params.get_values('id', multi=False), ['3'])
+        self.assertIn(filters.flag_key('c'), params.keys)
+
+    def test_skip_absent_filters(self):
+        flag = filters.FlagFilter(
+            'mine', filter_flag_present_func=lambda req, qs: qs + ['mine'])
+        chain = filters.FilterChain(
+            [RecordingFilter(None, query_field=name) for name in 'abc'] +
+            [flag, filters.CompoundFilter([RecordingFilter(None, 'd')])])
+
+        self.assertEqual(chain.unconditional, ())
+        self.assertEqual(chain.filter(self.request(''), []), [])
+        self.assertEqual(
+            chain.filter(self.request('cs[]=1&a=2&filter=mine&d=3'), []),
+            ['a', 'c', 'mine', 'd'])
+
+    def test_default_filters_always_run(self):
+        chain = filters.FilterChain([
+            filters.FlagFilter(
+                'mine', filter_default_func=lambda req, qs: qs + ['all']),
+            filters.ArchiveFlagFilter(None)])
+
+        self.assertEqual(len(chain.unconditional), 2)
+
+    def test_overridden_filters_always_run(self):
+        chain = filters.FilterChain([
+            DefaultMatchFilter(None, 'id'),
+            filters.CompoundFilter([DefaultMatchFilter(None, 'name')])])
+
+        self.assertEqual(len(chain.unconditional), 2)
+        self.assertEqual(
+            chain.filter(self.request(''), []), ['default', 'default'])
+
+    def test_coercion(self):
+        match = filters.FieldMatchFilter(None, 'id', coerce=int)
+        self.assertEqual(
+            match.get_values(self.request('ids[]=2,1,2&id=1')), [2, 1])
+        with self.assertRaises(falcon.HTTPBadRequest):
+            match.get_values(self.request('id=one'))
+
+        match = filters.FieldMatchFilter(
+            None, 'uuid', coerce=serializers.UUIDField())
+        value = uuid.uuid4()
+        self.assertEqual(
+            match.get_values(self.request('uuid={}'.format(value))), [value])
+        with self.assertRaises(falcon.HTTPBadRequest):
+            match.get_values(self.request('uuid=1234'))
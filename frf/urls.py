@@ -89,3 +89,55 @@ def include(module, urlpatterns_name='urlpatterns'):
             raise IncludeError()
     else:
         return IncludeURLs(module)
+
+
+def batch(url='/batch', **kwargs):
+    """Return the url pattern of the batch endpoint.
+
+    Usage:
+
+    .. code-block:: python
+       :caption: urls.py
+
+       from frf.urls import batch, include
+
+
+       urlpatterns = [
+          batch('/api/batch'),
+          ('/api/', include('calendars.urls')),
+       ]
+
+    See :mod:`frf.batch`.
+
+    Args:
+        url (str): The url of the endpoint, ``/batch`` by default.
+        **kwargs: Passed to :class:`frf.batch.BatchView`.
+    """
+    from frf.batch import BatchView
+    return (url, BatchView(**kwargs))
+
+
+def changes(url='/changes', **kwargs):
+    """Return the url pattern of the change feed.
+
+    Usage:
+
+    .. code-block:: python
+       :caption: urls.py
+
+       from frf.urls import changes, include
+
+
+       urlpatterns = [
+          changes('/api/changes'),
+          ('/api/', include('calendars.urls')),
+       ]
+
+    See :mod:`frf.changes`.
+
+    Args:
+        url (str): The url of the feed, ``/changes`` by default.
+        **kwargs: Passed to :class:`frf.changes.ChangeFeedView`.
+    """
+    from frf.changes import ChangeFeedView
+    return (url, ChangeFeedView(**kwargs))
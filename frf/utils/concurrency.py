@@ -0,0 +1,219 @@
+# Copyright 2016 by Teem, and other contributors,
+# as noted in the individual source code files.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# By contributing to this project, you agree to also license your source
+# code under the terms of the Apache License, Version 2.0, as described
+# above.
+
+"""Support for cooperative concurrency.
+
+With gevent workers, or an asyncio server, many requests are served by the
+same thread at once, so the database session can't be scoped to the thread
+like it is by default.  Set ``SQLALCHEMY_SESSION_SCOPE`` to one of:
+
+* ``auto``, the default: scope to the greenlet when gevent has patched the
+  process, otherwise to the thread.
+* ``thread``: one session per thread.
+* ``greenlet``: one session per greenlet, requires ``greenlet``, which comes
+  with gevent.
+* ``contextvars``: one session per :mod:`contextvars` context, which means one
+  per asyncio task.  Requires Python 3.7.
+
+``SQLALCHEMY_SESSION_SCOPEFUNC``, if set, takes precedence.  Whatever the
+scope, sessions are only released by ``db.session.remove()``, so make sure
+:class:`frf.middleware.SQLAlchemyMiddleware` is installed.
+
+Under asyncio, see :mod:`frf.asgi`, synchronous code such as serializers and
+queries runs in a thread pool through :func:`run_sync`, so it does not block
+the event loop.  The pool has ``ASYNC_THREAD_POOL_SIZE`` threads, 10 by
+default.
+"""
+
+import functools
+import logging
+import sys
+
+from frf import conf
+from frf.exceptions import InitializationError
+
+try:
+    import contextvars
+except ImportError:  # Python < 3.7
+    contextvars = None
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ('auto', 'thread', 'greenlet', 'contextvars')
+
+#: the default size of the :func:`run_sync` thread pool.
+DEFAULT_THREAD_POOL_SIZE = 10
+
+_executor = None
+
+_scope_var = None
+if contextvars is not None:
+    _scope_var = contextvars.ContextVar('frf_session_scope')
+
+
+def is_gevent_patched():
+    """Return ``True`` if gevent monkey-patched this process."""
+    monkey = sys.modules.get('gevent.monkey')
+    return bool(monkey and monkey.is_module_patched('threading'))
+
+
+def contextvars_scopefunc():
+    """Return a token identifying the current :mod:`contextvars` context.
+
+    A context gets its token the first time this is called in it.  Contexts
+    copied from it afterwards, such as the ones of tasks it creates, share
+    the token; call :func:`new_scope` at the start of a task to give it its
+    own.
+    """
+    try:
+        return _scope_var.get()
+    except LookupError:
+        return new_scope()
+
+
+def new_scope():
+    """Start a new session scope in the current :mod:`contextvars` context."""
+    token = object()
+    _scope_var.set(token)
+    return token
+
+
+def get_scopefunc(scope):
+    """Return the session ``scopefunc`` for ``scope``.
+
+    Args:
+        scope (str): One of :data:`SCOPES`.
+
+    Returns:
+        callable: The scopefunc, or ``None`` for thread-local sessions.
+
+    Raises:
+        :class:`frf.exceptions.InitializationError`: If the scope is unknown
+            or its requirements are not installed.
+    """
+    if scope == 'auto':
+        scope = 'greenlet' if is_gevent_patched() else 'thread'
+
+    if scope == 'thread':
+        return None
+    elif scope == 'greenlet':
+        try:
+            from greenlet import getcurrent
+        except ImportError:
+            raise InitializationError(
+                'The greenlet session scope requires greenlet.')
+        return getcurrent
+    elif scope == 'contextvars':
+        if contextvars is None:
+            raise InitializationError(
+                'The contextvars session scope requires Python 3.7.')
+        return contextvars_scopefunc
+
+    raise InitializationError(
+        'Unknown session scope {}, expected one of {}.'.format(
+            scope, ', '.join(SCOPES)))
+
+
+def patch_database_driver():
+    """Make psycopg2 cooperative, if it is used and gevent patched things.
+
+    psycopg2 talks to the server in C, so monkey-patching the socket module
+    does not make it yield to other greenlets; ``psycogreen`` does.
+
+    Returns:
+        bool: Whether psycopg2 was patched.
+    """
+    if not is_gevent_patched() or 'psycopg2' not in sys.modules:
+        return False
+
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        logger.warning(
+            'psycopg2 blocks gevent workers while it waits for the '
+            'database.  Install psycogreen to make it cooperative.')
+        return False
+
+    patch_psycopg()
+    return True
+
+
+def get_executor():
+    """Return the thread pool used by :func:`run_sync`.
+
+    It is created on first use, with ``ASYNC_THREAD_POOL_SIZE`` threads.
+    """
+    global _executor
+    if _executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _executor = ThreadPoolExecutor(max_workers=conf.get(
+            'ASYNC_THREAD_POOL_SIZE', DEFAULT_THREAD_POOL_SIZE))
+    return _executor
+
+
+def shutdown_executor(wait=True):
+    """Shut the :func:`run_sync` thread pool down, if it was started."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
+
+
+async def run_sync(func, *args, **kwargs):
+    """Call ``func`` in the thread pool and return its result.
+
+    The call runs in a copy of the current :mod:`contextvars` context, when
+    available, so it uses the database session of the calling task.
+    """
+    import asyncio
+
+    if contextvars is not None:
+        call = functools.partial(
+            contextvars.copy_context().run, func, *args, **kwargs)
+    else:
+        call = functools.partial(func, *args, **kwargs)
+
+    return await asyncio.get_event_loop().run_in_executor(
+        get_executor(), call)
+
+
+async def call_async(obj, name, *args, **kwargs):
+    """Call the ``async_<name>`` coroutine of ``obj``, or ``name`` in a thread.
+
+    Used on authentication and permission classes, which can provide native
+    coroutines next to their synchronous methods.
+    """
+    coroutine = getattr(obj, 'async_' + name, None)
+    if coroutine is not None:
+        return await coroutine(*args, **kwargs)
+    return await run_sync(getattr(obj, name), *args, **kwargs)
+
+
+def run_coroutine(coroutine):
+    """Run ``coroutine`` to completion from synchronous code.
+
+    Lets coroutine handlers be served under WSGI, in a new event loop.
+    """
+    import asyncio
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
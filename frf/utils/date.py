@@ -84,3 +84,46 @@ def timestamp_from_datetime(date):
     else:
         return (date - datetime.datetime(
             1970, 1, 1, tzinfo=pytz.utc)).total_seconds()
+
+
+#: the periods dates can be bucketed by, see :func:`truncate`.
+DATE_BUCKETS = ('hour', 'day', 'week', 'month', 'year')
+
+#: the ``strftime`` format of the start of each bucket; weeks start on
+#: Mondays, see :func:`truncate`.
+BUCKET_FORMATS = {
+    'hour': '%Y-%m-%dT%H:00:00',
+    'day': '%Y-%m-%dT00:00:00',
+    'week': '%Y-%m-%dT00:00:00',
+    'month': '%Y-%m-01T00:00:00',
+    'year': '%Y-01-01T00:00:00',
+}
+
+
+def truncate(date, bucket):
+    """Return the start of the ``bucket`` ``date`` is in.
+
+    Args:
+        date (datetime.datetime): The date.
+        bucket (str): One of :data:`DATE_BUCKETS`.  Weeks start on Mondays.
+
+    Returns:
+        datetime.datetime: The first second of the hour, day, week, month or
+            year, with the timezone of ``date``.
+    """
+    if bucket not in DATE_BUCKETS:
+        raise ValueError('Unknown date bucket {}, expected one of {}.'.format(
+            bucket, ', '.join(DATE_BUCKETS)))
+
+    if bucket == 'week':
+        date = date - datetime.timedelta(days=date.weekday())
+
+    date = date.replace(minute=0, second=0, microsecond=0)
+    if bucket != 'hour':
+        date = date.replace(hour=0)
+    if bucket in ('month', 'year'):
+        date = date.replace(day=1)
+    if bucket == 'year':
+        date = date.replace(month=1)
+
+    return date
@@ -23,8 +23,13 @@ from math import ceil
 import falcon
 
 from sqlalchemy import orm
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm.exc import UnmappedClassError
 from sqlalchemy.sql import func
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.types import String
+
+from frf.utils.date import BUCKET_FORMATS, DATE_BUCKETS
 
 
 class Pagination(object):
@@ -120,10 +125,59 @@ class BaseQuery(orm.Query):
     `SQLAlchemy.Query`. Override the query class for an individual model by
     subclassing this and setting `Model.query_class`.
     """
+    #: the names of the expressions added by :meth:`annotate`.
+    _annotations = ()
+
     def __init__(self, *args, **kwargs):
         self.count_column = kwargs.pop('count_column', None)
         super().__init__(*args, **kwargs)
 
+    def annotate(self, **expressions):
+        """Load SQL expressions in the same query as the objects.
+
+        The value of each expression is set on the objects, as an attribute
+        named after its keyword.  For example, with the number of books of
+        each author:
+
+        >>> books = select([func.count()]).where(
+        ...     Book.author_id == Author.id).as_scalar()
+        >>> authors = Author.query.annotate(book_count=books).all()
+        >>> authors[0].book_count
+        3
+        """
+        names = sorted(expressions)
+        query = self.add_columns(*[
+            expressions[name].label(name) for name in names])
+        query._annotations = self._annotations + tuple(names)
+        return query
+
+    def __iter__(self):
+        rows = super().__iter__()
+        if not self._annotations:
+            return rows
+        return self._iter_annotated(rows)
+
+    def _iter_annotated(self, rows):
+        names = self._annotations
+        size = len(names)
+        for row in rows:
+            entities = row[:-size]
+            obj = entities[0] if len(entities) == 1 else entities
+            for name, value in zip(names, row[-size:]):
+                setattr(entities[0], name, value)
+            yield obj
+
+    def from_self(self, *entities):
+        query = super().from_self(*entities)
+        if entities:
+            query._annotations = ()
+        return query
+
+    def with_entities(self, *entities):
+        query = super().with_entities(*entities)
+        query._annotations = ()
+        return query
+
     def count(self):
         if not self.count_column:
             return super().count()
@@ -185,6 +239,65 @@ class BaseQuery(orm.Query):
         return Pagination(self, page, per_page, total, items)
 
 
+class date_bucket(FunctionElement):
+    """SQL expression of the start of the bucket of a date column.
+
+    Like :func:`frf.utils.date.truncate`, in the database, so rows can be
+    grouped by hour, day, week, month or year.  The bucket is returned as an
+    ISO 8601 string, without timezone.
+
+    >>> db.session.query(
+    ...     date_bucket(Order.created_at, 'month'), func.count()).group_by(
+    ...     date_bucket(Order.created_at, 'month')).all()
+    [('2016-09-01T00:00:00', 12), ('2016-10-01T00:00:00', 3)]
+
+    Args:
+        column: The date or datetime column.
+        bucket (str): One of :data:`frf.utils.date.DATE_BUCKETS`.
+    """
+    type = String()
+    name = 'date_bucket'
+
+    def __init__(self, column, bucket):
+        if bucket not in DATE_BUCKETS:
+            raise ValueError(
+                'Unknown date bucket {}, expected one of {}.'.format(
+                    bucket, ', '.join(DATE_BUCKETS)))
+        self.bucket = bucket
+        super().__init__(column)
+
+
+@compiles(date_bucket)
+def _compile_date_bucket(element, compiler, **kw):
+    column = list(element.clauses)[0]
+    modifiers = []
+    if element.bucket == 'week':
+        # the next Sunday, or the same day if it is one, then its Monday
+        modifiers = ["'weekday 0'", "'-6 days'"]
+    return 'strftime({})'.format(', '.join([
+        "'{}'".format(BUCKET_FORMATS[element.bucket]),
+        compiler.process(column, **kw)] + modifiers))
+
+
+@compiles(date_bucket, 'postgresql')
+def _compile_date_bucket_postgresql(element, compiler, **kw):
+    column = list(element.clauses)[0]
+    return "to_char(date_trunc('{}', {}), '{}')".format(
+        element.bucket, compiler.process(column, **kw),
+        'YYYY-MM-DD"T"HH24:MI:SS')
+
+
+@compiles(date_bucket, 'mysql')
+def _compile_date_bucket_mysql(element, compiler, **kw):
+    column = compiler.process(list(element.clauses)[0], **kw)
+    if element.bucket == 'week':
+        column = 'DATE_SUB({0}, INTERVAL WEEKDAY({0}) DAY)'.format(column)
+    date_format = BUCKET_FORMATS[element.bucket]
+    if compiler.dialect.paramstyle in ('format', 'pyformat'):
+        date_format = date_format.replace('%', '%%')
+    return "DATE_FORMAT({}, '{}')".format(column, date_format)
+
+
 class _QueryProperty(object):
     def __init__(self, session):
         self.session = session
@@ -21,8 +21,9 @@ import base64
 import hashlib
 import hmac
 
-from Crypto import Random
-from Crypto.Cipher import AES
+#: the AES block size, in bytes.  ``Crypto`` is slow to import, so it is only
+#: imported when something is encrypted or decrypted.
+BLOCK_SIZE = 16
 
 
 class DecryptionError(Exception):
@@ -36,11 +37,13 @@ class AESCipher(object):
     """
     def __init__(self, key=None):
         if not key:
+            from Crypto import Random
+
             # Get 32 bytes (256 bits) of data from /dev/urandom
             key = Random.new().read(32)
         if not isinstance(key, bytes):
             key = key.encode()
-        self.bs = AES.block_size
+        self.bs = BLOCK_SIZE
         self.key = hashlib.sha256(key).digest()
 
     def _update_key(self, key):
@@ -49,8 +52,11 @@ class AESCipher(object):
         self.key = hashlib.sha256(key).digest()
 
     def encrypt(self, raw):
+        from Crypto import Random
+        from Crypto.Cipher import AES
+
         raw = self._pad(raw)
-        iv = Random.new().read(AES.block_size)
+        iv = Random.new().read(BLOCK_SIZE)
         cipher = AES.new(self.key, AES.MODE_CBC, iv)
 
         ciphertext = cipher.encrypt(raw)
@@ -61,13 +67,15 @@ class AESCipher(object):
         return base64.b64encode(cipher_msg + hmac_digest)
 
     def decrypt(self, enc):
+        from Crypto.Cipher import AES
+
         hmac_digest_size = hashlib.sha512().digest_size
         enc = base64.b64decode(enc)
 
         try:
-            iv = enc[:AES.block_size]
+            iv = enc[:BLOCK_SIZE]
             hmac_digest = enc[-hmac_digest_size:]
-            ciphertext = enc[AES.block_size:-hmac_digest_size]
+            ciphertext = enc[BLOCK_SIZE:-hmac_digest_size]
         except IndexError:
             raise DecryptionError()
 
@@ -87,11 +95,11 @@ class AESCipher(object):
         return data
 
     def _pad(self, s):
-        pad_length = AES.block_size - (len(s) % AES.block_size)
+        pad_length = BLOCK_SIZE - (len(s) % BLOCK_SIZE)
 
         # Add pad even if it is a multiple already as per RFC 5652
         if pad_length == 0:
-            pad_length = AES.block_size
+            pad_length = BLOCK_SIZE
         pad = pad_length.to_bytes(1, 'big') * pad_length
 
         return s.encode() + pad
@@ -18,6 +18,7 @@
 # above.
 
 import importlib
+import importlib.util
 import inspect
 
 
@@ -36,3 +37,26 @@ def import_class(cl):
         raise ImportError('{} does not refer to a class.'.format(cl))
 
     return attr
+
+
+def import_submodules(package_names, name):
+    """Import the ``name`` submodule of each package that has one.
+
+    Packages without such a submodule are skipped, but errors raised while
+    importing an existing one are not hidden.
+
+    Args:
+        package_names (list): Names of the packages, usually
+            ``INSTALLED_APPS``.
+        name (str): Name of the submodule, for example ``'models'``.
+
+    Returns:
+        list: The imported modules.
+    """
+    modules = []
+    for package_name in package_names:
+        module_name = '{}.{}'.format(package_name, name)
+        if importlib.util.find_spec(module_name) is not None:
+            modules.append(importlib.import_module(module_name))
+
+    return modules
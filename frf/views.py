@@ -18,9 +18,38 @@
 # above.
 
 from gettext import gettext as _
+import inspect
 
 import falcon
 
+from frf.utils import concurrency
+
+
+#: the HTTP methods views respond to.
+HTTP_METHODS = ('get', 'put', 'patch', 'post', 'delete')
+
+
+class DispatchPlan(object):
+    """The part of dispatching a request that does not depend on the request.
+
+    Built once per view and HTTP method by :meth:`View.get_dispatch_plan`.
+    Attributes left to ``None`` are computed for every request instead,
+    because the view overrides the method that returns them.
+
+    Attributes:
+        method (str): The HTTP method, in lower case.
+        allowed (bool): Whether the method is allowed.
+        allowed_methods (list): The allowed methods, for 405 responses.
+        authentication (tuple): The authentication methods.
+        permissions (tuple): The permissions.
+    """
+    def __init__(self, method):
+        self.method = method
+        self.allowed = None
+        self.allowed_methods = None
+        self.authentication = None
+        self.permissions = None
+
 
 class View(object):
     """Simple View object.
@@ -43,10 +72,84 @@ class View(object):
 
            def get(self, req, resp, **kwargs):
                resp.body = 'Hello, world!'
+
+    Handlers can also be coroutines.  Served by :mod:`frf.asgi`, they run on
+    the event loop and the synchronous handlers run in a thread pool, see
+    :meth:`async_dispatch`.  Served by WSGI, coroutine handlers run in an
+    event loop of their own.
     """
     permissions = []
     authentication = []
-    allowed_methods = ('get', 'put', 'patch', 'post', 'delete')
+    allowed_methods = HTTP_METHODS
+    #: the content type of the responses.
+    content_type = 'application/json'
+
+    def uses_default(self, name, owner=None):
+        """Whether ``name`` is the implementation from ``owner``.
+
+        Used to decide which parts of the dispatch plan can be computed
+        ahead of time: anything returned by a method that a subclass or the
+        instance overrides is computed for every request.
+
+        Args:
+            name (str): The attribute name.
+            owner (type): The class with the default implementation,
+                :class:`View` by default.
+        """
+        if name in self.__dict__:
+            return False
+        return getattr(type(self), name) is getattr(owner or View, name)
+
+    def build_dispatch_plan(self, method):
+        """Return a new :class:`DispatchPlan` for ``method``.
+
+        Override to precompute more, calling ``super()`` first.
+        """
+        plan = DispatchPlan(method)
+
+        if self.uses_default('get_allowed_methods'):
+            plan.allowed_methods = [m.upper() for m in self.allowed_methods]
+            plan.allowed = method in self.allowed_methods
+
+        if self.uses_default('authenticate') and self.uses_default(
+                'get_authentication') and self.uses_default(
+                'run_authentication'):
+            plan.authentication = tuple(self.authentication or ())
+
+        if self.uses_default('check_permissions') and self.uses_default(
+                'get_permissions'):
+            plan.permissions = tuple(self.permissions or ())
+
+        return plan
+
+    def get_dispatch_plan(self, method):
+        """Return the :class:`DispatchPlan` for ``method``.
+
+        Plans are built on first use, or by :meth:`build_dispatch_plans`, and
+        kept for the life of the view.  If you change the attributes of a
+        view after it served requests, such as ``authentication`` or
+        ``permissions``, or override one of the methods the plan replaces,
+        call :meth:`reset_dispatch_plans`.  The methods handling requests are
+        not part of the plan, replacing them takes effect right away.
+        """
+        try:
+            return self._dispatch_plans[method]
+        except AttributeError:
+            self._dispatch_plans = {}
+        except KeyError:
+            pass
+
+        plan = self._dispatch_plans[method] = self.build_dispatch_plan(method)
+        return plan
+
+    def build_dispatch_plans(self):
+        """Build the dispatch plans of all HTTP methods ahead of time."""
+        for method in HTTP_METHODS:
+            self.get_dispatch_plan(method)
+
+    def reset_dispatch_plans(self):
+        """Forget the dispatch plans, so they are built again."""
+        self.__dict__.pop('_dispatch_plans', None)
 
     def get_authentication(self, req, **kwargs):
         """Get the authentication methods.
@@ -69,10 +172,15 @@ class View(object):
         method.  If one passes, that one will be used.  If none pass, a
         forbidden response will be returned.
         """
-        # authentication
-        user = None
-        auth_methods = self.get_authentication(req, **kwargs)
+        self.run_authentication(
+            self.get_authentication(req, **kwargs), req)
 
+    def run_authentication(self, auth_methods, req):
+        """Authenticate ``req`` with ``auth_methods``.
+
+        See :meth:`authenticate`.
+        """
+        user = None
         if auth_methods:
             for auth_method in auth_methods:
                 user = auth_method.authenticate(req, self)
@@ -97,7 +205,11 @@ class View(object):
         rest will be ignored.  If none fail, the request will be allowed to
         continue.
         """
-        permissions = self.get_permissions(req, **kwargs)
+        self.run_permissions(
+            self.get_permissions(req, **kwargs), req, **kwargs)
+
+    def run_permissions(self, permissions, req, **kwargs):
+        """Check ``permissions``, see :meth:`check_permissions`."""
         if permissions:
             for permission in permissions:
                 if not permission.has_permission(req, self, **kwargs):
@@ -114,6 +226,29 @@ class View(object):
         """
         return self.allowed_methods
 
+    def check_method(self, plan, method, req, **kwargs):
+        """Raise a 405 error if ``method`` is not allowed.
+
+        Shared by :meth:`dispatch` and :meth:`async_dispatch`, which only
+        call it when ``plan.allowed`` is not ``True``.
+        """
+        if plan.allowed is None:
+            allowed_methods = self.get_allowed_methods(req, **kwargs)
+            if method not in allowed_methods:
+                raise falcon.HTTPMethodNotAllowed(
+                    allowed_methods=[m.upper() for m in allowed_methods])
+        elif not plan.allowed:
+            raise falcon.HTTPMethodNotAllowed(
+                allowed_methods=plan.allowed_methods)
+
+    def get_handler(self, plan, method, req, **kwargs):
+        """Return the method handling the request.
+
+        Shared by :meth:`dispatch` and :meth:`async_dispatch`.  Handlers are
+        looked up on every request, so they can be replaced at any time.
+        """
+        return getattr(self, method)
+
     def dispatch(self, method, req, resp, **kwargs):
         """Route the request to the appropriate method.
 
@@ -124,15 +259,129 @@ class View(object):
             method (str): The HTTP method, can be one of ``get``, ``put``,
                 ``patch``, ``post``, ``delete``.
         """
-        if method not in self.get_allowed_methods(req, **kwargs):
-            raise falcon.HTTPMethodNotAllowed(
-                allowed_methods=self.allowed_methods())
+        plan = self.get_dispatch_plan(method)
+        if not plan.allowed:
+            self.check_method(plan, method, req, **kwargs)
+
+        if plan.authentication is None:
+            self.authenticate(method, req, resp, **kwargs)
+        elif plan.authentication:
+            self.run_authentication(plan.authentication, req)
+        else:
+            req.context['user'] = None
+
+        if plan.permissions is None:
+            self.check_permissions(req, **kwargs)
+        elif plan.permissions:
+            self.run_permissions(plan.permissions, req, **kwargs)
+
+        result = self.get_handler(plan, method, req, **kwargs)(
+            req, resp, **kwargs)
+        if result is not None and inspect.isawaitable(result):
+            concurrency.run_coroutine(result)
+
+        resp.content_type = self.content_type
+
+    async def async_authenticate(self, method, req, resp, **kwargs):
+        """Asynchronous version of :meth:`authenticate`.
+
+        Calls :meth:`authenticate` in the thread pool if it is overridden.
+        """
+        if not self.uses_default('authenticate'):
+            await concurrency.run_sync(
+                self.authenticate, method, req, resp, **kwargs)
+        else:
+            await self.async_run_authentication(
+                self.get_authentication(req, **kwargs), req)
+
+    async def async_run_authentication(self, auth_methods, req):
+        """Asynchronous version of :meth:`run_authentication`.
+
+        Authentication methods with an ``async_authenticate`` coroutine are
+        awaited, the others run in the thread pool.
+        """
+        user = None
+        if auth_methods:
+            for auth_method in auth_methods:
+                user = await concurrency.call_async(
+                    auth_method, 'authenticate', req, self)
+                if user:
+                    break
+            if not user:
+                raise falcon.HTTPUnauthorized(
+                    title=_('Not Authorized'),
+                    description=_('Not Authorized'),
+                    challenges=[str(m) for m in auth_methods])
+            else:
+                req.context['user'] = user
+        else:
+            req.context['user'] = None
+
+    async def async_check_permissions(self, req, **kwargs):
+        """Asynchronous version of :meth:`check_permissions`.
+
+        Calls :meth:`check_permissions` in the thread pool if it is
+        overridden.
+        """
+        if not self.uses_default('check_permissions'):
+            await concurrency.run_sync(self.check_permissions, req, **kwargs)
+        else:
+            await self.async_run_permissions(
+                self.get_permissions(req, **kwargs), req, **kwargs)
+
+    async def async_run_permissions(self, permissions, req, **kwargs):
+        """Asynchronous version of :meth:`run_permissions`.
+
+        Permissions with an ``async_has_permission`` coroutine are awaited,
+        the others run in the thread pool.
+        """
+        if permissions:
+            for permission in permissions:
+                allowed = await concurrency.call_async(
+                    permission, 'has_permission', req, self, **kwargs)
+                if not allowed:
+                    raise falcon.HTTPForbidden(
+                        title=_('Forbidden'),
+                        description=_(
+                            'You do not have permission to access '
+                            'this resource.'))
+
+    async def async_call_handler(self, handler, req, resp, **kwargs):
+        """Await ``handler`` if it is a coroutine, or run it in a thread."""
+        if inspect.iscoroutinefunction(handler):
+            await handler(req, resp, **kwargs)
+        else:
+            await concurrency.run_sync(handler, req, resp, **kwargs)
+
+    async def async_dispatch(self, method, req, resp, **kwargs):
+        """Asynchronous version of :meth:`dispatch`, used by :mod:`frf.asgi`.
+
+        Authentication, permissions and the handler are awaited when they
+        are coroutines, and run in the thread pool of
+        :func:`frf.utils.concurrency.run_sync` otherwise, so that the event
+        loop keeps serving other requests while they wait.
+        """
+        plan = self.get_dispatch_plan(method)
+        if not plan.allowed:
+            self.check_method(plan, method, req, **kwargs)
+
+        if plan.authentication is None:
+            await self.async_authenticate(method, req, resp, **kwargs)
+        elif plan.authentication:
+            await self.async_run_authentication(plan.authentication, req)
+        else:
+            req.context['user'] = None
+
+        if plan.permissions is None:
+            await self.async_check_permissions(req, **kwargs)
+        elif plan.permissions:
+            await self.async_run_permissions(plan.permissions, req, **kwargs)
 
-        self.authenticate(method, req, resp, **kwargs)
-        self.check_permissions(req, **kwargs)
+        await self.async_call_handler(
+            self.get_handler(plan, method, req, **kwargs), req, resp,
+            **kwargs)
 
-        getattr(self, method)(req, resp, **kwargs)
-        resp.content_type = 'application/json'
+        resp.content_type = self.content_type
 
     def on_get(self, req, resp, **kwargs):
         self.dispatch('get', req, resp, **kwargs)
@@ -18,11 +18,16 @@
 # above.
 
 from gettext import gettext as _
+import inspect
 import json
 
 import falcon
+from sqlalchemy import orm
 
 from frf import views
+from frf.filters import FilterChain
+from frf.serializers.fields import AggregateField
+from frf.utils import concurrency
 from frf.viewsets import mixins
 
 
@@ -49,7 +54,7 @@ class BasicViewSet(views.View):
     method_map = {
         'list': 'GET',
         'retrieve': 'GET',
-        'updated': 'PATCH',
+        'update': 'PATCH',
         'create': 'POST',
         'destroy': 'DELETE',
     }
@@ -64,6 +69,7 @@ class BasicViewSet(views.View):
 
     PAGINATOR_CONTEXT_KEY = '_frf_paginator'
     META_CONTEXT_KEY = '_frf_meta'
+    INCLUDED_CONTEXT_KEY = '_frf_included'
 
     def get_allowed_methods(self, req, **kwargs):
         """List of allowed methods, such as GET, POST, etc."""
@@ -81,41 +87,141 @@ class BasicViewSet(views.View):
         """
         return self.allowed_actions
 
-    def dispatch(self, method, req, resp, **kwargs):
-        self.authenticate(method, req, resp, **kwargs)
-        mapped_method = self.reverse_method_map[method]
-        assert mapped_method in (
-            'list', 'retrieve', 'update', 'create', 'destroy')
+    def build_dispatch_plan(self, method):
+        """Return a new :class:`frf.views.DispatchPlan` for ``method``.
 
-        if mapped_method not in self.allowed_actions:
+        On top of what :class:`frf.views.View` plans, resolves the action
+        and whether it needs an object, and splits the renderers and filters
+        into those used for lists and the others, unless ``get_renderers``
+        or ``get_filters`` are overridden.  Action methods are not part of
+        the plan, they are looked up on each request.
+        """
+        plan = super().build_dispatch_plan(method)
+
+        plan.action = self.reverse_method_map.get(method)
+        assert plan.action in (
+            None, 'list', 'retrieve', 'update', 'create', 'destroy')
+
+        plan.allowed = plan.action in self.allowed_actions
+        plan.allowed_methods = None
+        if self.uses_default('get_allowed_methods', BasicViewSet) and \
+                self.uses_default('get_allowed_actions', BasicViewSet):
+            plan.allowed_methods = self.get_allowed_methods(None)
+
+        plan.requires_lookup = plan.action in ('update', 'destroy')
+        plan.may_list = plan.action == 'list'
+        if not self.uses_default('is_list', BasicViewSet):
+            plan.may_list = None
+
+        plan.renderers = plan.list_renderers = None
+        if self.uses_default('get_renderers', BasicViewSet):
+            plan.list_renderers = tuple(self.renderers)
+            plan.renderers = tuple(
+                r for r in self.renderers if not r.list_only)
+
+        plan.filters = plan.list_filters = None
+        plan.filter_chain = plan.list_filter_chain = None
+        if self.uses_default('get_filters', BasicViewSet):
+            plan.list_filters = tuple(self.filters)
+            plan.filters = tuple(f for f in self.filters if not f.list_only)
+            plan.list_filter_chain = FilterChain(plan.list_filters)
+            plan.filter_chain = FilterChain(plan.filters)
+
+        return plan
+
+    def check_method(self, plan, method, req, **kwargs):
+        """Raise an error if the action of ``method`` can't be performed.
+
+        That is, if it is not allowed, or needs an object and the URL does not
+        identify one.
+        """
+        if not plan.allowed:
             raise falcon.HTTPMethodNotAllowed(
-                allowed_methods=self.get_allowed_methods(req, **kwargs))
+                allowed_methods=plan.allowed_methods or
+                self.get_allowed_methods(req, **kwargs))
 
         #: update methods, make sure we can retrieve an object from the url
-        if method in ('retrieve', 'update', 'destroy'):
-            if self.obj_lookup_kwarg not in kwargs:
-                raise falcon.HTTPBadRequest(
-                    title=_('Lookup ID not found'),
-                    description=_(
-                        '{obj_lookup_kwarg} not passed for lookup').format(
-                        obj_lookup_kwarg=self.obj_lookup_kwarg))
+        if plan.requires_lookup and self.obj_lookup_kwarg not in kwargs:
+            raise falcon.HTTPBadRequest(
+                title=_('Lookup ID not found'),
+                description=_(
+                    '{obj_lookup_kwarg} not passed for lookup').format(
+                    obj_lookup_kwarg=self.obj_lookup_kwarg))
 
-        self.check_permissions(req, **kwargs)
+    def get_handler(self, plan, method, req, **kwargs):
+        """Return the action method handling the request."""
+        action = plan.action
+        if action == 'list' and self.obj_lookup_kwarg in kwargs:
+            action = 'retrieve'
 
-        if mapped_method == 'list' and self.obj_lookup_kwarg in kwargs:
-            mapped_method = 'retrieve'
+        handler = getattr(self, action, None)
 
-        if not hasattr(self, mapped_method):
-            raise falcon.HttpBadReqeust(
+        if handler is None:
+            raise falcon.HTTPBadRequest(
                 title=_('Operation not supported'),
                 description=_(
                     'The operation {operation} is not supported '
-                    'at this endpoint.').format(operation=mapped_method))
+                    'at this endpoint.').format(operation=action))
+
+        return handler
 
-        getattr(self, mapped_method)(req, resp, **kwargs)
+    def dispatch(self, method, req, resp, **kwargs):
+        plan = self.get_dispatch_plan(method)
+
+        if plan.authentication is None:
+            self.authenticate(method, req, resp, **kwargs)
+        elif plan.authentication:
+            self.run_authentication(plan.authentication, req)
+        else:
+            req.context['user'] = None
+
+        if not plan.allowed or plan.requires_lookup:
+            self.check_method(plan, method, req, **kwargs)
+
+        if plan.permissions is None:
+            self.check_permissions(req, **kwargs)
+        elif plan.permissions:
+            self.run_permissions(plan.permissions, req, **kwargs)
+
+        result = self.get_handler(plan, method, req, **kwargs)(
+            req, resp, **kwargs)
+        if result is not None and inspect.isawaitable(result):
+            concurrency.run_coroutine(result)
 
         resp.body = self.render(method, req, resp, resp.body, **kwargs)
 
+    async def async_dispatch(self, method, req, resp, **kwargs):
+        """Asynchronous version of :meth:`dispatch`, used by :mod:`frf.asgi`.
+
+        Actions defined with ``async def`` are awaited.  The others, such as
+        the ones of the mixins, run in the thread pool along with the
+        serializers and queries they use, as does rendering.  See
+        :meth:`frf.views.View.async_dispatch`.
+        """
+        plan = self.get_dispatch_plan(method)
+
+        if plan.authentication is None:
+            await self.async_authenticate(method, req, resp, **kwargs)
+        elif plan.authentication:
+            await self.async_run_authentication(plan.authentication, req)
+        else:
+            req.context['user'] = None
+
+        if not plan.allowed or plan.requires_lookup:
+            self.check_method(plan, method, req, **kwargs)
+
+        if plan.permissions is None:
+            await self.async_check_permissions(req, **kwargs)
+        elif plan.permissions:
+            await self.async_run_permissions(plan.permissions, req, **kwargs)
+
+        await self.async_call_handler(
+            self.get_handler(plan, method, req, **kwargs), req, resp,
+            **kwargs)
+
+        resp.body = await concurrency.run_sync(
+            self.render, method, req, resp, resp.body, **kwargs)
+
     def get_qs(self, req, **kwargs):
         raise NotImplementedError()
 
@@ -167,9 +273,25 @@ class BasicViewSet(views.View):
         return self.filters
 
     def render(self, method, req, resp, data, **kwargs):
-        for renderer in self.get_renderers(req, **kwargs):
-            if not renderer.list_only or self.is_list(req, **kwargs):
-                data = renderer.render(req, resp, self, data)
+        plan = self.get_dispatch_plan(method)
+
+        if plan.list_renderers is None:
+            is_list = self.is_list(req, **kwargs)
+            renderers = [
+                r for r in self.get_renderers(req, **kwargs)
+                if is_list or not r.list_only]
+        elif plan.renderers == plan.list_renderers:
+            renderers = plan.renderers
+        elif plan.may_list is None:
+            renderers = plan.list_renderers if self.is_list(
+                req, **kwargs) else plan.renderers
+        elif plan.may_list and self.obj_lookup_kwarg not in kwargs:
+            renderers = plan.list_renderers
+        else:
+            renderers = plan.renderers
+
+        for renderer in renderers:
+            data = renderer.render(req, resp, self, data)
 
         data = json.dumps(data)
 
@@ -187,13 +309,31 @@ class BasicViewSet(views.View):
             )
 
     def get_filtered_qs(self, req, **kwargs):
-        """Filter the queryset based on the `filters` list."""
+        """Filter the queryset based on the `filters` list.
+
+        The query string is parsed once for all the filters, see
+        :class:`frf.filters.QueryParams`, and filters whose parameters are
+        absent are skipped, see :class:`frf.filters.FilterChain`.
+        """
         qs = self.get_qs(req, **kwargs)
-        for filter in self.get_filters(req, **kwargs):
-            if self.is_list(req, **kwargs) or not filter.list_only:
-                qs = filter.filter(req, qs)
+        plan = self.get_dispatch_plan(req.method.lower())
+
+        if plan.list_filters is None:
+            is_list = self.is_list(req, **kwargs)
+            chain = FilterChain([
+                f for f in self.get_filters(req, **kwargs)
+                if is_list or not f.list_only])
+        elif plan.filters == plan.list_filters:
+            chain = plan.filter_chain
+        elif plan.may_list is None:
+            chain = plan.list_filter_chain if self.is_list(
+                req, **kwargs) else plan.filter_chain
+        elif plan.may_list and self.obj_lookup_kwarg not in kwargs:
+            chain = plan.list_filter_chain
+        else:
+            chain = plan.filter_chain
 
-        return qs
+        return chain.filter(req, qs)
 
     def paginate_qs(self, req, qs, **kwargs):
         """Paginate the queryset.
@@ -211,6 +351,23 @@ class BasicViewSet(views.View):
         """
         raise NotImplementedError()
 
+    def load_included(self, req, qs, **kwargs):
+        """Prepare ``qs`` to load the objects requested with ``?include=``.
+
+        Called by ``list`` with the filtered queryset, before it is
+        paginated.  Does nothing by default, see :class:`BasicModelViewSet`.
+        """
+        return qs
+
+    def include_related(self, req, qs, **kwargs):
+        """Collect the related objects requested with ``?include=``.
+
+        Called by ``list`` with the objects of the page, before they are
+        serialized.  Returns them, as a list if it had to go through them.
+        Does nothing by default, see :class:`BasicModelViewSet`.
+        """
+        return qs
+
     def get_qs_len(self, req, qs, **kwargs):
         if isinstance(qs, (list, tuple)):
             return len(qs)
@@ -291,8 +448,31 @@ class BasicModelViewSet(BasicViewSet):
         def get_qs(self, req, **kwargs):
             return models.Calendar.query.filter_by(
                 company_uuid=req.context['user'].company_uuid)
+
+    Lists can side-load related objects, so that clients don't have to
+    request them one by one.  Map the relationships clients can include to
+    the viewsets of their models in ``includes``:
+
+    .. code-block:: python
+
+        class BookViewSet(viewsets.ModelViewSet):
+            model = models.Book
+            serializer = serializers.BookSerializer()
+            renderers = [renderers.ListMetaRenderer()]
+            includes = {
+                'author': AuthorViewSet(),
+                'publisher': PublisherViewSet(),
+            }
+
+    ``GET /books/?include=author,publisher`` then loads the authors and
+    publishers of the page with one query each, and
+    :class:`frf.renderers.ListMetaRenderer` adds them, serialized by the
+    serializer of their viewset, to an ``included`` section.  Included
+    objects are the ones related to the listed objects, the ``get_qs`` of
+    their viewset is not used.
     """
     model = None
+    includes = {}
 
     def get_obj(self, req, **kwargs):
         if 'object' in req.context:
@@ -310,6 +490,126 @@ class BasicModelViewSet(BasicViewSet):
 
         return self.model.query
 
+    def get_includes(self, req, **kwargs):
+        """Return the names of the relationships to include in a list.
+
+        Raises:
+            falcon.HTTPBadRequest: If a relationship is not in ``includes``.
+        """
+        if not self.includes or not self.is_list(req, **kwargs):
+            return []
+
+        try:
+            return req.context[self.INCLUDED_CONTEXT_KEY + '_names']
+        except KeyError:
+            pass
+
+        names = []
+        for name in req.get_param_as_list('include') or []:
+            if name not in self.includes:
+                raise falcon.HTTPBadRequest(
+                    title=_('Invalid include'),
+                    description=_(
+                        '{name} cannot be included, expected one of: '
+                        '{includes}').format(
+                        name=name, includes=', '.join(sorted(self.includes))))
+            if name not in names:
+                names.append(name)
+
+        req.context[self.INCLUDED_CONTEXT_KEY + '_names'] = names
+        return names
+
+    def get_annotations(self, req, model, **kwargs):
+        """Return the SQL expressions to load with the objects of ``model``.
+
+        By default, the ones of the
+        :class:`frf.serializers.fields.AggregateField` fields of the
+        serializer, such as ``CountField``.
+        """
+        return {
+            field.annotation_name: field.expression(model)
+            for field in self.get_serializer(req, **kwargs).fields.values()
+            if isinstance(field, AggregateField)}
+
+    def get_filtered_qs(self, req, **kwargs):
+        """Filter the queryset.
+
+        For ``GET`` requests, the values of the aggregate fields of the
+        serializer are loaded along, see :meth:`get_annotations`.
+        """
+        qs = super().get_filtered_qs(req, **kwargs)
+
+        if req.method == 'GET' and hasattr(qs, 'annotate'):
+            annotations = self.get_annotations(
+                req, qs.column_descriptions[0]['entity'], **kwargs)
+            if annotations:
+                qs = qs.annotate(**annotations)
+
+        return qs
+
+    def load_included(self, req, qs, **kwargs):
+        """Load the relationships requested with ``?include=``.
+
+        They are loaded with one query each for the whole page, as are the
+        relationships of the included objects that their serializer
+        outputs.  Those queries repeat the query of the page, so paginated
+        lists are ordered by primary key last, for them to find the same
+        rows.
+        """
+        names = self.get_includes(req, **kwargs)
+        if not names:
+            return qs
+
+        model = qs.column_descriptions[0]['entity']
+        options = []
+        for name in names:
+            attr = getattr(model, name)
+            options.append(orm.subqueryload(attr))
+
+            mapper = attr.property.mapper
+            serializer = self.includes[name].get_serializer(req)
+            for key in serializer.fields:
+                if key in mapper.relationships:
+                    options.append(orm.subqueryload(attr).subqueryload(
+                        getattr(mapper.class_, key)))
+
+        qs = qs.options(*options)
+        if self.is_paginated(req, **kwargs):
+            qs = qs.order_by(*orm.class_mapper(model).primary_key)
+
+        return qs
+
+    def include_related(self, req, qs, **kwargs):
+        """Serialize the objects related to ``qs`` that were requested.
+
+        Sets ``req.context[ModelViewSet.INCLUDED_CONTEXT_KEY]`` to a
+        dictionary of the serialized objects of each relationship, which
+        :class:`frf.renderers.ListMetaRenderer` renders.
+        """
+        names = self.get_includes(req, **kwargs)
+        if not names:
+            return qs
+
+        objs = list(qs)
+        included = {}
+        for name in names:
+            related = {}
+            for obj in objs:
+                value = getattr(obj, name)
+                if value is None:
+                    continue
+                if not isinstance(value, (list, tuple, set)):
+                    value = [value]
+                for item in value:
+                    related.setdefault(id(item), item)
+
+            serializer = self.includes[name].get_serializer(req)
+            included[name] = serializer.serialize(
+                list(related.values()), many=True)
+
+        req.context[self.INCLUDED_CONTEXT_KEY] = included
+        return objs
+
     def paginate_qs(self, req, qs, **kwargs):
         """Paginate the queryset.
 
@@ -17,15 +17,69 @@
 # code under the terms of the Apache License, Version 2.0, as described
 # above.
 
+import base64
+import binascii
+import datetime
+import decimal
+from gettext import gettext as _
 import json
+import re
+import uuid
 
 import falcon
+from sqlalchemy import and_, func, or_, orm
 
 from frf import db
+from frf.filters import SYNC_CONTEXT_KEY
+from frf.serializers.fields import parse_datetime
+from frf.utils.date import DATE_BUCKETS
+from frf.utils.db import date_bucket
 
 
 class ListMixin(object):
-    """List a queryset."""
+    """List a queryset.
+
+    Model viewsets can also let clients sync their copy of the collection,
+    by fetching only what changed since their last sync.  Set
+    ``allow_sync``, then ``GET /calendars/?since=0`` returns the first page
+    of all the objects, oldest change first:
+
+    .. code-block:: text
+
+        {"results": [{"uuid": "...", ...}, ...],
+         "deleted": ["..."],
+         "meta": {"next": "WyIyMDE2LTA5LTIy...", "has_more": true}}
+
+    Pass ``next`` as ``since`` to get the next page, until ``has_more`` is
+    false, and keep the last ``next`` for the next sync.  Objects that
+    were archived, see :class:`frf.models.mixins.ArchiveMixin`, are listed
+    by ``obj_lookup_kwarg`` in ``deleted``: sync requests include them,
+    even through :class:`frf.filters.ArchiveFlagFilter`.  Objects that were
+    deleted from the database can't be reported, so archive them instead.
+
+    Changes are ordered by ``sync_updated_field`` and then by primary key,
+    which must be a single column.  Pages hold ``per_page`` objects, at most
+    ``sync_page_size``.
+
+    ``updated_at`` is set when a row is written, not when its transaction
+    commits, so a long transaction can commit a change older than the ones
+    a client already synced.  To catch these, the ``next`` cursor of the
+    last page never goes past ``sync_window`` seconds ago: the following
+    sync returns the changes of that window again, and clients must apply
+    changes they already have without harm.  Transactions that last longer
+    than ``sync_window`` can still be missed.
+    """
+    #: whether ``?since=`` is allowed.
+    allow_sync = False
+    #: the column holding the time of the last change.
+    sync_updated_field = 'updated_at'
+    #: the column holding the time objects were archived.
+    sync_deleted_field = 'deleted_at'
+    #: the maximum number of changes per sync page.
+    sync_page_size = 100
+    #: how long, in seconds, changes are synced again, to catch late
+    #: commits.
+    sync_window = 60
 
     def list(self, req, resp, **kwargs):
         """List instances of this object.
@@ -34,15 +88,127 @@ class ListMixin(object):
         queryset will be paginated. The first integer in the list is the
         default page size, and the second is the maximum page size.
         """
-        qs = self.get_filtered_qs(req, **kwargs)
+        if self.allow_sync and req.get_param('since') is not None:
+            return self.sync(req, resp, **kwargs)
+
+        qs = self.load_included(
+            req, self.get_filtered_qs(req, **kwargs), **kwargs)
         if self.is_paginated(req, **kwargs):
             qs = self.paginate_qs(req, qs, **kwargs)
         else:
             req.context[self.META_CONTEXT_KEY] = {
                 'total': self.get_qs_len(req, qs, **kwargs)}
 
+        qs = self.include_related(req, qs, **kwargs)
         resp.body = self.get_serializer(req, **kwargs).serialize(qs, many=True)
 
+    def encode_sync_cursor(self, updated_at, key):
+        """Return the cursor of the change of ``key`` at ``updated_at``.
+
+        If ``key`` is ``None``, the cursor is before all the changes at
+        ``updated_at``.
+        """
+        if isinstance(key, uuid.UUID):
+            key = str(key)
+        return base64.urlsafe_b64encode(json.dumps(
+            [updated_at.isoformat(), key]).encode('utf-8')).decode('ascii')
+
+    def decode_sync_cursor(self, cursor):
+        """Return the ``(updated_at, key)`` of ``cursor``.
+
+        ``None`` for ``0``, which is the start of the collection.
+
+        Raises:
+            falcon.HTTPBadRequest: If the cursor is invalid.
+        """
+        if cursor == '0':
+            return None
+
+        try:
+            updated_at, key = json.loads(
+                base64.urlsafe_b64decode(cursor.encode('ascii')).decode(
+                    'utf-8'))
+            return parse_datetime(updated_at), key
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise falcon.HTTPBadRequest(
+                title=_('Invalid cursor'),
+                description=_(
+                    'since must be 0, or the next cursor of a sync.'))
+
+    def get_sync_window_start(self, updated_at):
+        """Return the time ``sync_window`` seconds ago.
+
+        Naive if ``updated_at`` is, in which case the database is assumed to
+        store times in UTC, like ``CURRENT_TIMESTAMP`` in SQLite.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if updated_at.tzinfo is None:
+            now = now.replace(tzinfo=None)
+        return now - datetime.timedelta(seconds=self.sync_window)
+
+    def sync(self, req, resp, **kwargs):
+        """Return the objects changed since the ``since`` cursor.
+
+        See :class:`ListMixin`.
+        """
+        cursor = self.decode_sync_cursor(req.get_param('since'))
+
+        req.context[SYNC_CONTEXT_KEY] = True
+        qs = self.get_filtered_qs(req, **kwargs)
+
+        model = qs.column_descriptions[0]['entity']
+        updated_field = getattr(model, self.sync_updated_field)
+        key_field = orm.class_mapper(model).primary_key[0]
+        deleted_field = getattr(model, self.sync_deleted_field, None)
+
+        if cursor is not None:
+            updated_at, key = cursor
+            if key is None:
+                qs = qs.filter(updated_field >= updated_at)
+            else:
+                qs = qs.filter(or_(
+                    updated_field > updated_at,
+                    and_(updated_field == updated_at, key_field > key)))
+
+        page_size = min(
+            req.get_param_as_int('per_page', min=1) or self.sync_page_size,
+            self.sync_page_size)
+        objs = qs.order_by(None).order_by(updated_field, key_field).limit(
+            page_size + 1).all()
+
+        has_more = len(objs) > page_size
+        objs = objs[:page_size]
+
+        changed, deleted = [], []
+        for obj in objs:
+            if deleted_field is not None and \
+                    getattr(obj, deleted_field.key) is not None:
+                key = getattr(obj, self.obj_lookup_kwarg)
+                deleted.append(str(key) if isinstance(key, uuid.UUID) else key)
+            else:
+                changed.append(obj)
+
+        if objs:
+            last = objs[-1]
+            updated_at = getattr(last, updated_field.key)
+            key = getattr(last, key_field.key)
+            if not has_more:
+                # leave room for the changes of transactions that are not
+                # committed yet, see `ListMixin`
+                window_start = self.get_sync_window_start(updated_at)
+                if updated_at > window_start:
+                    updated_at, key = window_start, None
+            next_cursor = self.encode_sync_cursor(updated_at, key)
+        else:
+            next_cursor = req.get_param('since')
+
+        resp.body = {
+            'results': self.get_serializer(req, **kwargs).serialize(
+                changed, many=True),
+            'deleted': deleted,
+            'meta': {'next': next_cursor, 'has_more': has_more},
+        }
+
 
 class RetrieveMixin(object):
     """Retrieve an instance."""
@@ -194,3 +360,132 @@ class DestroyModelMixin(DestroyMixin):
         except:
             db.session.rollback()
             raise
+
+
+class AggregateModelMixin(object):
+    """Aggregate the listed objects in the database.
+
+    Mix in before the viewset class, and whitelist the columns clients can
+    aggregate and group by:
+
+    .. code-block:: python
+
+        class OrderViewSet(mixins.AggregateModelMixin, viewsets.ModelViewSet):
+            model = models.Order
+            aggregate_fields = ('price', 'quantity')
+            group_by_fields = ('company_id', 'created_at')
+
+    ``GET /orders/?aggregate=count,sum(price)&group_by=company_id`` then
+    returns one result per company, with the number of orders and the sum of
+    their prices, instead of the orders:
+
+    .. code-block:: text
+
+        [{"company_id": 1, "count": 12, "sum_price": 1250.5}, ...]
+
+    Date columns can be grouped by ``hour``, ``day``, ``week``, ``month`` or
+    ``year``, with ``group_by=created_at:month``; buckets are ISO 8601
+    strings, see :class:`frf.utils.db.date_bucket`.  The functions are
+    ``count``, ``sum``, ``avg``, ``min`` and ``max``.  The objects are
+    filtered as they would be listed, by ``get_filtered_qs``.
+    """
+    #: the columns clients can aggregate.
+    aggregate_fields = ()
+    #: the columns clients can group by.
+    group_by_fields = ()
+    #: the aggregate functions clients can use.
+    aggregate_functions = ('count', 'sum', 'avg', 'min', 'max')
+
+    AGGREGATE_RE = re.compile(r'^(\w+)(?:\((\w*)\))?$')
+
+    def list(self, req, resp, **kwargs):
+        if req.get_param('aggregate') is None:
+            return super().list(req, resp, **kwargs)
+
+        qs = self.get_filtered_qs(req, **kwargs)
+        model = qs.column_descriptions[0]['entity']
+        groups = self.get_group_by(req, model, **kwargs)
+        aggregates = self.get_aggregates(req, model, **kwargs)
+
+        columns = [e.label(n) for n, e in groups + aggregates]
+        group_by = [e for n, e in groups]
+        rows = qs.with_entities(*columns).order_by(None).group_by(
+            *group_by).order_by(*group_by)
+
+        results = [
+            {name: self.aggregate_value(value)
+             for name, value in zip(row.keys(), row)}
+            for row in rows]
+
+        req.context[self.META_CONTEXT_KEY] = {'total': len(results)}
+        resp.body = results
+
+    def aggregate_error(self, description):
+        return falcon.HTTPBadRequest(
+            title=_('Invalid aggregate'), description=description)
+
+    def get_aggregates(self, req, model, **kwargs):
+        """Return the ``(name, expression)`` of each requested aggregate."""
+        aggregates = []
+        for param in req.get_param_as_list('aggregate') or []:
+            match = self.AGGREGATE_RE.match(param.strip())
+            function, column = match.groups() if match else (param, None)
+            if function not in self.aggregate_functions:
+                raise self.aggregate_error(_(
+                    'Unknown aggregate {aggregate}, expected one of: '
+                    '{functions}').format(
+                    aggregate=param,
+                    functions=', '.join(self.aggregate_functions)))
+
+            if not column and function == 'count':
+                aggregates.append(('count', func.count()))
+                continue
+
+            if column not in self.aggregate_fields:
+                raise self.aggregate_error(_(
+                    '{column} cannot be aggregated, expected one of: '
+                    '{columns}').format(
+                    column=column, columns=', '.join(self.aggregate_fields)))
+
+            aggregates.append((
+                '{}_{}'.format(function, column),
+                getattr(func, function)(getattr(model, column))))
+
+        if not aggregates:
+            raise self.aggregate_error(_('No aggregate requested.'))
+
+        return aggregates
+
+    def get_group_by(self, req, model, **kwargs):
+        """Return the ``(name, expression)`` of each requested group."""
+        groups = []
+        for param in req.get_param_as_list('group_by') or []:
+            column, _sep, bucket = param.strip().partition(':')
+            if column not in self.group_by_fields:
+                raise self.aggregate_error(_(
+                    '{column} cannot be grouped by, expected one of: '
+                    '{columns}').format(
+                    column=column, columns=', '.join(self.group_by_fields)))
+
+            expression = getattr(model, column)
+            if bucket:
+                if bucket not in DATE_BUCKETS:
+                    raise self.aggregate_error(_(
+                        'Unknown date bucket {bucket}, expected one of: '
+                        '{buckets}').format(
+                        bucket=bucket, buckets=', '.join(DATE_BUCKETS)))
+                expression = date_bucket(expression, bucket)
+
+            groups.append((column, expression))
+
+        return groups
+
+    def aggregate_value(self, value):
+        """Convert an aggregated value to JSON."""
+        if isinstance(value, decimal.Decimal):
+            return float(value)
+        if isinstance(value, (datetime.date, datetime.time)):
+            return value.isoformat()
+        if isinstance(value, uuid.UUID):
+            return str(value)
+        return value